@@ -17,18 +17,17 @@
 
 """
 This package encapsulates the PipelineML GeoPackager plugin for QGIS.
+The conversion itself (see the 'converter' module) does not depend
+on QGIS, so nothing from QGIS is imported until the plugin is loaded.
 """
 
 
-from qgis.gui import QgisInterface
-from .plugin import PipelineMLGeoPackagerPlugin
-
-
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 # Define the required 'classFactory' function,
 # which is called when the plugin is loaded.
-def classFactory(iface: QgisInterface) -> PipelineMLGeoPackagerPlugin:
+def classFactory(iface: 'QgisInterface') -> 'PipelineMLGeoPackagerPlugin':
     """
     This function returns an instance of the plugin class.
     """
+    from .plugin import PipelineMLGeoPackagerPlugin
     return PipelineMLGeoPackagerPlugin(iface)
@@ -21,252 +21,27 @@ This module defines the 'PipelineMLGeoPackagerAlgorithm' class.
 
 
 from os import path
-from threading import Event
-from xml.parsers import expat
-from osgeo import gdal
-from osgeo import ogr
-from osgeo.osr import SpatialReference
 from qgis.core import (
-  QgsProcessingAlgorithm, QgsProcessingContext, QgsProcessingFeedback,
-  QgsProcessingParameterFile, QgsProcessingParameterFileDestination)
+  QgsApplication, QgsProcessingAlgorithm, QgsProcessingContext,
+  QgsProcessingFeedback,
+  QgsProcessingParameterBoolean, QgsProcessingParameterDefinition,
+  QgsProcessingParameterEnum, QgsProcessingParameterExtent,
+  QgsProcessingParameterFile, QgsProcessingParameterFileDestination,
+  QgsProcessingParameterNumber, QgsProcessingParameterString)
 from qgis.PyQt.QtGui import QIcon
+from .converter import PipelineMLConverter
+from .profiles import PROFILES, parse_pragmas
+from .sinks import FORMATS
+from .task import ConversionTask
 
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
-# Define the '_reset_globals' function, which
-# should be called every time the algorithm runs.
-def _reset_globals() -> None:
+# Define the '_names' function.
+def _names(text: str) -> 'List[str]':
     """
-    This function resets global variables for the algorithm.
+    This function splits a list of names separated by commas.
     """
-
-    # This list serves as a stack of XML element names.
-    global _stack
-    _stack = []
-
-    # This dictionary keeps track of layers
-    # that have been created in the GeoPackage.
-    global _layers
-    _layers = {}
-
-    # This dictionary stores names and values
-    # of fields for the current feature.
-    global _fields
-    _fields = {}
-
-    # This event is used to signal
-    # completion of the XML parsing thread.
-    global _event
-    _event = Event()
-
-    # This object represents the default spatial
-    # reference system (SRS) of the GeoPackage.
-    global _srs
-    _srs = SpatialReference()
-
-    # This dictionary is used to determine the data
-    # types of numeric fields.  Any field not appearing
-    # in this dictionary is taken as text/string.
-    global _types
-    _types = {
-      'length': ogr.OFTReal,
-      'startEngineeringStation': ogr.OFTReal,
-      'endEngineeringStation': ogr.OFTReal,
-      'pressureRating': ogr.OFTReal,
-      'startPosition': ogr.OFTReal,
-      'endPosition': ogr.OFTReal,
-      'compressorPowerRating': ogr.OFTReal,
-      'compressorRatedFlow': ogr.OFTReal,
-      'compressorPressureSuction': ogr.OFTReal,
-      'compressorPressureDischarge': ogr.OFTReal,
-      'linepipeCoverDepthMinimum': ogr.OFTReal,
-      'meterFlowRateMinimum': ogr.OFTReal,
-      'meterFlowRateMaximum': ogr.OFTReal,
-      'pumpPowerRating': ogr.OFTReal,
-      'pumpRatedFlow': ogr.OFTReal,
-      'pumpPressureSuction': ogr.OFTReal,
-      'pumpPressureDischarge': ogr.OFTReal,
-      'teeCenterToEndRun': ogr.OFTReal,
-      'teeCenterToEndOutlet': ogr.OFTReal,
-      'valveActuationTime': ogr.OFTReal,
-      'casingVentCount': ogr.OFTInteger,
-      'coatingLayerNumber': ogr.OFTInteger,
-      'sleevePressureRating': ogr.OFTReal,
-      'pipeconnectorNumber': ogr.OFTInteger}
-
-
-# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
-# Define the '_handle_element_start' function, which is called (by the
-# XML parser) for the start of every element in the PipelineML file.
-def _handle_element_start(name: str, attributes: dict) -> None:
-    """
-    This function processes the start-tag of a PipelineML element.
-    """
-
-    global _feedback
-    global _parser
-    global _pml_size
-    global _dataset
-
-    # Update the progress bar.
-    _feedback.setProgress(100 * _parser.CurrentByteIndex / _pml_size)
-
-    # If the stack is empty, all that's needed is to
-    # push the name of this element onto the stack (to
-    # indicate that this element is now being processed).
-    if len(_stack) < 1:
-        _stack.append(name)
-        return
-
-    # If 'component' is on top of the stack,
-    # this element must represent a feature.
-    if _stack[-1] == 'component' and name not in _layers:
-        # If necessary, create the layer for this feature.
-        _feedback.pushInfo('Creating ' + name + ' layer')
-        _layers[name] = _dataset.CreateLayer(name, _srs, ogr.wkbUnknown)
-
-    # If 'component' is second from the top of the stack, this element
-    # must represent a field for the current feature.  (The 'location'
-    # element represents the geometry field and is handled separately.)
-    elif (len(_stack) > 2 and _stack[-2] == 'component'
-          and name != 'location'):
-        # If necessary, create the field.
-        layer_name = _stack[-1]
-        if _layers[layer_name].FindFieldIndex(name, 1) < 0:
-            _feedback.pushInfo('Creating ' + name + ' field'
-                               ' in ' + layer_name + ' layer')
-            type = _types[name] if name in _types else ogr.OFTString
-            field_defn = ogr.FieldDefn(name, type)
-            _layers[layer_name].CreateField(field_defn)
-
-        # If this element has a 'title' attribute, use that
-        # attribute's value as the field value.  (Otherwise,
-        # the field value should be in the character data.)
-        for key in list(attributes):
-            if key == 'title' or key.endswith(':title'):
-                _fields[name] = attributes[key]
-                break
-
-    # Push the name of this element onto the stack to
-    # indicate that this element is now being processed.
-    _stack.append(name)
-
-
-# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
-# Define the '_handle_character_data' function, which is called
-# (by the XML parser) for character data in the PipelineML file.
-def _handle_character_data(data: str) -> None:
-    """
-    This function processes the content of a PipelineML element.
-    """
-
-    # Ignore whitespace.
-    if data.isspace():
-        return
-
-    global _feedback
-    global _parser
-    global _pml_size
-
-    # Update the progress bar.
-    _feedback.setProgress(100 * _parser.CurrentByteIndex / _pml_size)
-
-    # If 'defaultCRS' is on top of the stack, this element specifies
-    # the default coordinate reference system for the dataset.
-    if len(_stack) > 1 and _stack[-1] == 'defaultCRS':
-        name = data.partition(' ')[2].strip('()')
-        _srs.SetFromUserInput(name)
-        return
-
-    # Any further processing of character data
-    # requires at least four items in the stack.
-    if len(_stack) < 4:
-        return
-
-    # If 'component' is third from the top of the stack,
-    # this element should represent a field for the current
-    # feature, and the character data should be used as the
-    # field value (except for the 'location' element, which
-    # represents the geometry field and is handled separately).
-    if _stack[-3] == 'component' and _stack[-1] != 'location':
-        _fields[_stack[-1]] = data
-
-    # If 'location' is third from the top of the stack, this element
-    # should represent a set of geospatial coordinates in GML format.
-    elif _stack[-3] == 'location':
-        # The element name second from the top
-        # should indicate the geometry type.
-        gml_type = _stack[-2].split(':', 1)[-1]
-        if gml_type == 'Point':
-            wkb_type = ogr.wkbPoint
-        elif gml_type == 'LineString':
-            wkb_type = ogr.wkbLineString
-        elif gml_type == 'Polygon':
-            wkb_type = ogr.wkbPolygon
-        else:
-            _feedback.reportError('Unknown geometry type: ' + gml_type)
-            wkb_type = ogr.wkbUnknown
-
-        # Create a geometry object from the GML coordinates.
-        _feedback.pushInfo('Creating ' + gml_type + ' geometry'
-                           ' for ' + _stack[-4] + ' feature')
-        geom = ogr.Geometry(wkb_type)
-        pos_list = data.split()
-        for i in range(0, len(pos_list), 2):
-            x = float(pos_list[i])
-            y = float(pos_list[i + 1])
-            geom.AddPoint_2D(x, y)
-        _fields['location'] = geom
-
-
-# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
-# Define the '_handle_element_end' function, which is called (by the
-# XML parser) for the end of every element in the PipelineML file.
-def _handle_element_end(name: str) -> None:
-    """
-    This function processes the end-tag of a PipelineML element.
-    """
-
-    global _feedback
-    global _parser
-    global _pml_size
-    global _fields
-
-    # Update the progress bar.
-    _feedback.setProgress(100 * _parser.CurrentByteIndex / _pml_size)
-
-    # If 'component' is second from the top of the
-    # stack (just beneath the name of this element),
-    # this element must represent a feature.
-    if len(_stack) > 2 and _stack[-2] == 'component':
-        # Use the schema information from the appropriate
-        # layer to create a new feature object.
-        _feedback.pushInfo('Creating ' + name + ' feature')
-        feature_defn = _layers[name].GetLayerDefn()
-        feature = ogr.Feature(feature_defn)
-
-        # Set the value of each field for the feature.  (Note
-        # that the 'location' field represents the geometry).
-        for key, value in _fields.items():
-            if key == 'location':
-                feature.SetGeometryDirectly(value)
-            else:
-                feature.SetField(key, value)
-
-        # Add the feature to the appropriate layer.
-        _feedback.pushInfo('Adding feature to ' + name + ' layer')
-        _layers[name].CreateFeature(feature)
-        feature.Destroy()
-        _fields = {}
-
-    # Pop the stack to indicate that this
-    # element is no longer being processed.
-    _stack.pop()
-
-    # If the stack is empty, XML parsing
-    # is complete.  Signal the main thread.
-    if len(_stack) < 1:
-        _event.set()
+    return [name.strip() for name in text.split(',') if name.strip()]
 
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
@@ -370,12 +145,218 @@ class PipelineMLGeoPackagerAlgorithm(QgsProcessingAlgorithm):
         # Add the input parameter: a PipelineML file.
         parameter = QgsProcessingParameterFile(
           'INPUT', 'Source PipelineML file',
-          fileFilter='PipelineML files (*.pml;*.xml)')
+          fileFilter='PipelineML files '
+                     '(*.pml;*.xml;*.pml.gz;*.xml.gz;*.zip)')
         self.addParameter(parameter)
 
-        # Add the output parameter: a GeoPackage file destination.
+        # Add the output parameters: a GeoPackage file destination (or,
+        # for formats with a file per layer, a directory), and the format.
         parameter = QgsProcessingParameterFileDestination(
-          'OUTPUT', 'Destination GeoPackage', 'GeoPackage files (*.gpkg)')
+          'OUTPUT', 'Destination GeoPackage (or folder)',
+          'GeoPackage files (*.gpkg)')
+        self.addParameter(parameter)
+        parameter = QgsProcessingParameterEnum(
+          'FORMAT', 'Output format',
+          [writer.format_name for writer in FORMATS.values()],
+          defaultValue=0)
+        self.addParameter(parameter)
+
+        # Add the filter parameters, which limit the conversion to some
+        # layers (i.e., component types, such as 'Pipe, Valve'), or to the
+        # components within an extent (in the coordinates of the PipelineML
+        # file).  Everything else is skipped as the file is parsed.
+        parameter = QgsProcessingParameterString(
+          'LAYERS', 'Layers to convert (separated by commas; default: all)',
+          optional=True)
+        parameter.setFlags(parameter.flags()
+                           | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+        parameter = QgsProcessingParameterString(
+          'EXCLUDE_LAYERS', 'Layers to skip (separated by commas)',
+          optional=True)
+        parameter.setFlags(parameter.flags()
+                           | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+        parameter = QgsProcessingParameterExtent(
+          'EXTENT', 'Only convert components within this extent '
+          '(in the CRS of the PipelineML file)', optional=True)
+        parameter.setFlags(parameter.flags()
+                           | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+
+        # Add the loading parameters, which determine which of the layers
+        # written are added to the current project (loading every layer of
+        # a huge output can take longer than the conversion itself).
+        parameter = QgsProcessingParameterBoolean(
+          'LOAD', 'Add the layers to the project', True)
+        self.addParameter(parameter)
+        parameter = QgsProcessingParameterString(
+          'LOAD_LAYERS',
+          'Layers to add to the project (separated by commas; default: all)',
+          optional=True)
+        parameter.setFlags(parameter.flags()
+                           | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+
+        # Add the background parameter, which has the conversion run as a
+        # task of its own (so that the algorithm returns at once), adding
+        # the layers of a GeoPackage to the project as soon as their first
+        # batch of features is committed (and refreshing them as more are).
+        parameter = QgsProcessingParameterBoolean(
+          'BACKGROUND',
+          'Convert in the background, showing layers as they are loaded',
+          False)
+        self.addParameter(parameter)
+
+        # Add the batch size parameters, which determine how many features
+        # are written to the GeoPackage per transaction.  (A batch is
+        # committed when either limit is reached; zero disables batching.)
+        parameter = QgsProcessingParameterNumber(
+          'BATCH_SIZE', 'Features per transaction',
+          QgsProcessingParameterNumber.Integer, 10000, minValue=0)
+        self.addParameter(parameter)
+        parameter = QgsProcessingParameterNumber(
+          'BATCH_MEGABYTES', 'Megabytes of PipelineML per transaction',
+          QgsProcessingParameterNumber.Double, 64, minValue=0)
+        parameter.setFlags(parameter.flags()
+                           | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+
+        # Add the schema parameters, which allow the layers and fields
+        # to be created before any features are added: either by quickly
+        # scanning the PipelineML file first, or from a schema file (which
+        # is written by the scan, if it does not yet exist).
+        parameter = QgsProcessingParameterBoolean(
+          'PRESCAN', 'Scan for layers and fields first', False)
+        parameter.setFlags(parameter.flags()
+                           | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+        parameter = QgsProcessingParameterFile(
+          'SCHEMA', 'Schema file (read, or written by the scan)',
+          fileFilter='JSON files (*.json)', optional=True)
+        parameter.setFlags(parameter.flags()
+                           | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+
+        # Add the type parameters, which give fields types other than
+        # text (beyond the built-in types of the standard fields): from a
+        # PipelineML XML schema, from a JSON file mapping field names to
+        # types (which take precedence), or inferred from a sample of the
+        # PipelineML file (for any fields that have no type otherwise).
+        parameter = QgsProcessingParameterFile(
+          'XSD', 'PipelineML XML schema (for field types)',
+          fileFilter='XML schemas (*.xsd)', optional=True)
+        parameter.setFlags(parameter.flags()
+                           | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+        parameter = QgsProcessingParameterFile(
+          'TYPES', 'Field types file', fileFilter='JSON files (*.json)',
+          optional=True)
+        parameter.setFlags(parameter.flags()
+                           | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+        parameter = QgsProcessingParameterBoolean(
+          'INFER_TYPES', 'Infer the types of other fields', False)
+        parameter.setFlags(parameter.flags()
+                           | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+
+        # Add the update parameters, which allow an existing GeoPackage
+        # to be brought up to date with a new revision of the PipelineML
+        # file (writing only the features that have changed, as matched
+        # by the value of the key field).
+        parameter = QgsProcessingParameterBoolean(
+          'UPDATE', 'Update the GeoPackage if it exists', False)
+        parameter.setFlags(parameter.flags()
+                           | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+        parameter = QgsProcessingParameterString(
+          'KEY_FIELD', 'Key field (identifying components when updating)',
+          'id')
+        parameter.setFlags(parameter.flags()
+                           | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+
+        # Add the index parameters.  Indexes are created once every
+        # feature has been written: a spatial index for each layer (unless
+        # turned off), and an index on each of the given fields (e.g.,
+        # 'id, startEngineeringStation') in every layer that has it.
+        parameter = QgsProcessingParameterBoolean(
+          'SPATIAL_INDEX', 'Create spatial indexes', True)
+        parameter.setFlags(parameter.flags()
+                           | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+        parameter = QgsProcessingParameterString(
+          'INDEX_FIELDS', 'Fields to index (separated by commas)',
+          optional=True)
+        parameter.setFlags(parameter.flags()
+                           | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+
+        # Add the output performance parameters: a profile of SQLite
+        # settings (trading durability for speed), any individual pragmas
+        # that replace those of the profile (e.g., 'synchronous=OFF'),
+        # whether to build the GeoPackage in memory, and whether to limit
+        # the memory used instead (e.g., for files of many gigabytes).
+        parameter = QgsProcessingParameterEnum(
+          'PROFILE', 'Output performance profile', list(PROFILES),
+          defaultValue=0)
+        parameter.setFlags(parameter.flags()
+                           | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+        parameter = QgsProcessingParameterString(
+          'PRAGMAS', 'SQLite pragmas (NAME=VALUE, separated by commas)',
+          optional=True)
+        parameter.setFlags(parameter.flags()
+                           | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+        parameter = QgsProcessingParameterBoolean(
+          'IN_MEMORY', 'Build the GeoPackage in memory', False)
+        parameter.setFlags(parameter.flags()
+                           | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+        parameter = QgsProcessingParameterBoolean(
+          'LOW_MEMORY', 'Limit the memory used (for huge files)', False)
+        parameter.setFlags(parameter.flags()
+                           | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+
+        # Add the cache parameters, which allow a PipelineML file that has
+        # already been converted (and not changed since) to be copied from
+        # a cache of GeoPackages in the QGIS settings directory.
+        parameter = QgsProcessingParameterBoolean(
+          'CACHE', 'Reuse earlier conversions of the same file', False)
+        parameter.setFlags(parameter.flags()
+                           | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+        parameter = QgsProcessingParameterNumber(
+          'CACHE_MEGABYTES', 'Megabytes of GeoPackages to cache',
+          QgsProcessingParameterNumber.Double, 1024, minValue=0)
+        parameter.setFlags(parameter.flags()
+                           | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+
+        # Add the debugging parameters: the verbose parameter, which turns
+        # on a message for every feature, the timing parameter, which turns
+        # on timing of each stage of the conversion (with a summary in the
+        # log, and a report next to the GeoPackage), and the parameter that
+        # adds a profile of every function call (which slows the conversion
+        # down).
+        parameter = QgsProcessingParameterBoolean(
+          'VERBOSE', 'Log every feature (for debugging)', False)
+        parameter.setFlags(parameter.flags()
+                           | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+        parameter = QgsProcessingParameterBoolean(
+          'TIMING', 'Time each stage and write a report (for debugging)',
+          False)
+        parameter.setFlags(parameter.flags()
+                           | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+        parameter = QgsProcessingParameterBoolean(
+          'CPROFILE', 'Also profile function calls (with cProfile)', False)
+        parameter.setFlags(parameter.flags()
+                           | QgsProcessingParameterDefinition.FlagAdvanced)
         self.addParameter(parameter)
 
     # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
@@ -388,60 +369,103 @@ class PipelineMLGeoPackagerAlgorithm(QgsProcessingAlgorithm):
         This method runs the algorithm using the specified parameters.
         """
 
-        # Reset the values of global variables.
-        _reset_globals()
-
-        # Retrieve the value of the output parameter
-        # (i.e., the GeoPackage file destination).
-        gpkg_path = self.parameterAsFileOutput(parameters, 'OUTPUT', context)
-
-        # Fetch the GDAL driver for the GeoPackage file format.
-        driver = gdal.GetDriverByName('GPKG')
-
-        # Use the driver to create a new
-        # dataset (i.e., a new GeoPackage).
-        global _dataset
-        _dataset = driver.Create(gpkg_path, 0, 0, 0, gdal.GDT_Unknown)
-
-        # Retrieve the value of the input
-        # parameter (i.e., the PipelineML file).
+        # Retrieve the values of the input parameter (i.e., the
+        # PipelineML file) and output parameter (i.e., the GeoPackage
+        # file destination).
         pml_path = self.parameterAsFile(parameters, 'INPUT', context)
+        gpkg_path = self.parameterAsFileOutput(parameters, 'OUTPUT', context)
 
-        # Open the PipelineML file for reading.  (Note that the XML
-        # parser requires the file to be opened in binary mode.)
-        with open(pml_path, 'rb') as pml_file:
-            global _feedback
-            _feedback = feedback
-
-            # Determine the size of the PipelineML file
-            # (in order to update the progress bar).
-            global _pml_size
-            _pml_size = pml_file.seek(0, 2)
-            pml_file.seek(0)
-
-            # Parse the PipelineML file.  (The handler functions
-            # called by the XML parser populate the GeoPackage
-            # based on the PipelineML file's contents.)
-            global _parser
-            _parser = expat.ParserCreate()
-            _parser.buffer_text = True
-            _parser.StartElementHandler = _handle_element_start
-            _parser.CharacterDataHandler = _handle_character_data
-            _parser.EndElementHandler = _handle_element_end
-            _parser.ParseFile(pml_file)
-
-        # Wait for the XML parsing thread to signal completion.
-        while not _event.wait(1) and not feedback.isCanceled():
-            pass
-
-        # Close the dataset to ensure that all data is written
-        # and resources are recovered (file handle closed, etc.).
-        _dataset = None
-
-        # Add the GeoPackage layers to the current project.
+        # Formats with a file per layer are written to a directory
+        # (named for the destination, without its extension).
+        format = list(FORMATS)[
+          self.parameterAsEnum(parameters, 'FORMAT', context)]
+        if not FORMATS[format].extension:
+            gpkg_path = path.splitext(gpkg_path)[0]
+
+        # Determine the cache directory (if the cache is used).
+        cache_dir = None
+        if self.parameterAsBool(parameters, 'CACHE', context):
+            cache_dir = path.join(QgsApplication.qgisSettingsDirPath(),
+                                  'cache', 'pml_geopackager')
+
+        # Split the lists of layers to convert (if not all of them) and to
+        # skip, and determine the extent of the components to convert (if
+        # not all of them).
+        layers = _names(self.parameterAsString(parameters, 'LAYERS', context))
+        exclude_layers = _names(
+          self.parameterAsString(parameters, 'EXCLUDE_LAYERS', context))
+        extent = self.parameterAsExtent(parameters, 'EXTENT', context)
+        bbox = None
+        if not extent.isNull():
+            bbox = (extent.xMinimum(), extent.yMinimum(),
+                    extent.xMaximum(), extent.yMaximum())
+
+        # Split the list of fields to index.
+        index_fields = _names(
+          self.parameterAsString(parameters, 'INDEX_FIELDS', context))
+
+        # Determine the options of the conversion.
+        options = dict(
+          batch_size=self.parameterAsInt(parameters, 'BATCH_SIZE', context),
+          batch_megabytes=self.parameterAsDouble(
+            parameters, 'BATCH_MEGABYTES', context),
+          verbose=self.parameterAsBool(parameters, 'VERBOSE', context),
+          timing=self.parameterAsBool(parameters, 'TIMING', context),
+          prescan=self.parameterAsBool(parameters, 'PRESCAN', context),
+          schema_path=self.parameterAsFile(
+            parameters, 'SCHEMA', context) or None,
+          update=self.parameterAsBool(parameters, 'UPDATE', context),
+          key_field=self.parameterAsString(parameters, 'KEY_FIELD', context),
+          cache_dir=cache_dir,
+          cache_megabytes=self.parameterAsDouble(
+            parameters, 'CACHE_MEGABYTES', context),
+          spatial_index=self.parameterAsBool(
+            parameters, 'SPATIAL_INDEX', context),
+          index_fields=index_fields,
+          profile=list(PROFILES)[
+            self.parameterAsEnum(parameters, 'PROFILE', context)],
+          pragmas=parse_pragmas(
+            self.parameterAsString(parameters, 'PRAGMAS', context)),
+          in_memory=self.parameterAsBool(parameters, 'IN_MEMORY', context),
+          cprofile=self.parameterAsBool(parameters, 'CPROFILE', context),
+          format=format, layers=layers or None,
+          exclude_layers=exclude_layers, bbox=bbox,
+          xsd_path=self.parameterAsFile(parameters, 'XSD', context) or None,
+          types_path=self.parameterAsFile(
+            parameters, 'TYPES', context) or None,
+          infer_types=self.parameterAsBool(
+            parameters, 'INFER_TYPES', context),
+          low_memory=self.parameterAsBool(parameters, 'LOW_MEMORY', context))
+        load = self.parameterAsBool(parameters, 'LOAD', context)
+        load_layers = _names(
+          self.parameterAsString(parameters, 'LOAD_LAYERS', context))
         project = context.project()
-        for name in list(_layers):
-            layer_path = gpkg_path + '|layername=' + name
+
+        # Hand the conversion over to a task of its own, if it is to run
+        # in the background (which adds the layers to the project itself).
+        if self.parameterAsBool(parameters, 'BACKGROUND', context):
+            task = ConversionTask(pml_path, gpkg_path, options,
+                                  project if load else None, load_layers)
+            task.start()
+            feedback.pushInfo('Converting ' + pml_path + ' in the '
+                              'background (see the task manager)')
+            return {'OUTPUT': gpkg_path}
+
+        # Create a converter object for this run of the algorithm.  (All of
+        # the conversion state belongs to the converter, so that several
+        # runs of the algorithm can safely proceed at the same time.)
+        converter = PipelineMLConverter(feedback, **options)
+
+        # Translate the PipelineML file into a GeoPackage.
+        layer_names = converter.convert(pml_path, gpkg_path)
+
+        # Add the layers (or the chosen ones) to the current project.
+        if not load:
+            return {'OUTPUT': gpkg_path}
+        for name in layer_names:
+            if load_layers and name not in load_layers:
+                continue
+            layer_path = converter.layer_path(gpkg_path, name)
             details = QgsProcessingContext.LayerDetails(name, project)
             context.addLayerToLoadOnCompletion(layer_path, details)
 
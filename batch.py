@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+This module defines the 'convert_many' function, which converts
+many PipelineML files at once using a pool of worker processes.
+"""
+
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from os import path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from osgeo import gdal
+from osgeo import ogr
+from .converter import PipelineMLConverter
+from .feedback import ConsoleFeedback
+from .profiles import profile_pragmas, sqlite_pragmas
+from .sinks import FORMATS
+from .source import EXTENSIONS, base_name
+from .writer import LAYER_OPTIONS, build_indexes
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'find_pml_files' function.
+def find_pml_files(paths: 'Iterable[str]') -> 'List[str]':
+    """
+    This function returns the PipelineML files named by 'paths', in which
+    each directory stands for the PipelineML files it contains (directly,
+    including compressed ones).
+    """
+    pml_paths = []
+    for name in paths:
+        if path.isdir(name):
+            pml_paths.extend(
+              path.join(name, entry) for entry in sorted(os.listdir(name))
+              if entry.lower().endswith(EXTENSIONS))
+        else:
+            pml_paths.append(name)
+    return pml_paths
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_convert_file' function, which runs in a worker process.
+# (It must be defined at module level so that it can be pickled.)
+def _convert_file(pml_path: str, gpkg_path: str,
+      options: 'Dict[str, Any]') -> 'Dict[str, Any]':
+    """
+    This function converts one PipelineML file and returns the
+    result, including the error message if the conversion failed.
+    """
+    start = perf_counter()
+    result = {'input': pml_path, 'output': gpkg_path,
+              'bytes': 0, 'counts': {}, 'error': None}
+    try:
+        result['bytes'] = path.getsize(pml_path)
+        converter = PipelineMLConverter(ConsoleFeedback(quiet=True),
+                                        **options)
+        converter.convert(pml_path, gpkg_path)
+        result['counts'] = converter.counts
+    except Exception as error:
+        result['error'] = str(error)
+    result['seconds'] = perf_counter() - start
+    return result
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_same_crs' function.
+def _same_crs(srs: 'osr.SpatialReference',
+      other: 'osr.SpatialReference') -> bool:
+    """
+    This function tells whether two CRSs (either of which may be
+    None, for a layer without one) are the same.
+    """
+    if srs is None or other is None:
+        return srs is None and other is None
+    return bool(srs.IsSame(other))
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_merge_dataset' function, which appends every layer
+# of one GeoPackage to another (creating layers and fields as needed).
+def _merge_dataset(source_path: str, target: 'gdal.Dataset',
+      batch_size: int) -> None:
+    """
+    This function copies the features of the GeoPackage at
+    'source_path' into the 'target' dataset.  (Layers are created
+    without spatial indexes; see '_index_dataset'.)  If a layer already
+    in the target has a different CRS, a ValueError is raised (before
+    anything is copied), since its geometries would be mislabelled.
+    """
+    source = gdal.OpenEx(source_path, gdal.OF_VECTOR)
+    for i in range(source.GetLayerCount()):
+        source_layer = source.GetLayer(i)
+        target_layer = target.GetLayerByName(source_layer.GetName())
+        if target_layer is not None and not _same_crs(
+              source_layer.GetSpatialRef(), target_layer.GetSpatialRef()):
+            raise ValueError('The ' + source_layer.GetName() + ' layer '
+                             'is in a different CRS from the one already '
+                             'merged')
+    for i in range(source.GetLayerCount()):
+        source_layer = source.GetLayer(i)
+        name = source_layer.GetName()
+        target_layer = target.GetLayerByName(name)
+        if target_layer is None:
+            target_layer = target.CreateLayer(
+              name, source_layer.GetSpatialRef(), ogr.wkbUnknown,
+              LAYER_OPTIONS)
+
+        # Add any fields that the target layer is missing.
+        source_defn = source_layer.GetLayerDefn()
+        for j in range(source_defn.GetFieldCount()):
+            field_defn = source_defn.GetFieldDefn(j)
+            if target_layer.FindFieldIndex(field_defn.GetName(), 1) < 0:
+                target_layer.CreateField(field_defn)
+
+        # Copy the features (matching fields by name), committing
+        # them in batches, as the converter does.
+        target_defn = target_layer.GetLayerDefn()
+        count = 0
+        for source_feature in source_layer:
+            if batch_size > 0 and count % batch_size == 0:
+                if count > 0:
+                    target.CommitTransaction()
+                target.StartTransaction()
+            feature = ogr.Feature(target_defn)
+            feature.SetFrom(source_feature)
+            target_layer.CreateFeature(feature)
+            count += 1
+        if batch_size > 0 and count > 0:
+            target.CommitTransaction()
+    source = None
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_index_dataset' function, which is called
+# once every GeoPackage has been merged.
+def _index_dataset(target: 'gdal.Dataset', spatial_index: bool,
+      index_fields: 'Iterable[str]') -> None:
+    """
+    This function creates the indexes of every layer of the 'target'
+    dataset (see 'writer.build_indexes').
+    """
+    for i in range(target.GetLayerCount()):
+        layer = target.GetLayer(i)
+        layer_defn = layer.GetLayerDefn()
+        fields = [field for field in index_fields
+                  if layer_defn.GetFieldIndex(field) >= 0]
+        build_indexes(target, layer, spatial_index, fields)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'convert_many' function.
+def convert_many(pml_paths: 'Iterable[str]', output: str,
+      merge: bool = False, jobs: int = None,
+      feedback: 'QgsProcessingFeedback' = None,
+      **options: 'Any') -> 'Dict[str, Any]':
+    """
+    This function converts the PipelineML files named by 'pml_paths'
+    (see 'find_pml_files') using 'jobs' worker processes (by default,
+    one per CPU).  If 'merge' is set, all features are written to a
+    single GeoPackage at 'output' by the calling process; otherwise,
+    'output' is a directory in which each PipelineML file is converted
+    to a GeoPackage (or, for other formats, a directory) of the same
+    name.  Any keyword arguments are passed
+    on to the 'PipelineMLConverter' constructor.  The return value
+    summarizes the results, including the aggregate throughput.  (A
+    file whose layers are in a different CRS from those already merged
+    is reported as failed, rather than merged.)
+    """
+    if feedback is None:
+        feedback = ConsoleFeedback()
+    extension = FORMATS[options.get('format', 'gpkg')].extension
+    if merge and extension != '.gpkg':
+        raise ValueError('Only GeoPackages can be merged')
+    if merge and options.get('update'):
+        raise ValueError('A merged GeoPackage cannot be updated '
+                         '(it is always created anew)')
+    pml_paths = find_pml_files(pml_paths)
+    start = perf_counter()
+    results = []
+
+    # When merging, the workers write to temporary GeoPackages, and
+    # this process alone writes to the output, merging each temporary
+    # GeoPackage as soon as it is complete.  (SQLite allows only one
+    # writer at a time, so this avoids contention between workers.)
+    # The temporary GeoPackages need no indexes, since only the output
+    # is indexed (once everything has been merged).
+    worker_options = options
+    with TemporaryDirectory() as temp_dir:
+        if merge:
+            worker_options = dict(options, spatial_index=False,
+                                  index_fields=())
+            output_dir = temp_dir
+            driver = gdal.GetDriverByName('GPKG')
+            pragmas = profile_pragmas(options.get('profile', 'default'),
+                                      options.get('pragmas'))
+            with sqlite_pragmas(pragmas):
+                target = driver.Create(output, 0, 0, 0, gdal.GDT_Unknown)
+        else:
+            output_dir = output
+            os.makedirs(output_dir, exist_ok=True)
+
+        with ProcessPoolExecutor(jobs) as executor:
+            futures = []
+            for i, pml_path in enumerate(pml_paths):
+                # Give temporary GeoPackages unique names, since
+                # input files in different directories may share one.
+                name = base_name(pml_path)
+                if merge:
+                    name = str(i) + '_' + name
+                gpkg_path = path.join(output_dir, name + extension)
+                futures.append(executor.submit(
+                  _convert_file, pml_path, gpkg_path, worker_options))
+
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if merge and result['error'] is None:
+                    try:
+                        _merge_dataset(result['output'], target,
+                                       options.get('batch_size', 10000))
+                    except ValueError as error:
+                        result['error'] = str(error)
+                    os.remove(result['output'])
+                if result['error'] is not None:
+                    feedback.reportError(
+                      result['input'] + ': ' + result['error'])
+                    continue
+                feedback.pushInfo(
+                  'Converted ' + result['input'] + ' (' +
+                  str(sum(result['counts'].values())) + ' features in ' +
+                  '{:.1f}'.format(result['seconds']) + ' s)')
+                feedback.setProgress(100 * len(results) / len(futures))
+
+        if merge:
+            _index_dataset(target, options.get('spatial_index', True),
+                           options.get('index_fields', ()))
+            target = None
+
+    # Summarize the results.
+    seconds = perf_counter() - start
+    succeeded = [result for result in results if result['error'] is None]
+    features = sum(sum(result['counts'].values()) for result in succeeded)
+    megabytes = sum(result['bytes'] for result in succeeded) / 1048576
+    summary = {
+      'files': len(succeeded), 'failed': len(results) - len(succeeded),
+      'features': features, 'megabytes': megabytes, 'seconds': seconds,
+      'features_per_second': features / seconds if seconds > 0 else 0.0,
+      'megabytes_per_second': megabytes / seconds if seconds > 0 else 0.0,
+      'results': results}
+    feedback.pushInfo(
+      'Converted {files} files ({failed} failed): {features} features, '
+      '{megabytes:.1f} MB in {seconds:.1f} s ({features_per_second:.0f} '
+      'features/s, {megabytes_per_second:.2f} MB/s)'.format(**summary))
+    return summary
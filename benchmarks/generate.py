@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+This script writes a synthetic PipelineML document, for benchmarking.
+The number of components (or the size of the file), the number of
+component types, the number of fields per component and the number of
+vertices per geometry can all be varied.  Pipes are line strings; other
+components are points.
+
+    python3 benchmarks/generate.py OUTPUT [--components N] [--types N]
+        [--fields N] [--vertices N] [--megabytes M]
+"""
+
+
+import argparse
+import io
+import sys
+
+
+# These are the component types, in the order in which they are used.
+TYPES = ('Pipe', 'Valve', 'Tee', 'Meter', 'Pump', 'Compressor', 'Casing',
+         'Sleeve')
+
+# These are the names of the first fields of each component (with
+# numeric values for those the converter treats as numbers); any
+# further fields are named 'attribute1', 'attribute2', etc.
+FIELDS = ('id', 'name', 'length', 'material', 'pressureRating',
+          'startEngineeringStation', 'endEngineeringStation',
+          'coatingLayerNumber')
+
+# This is the number of bytes of PipelineML written at a time.
+_WRITE_SIZE = 1048576
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_component' function.
+def _component(i: int, type: str, fields: 'List[str]',
+      vertices: int) -> str:
+    """
+    This function returns the PipelineML of the 'i'-th component.
+    """
+    parts = ['<component><', type, '>']
+    for field in fields:
+        if field == 'id':
+            value = str(i)
+        elif field in ('name', 'material') or field.startswith('attr'):
+            value = field[:4] + str(i % 997)
+        else:
+            value = str(i % 1000 + 0.25)
+        parts += ['<', field, '>', value, '</', field, '>']
+
+    # Pipes wander east from a point of their own; other components are
+    # points (at the same place).
+    x, y = -95.0 + (i % 10000) * 0.001, 29.0 + (i // 10000) * 0.001
+    if type == 'Pipe':
+        points = ' '.join(format(y + j * 0.00001, '.6f') + ' ' +
+                          format(x + j * 0.0001, '.6f')
+                          for j in range(vertices))
+        parts += ['<location><gml:LineString><gml:posList>', points,
+                  '</gml:posList></gml:LineString></location>']
+    else:
+        parts += ['<location><gml:Point><gml:pos>', format(y, '.6f'), ' ',
+                  format(x, '.6f'), '</gml:pos></gml:Point></location>']
+    parts += ['</', type, '></component>']
+    return ''.join(parts)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'write_document' function.
+def write_document(stream: 'BinaryIO', components: int = 100000,
+      types: int = 2, fields: int = 7, vertices: int = 10,
+      megabytes: float = 0) -> int:
+    """
+    This function writes a synthetic PipelineML document to 'stream',
+    and returns the number of components written.  Components cycle
+    through the first 'types' component types, each with 'fields' fields
+    and (for pipes) 'vertices' vertices.  If 'megabytes' is given,
+    components are written until the document is about that size,
+    instead of writing a fixed number of them.
+    """
+    field_names = list(FIELDS[:fields]) + [
+      'attribute' + str(j) for j in range(1, fields - len(FIELDS) + 1)]
+    type_names = TYPES[:max(1, min(types, len(TYPES)))]
+    limit = megabytes * 1048576
+    stream.write(b'<?xml version="1.0" encoding="UTF-8"?>'
+                 b'<pipelineML xmlns:gml="http://www.opengis.net/gml/3.2">'
+                 b'<defaultCRS>urn:ogc:def:crs:EPSG::4326 (EPSG:4326)'
+                 b'</defaultCRS>')
+    size = 0
+    count = 0
+    buffer = []
+    buffered = 0
+    while (size + buffered < limit) if limit > 0 else (count < components):
+        text = _component(count, type_names[count % len(type_names)],
+                          field_names, vertices)
+        buffer.append(text)
+        buffered += len(text)
+        count += 1
+        if buffered >= _WRITE_SIZE:
+            stream.write(''.join(buffer).encode('utf-8'))
+            size += buffered
+            buffer = []
+            buffered = 0
+    stream.write(''.join(buffer).encode('utf-8'))
+    stream.write(b'</pipelineML>')
+    return count
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'generate' function.
+def generate(**options: 'Any') -> bytes:
+    """
+    This function returns a synthetic PipelineML document
+    (see 'write_document' for the options).
+    """
+    stream = io.BytesIO()
+    write_document(stream, **options)
+    return stream.getvalue()
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'add_arguments' function.
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    This function adds the options of the generator to a parser.
+    """
+    parser.add_argument(
+      '--components', type=int, default=100000, metavar='N',
+      help='number of components (default: %(default)s)')
+    parser.add_argument(
+      '--types', type=int, default=2, metavar='N',
+      help='number of component types, up to ' + str(len(TYPES)) +
+           ' (default: %(default)s)')
+    parser.add_argument(
+      '--fields', type=int, default=7, metavar='N',
+      help='fields per component (default: %(default)s)')
+    parser.add_argument(
+      '--vertices', type=int, default=10, metavar='N',
+      help='vertices per pipe (default: %(default)s)')
+    parser.add_argument(
+      '--megabytes', type=float, default=0, metavar='M',
+      help='write components until the file is this size '
+           '(instead of a fixed number of them)')
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'main' function.
+def main(argv: 'List[str]' = None) -> None:
+    """
+    This function writes a document as directed by the arguments.
+    """
+    parser = argparse.ArgumentParser(
+      description='Write a synthetic PipelineML document.')
+    parser.add_argument('output', help='PipelineML file to write')
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    with open(args.output, 'wb') as output_file:
+        count = write_document(
+          output_file, args.components, args.types, args.fields,
+          args.vertices, args.megabytes)
+    print('Wrote ' + str(count) + ' components to ' + args.output)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
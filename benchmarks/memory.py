@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+This script measures the memory used by the feature records that the
+reader produces, compared with the same features as dictionaries of field
+names and values.  It parses a synthetic PipelineML document, keeping
+every record (as a full writer queue would), and reports the bytes
+allocated per feature.  It does not require GDAL or QGIS.
+
+    python3 benchmarks/memory.py [COMPONENTS]
+"""
+
+
+import gc
+import sys
+import tracemalloc
+from os import path
+
+# Import the plugin directory as a package (see 'pml2gpkg.py').
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+import pml2gpkg  # noqa: E402,F401
+from generate import generate  # noqa: E402
+from pml_geopackager.feedback import ConsoleFeedback  # noqa: E402
+from pml_geopackager.reader import PipelineMLReader  # noqa: E402
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_measure' function.
+def _measure(data: bytes, as_dicts: bool) -> 'Tuple[int, int]':
+    """
+    This function parses 'data', keeping every feature (as a record or as
+    a dictionary), and returns the memory allocated for the features that
+    remain afterwards and the peak memory allocated while parsing.
+    """
+    features = []
+    if as_dicts:
+        def handle_feature(layout: 'Layout', values: 'Tuple',
+              geometry: bytes) -> None:
+            features.append((layout.name,
+                             dict(zip(layout.fields, values)), geometry))
+    else:
+        def handle_feature(layout: 'Layout', values: 'Tuple',
+              geometry: bytes) -> None:
+            features.append((layout, values, geometry))
+
+    reader = PipelineMLReader(lambda name: None, handle_feature,
+                              ConsoleFeedback(quiet=True))
+    gc.collect()
+    tracemalloc.start()
+    reader.parse(data)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, peak
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'main' function.
+def main(argv: 'List[str]' = None) -> None:
+    """
+    This function runs the benchmark and prints the results.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else 100000
+    data = generate(components=count, types=1, fields=7, vertices=5)
+    print(str(count) + ' features, ' +
+          format(len(data) / 1048576, '.1f') + ' MB of PipelineML')
+    for label, as_dicts in (('records', False), ('dictionaries', True)):
+        current, peak = _measure(data, as_dicts)
+        print(format(label, '<14') +
+              format(current / count, '8.0f') + ' bytes/feature kept, ' +
+              format(peak / 1048576, '8.1f') + ' MB peak')
+
+
+if __name__ == '__main__':
+    main()
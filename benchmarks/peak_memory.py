@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+This script checks that a low-memory conversion uses the same memory
+whatever the size of its input.  It converts synthetic PipelineML
+documents (see 'generate.py') of increasing size, each in a process of its
+own, and reports the peak resident memory of each conversion.  It fails
+(with exit status 1) if the peak grows by more than the tolerance from the
+smallest document to the largest.  It requires GDAL.
+
+    python3 benchmarks/peak_memory.py [--megabytes M ...] [--vertices N]
+        [--format FORMAT] [--tolerance MB] [--no-low-memory]
+"""
+
+
+import argparse
+import multiprocessing
+import os
+import sys
+from os import path
+from tempfile import TemporaryDirectory
+
+# Import the plugin directory as a package (see 'pml2gpkg.py').
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+import pml2gpkg  # noqa: E402,F401
+from generate import write_document  # noqa: E402
+from throughput import _peak_rss  # noqa: E402
+from pml_geopackager.converter import PipelineMLConverter  # noqa: E402
+from pml_geopackager.feedback import ConsoleFeedback  # noqa: E402
+from pml_geopackager.sinks import FORMATS  # noqa: E402
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_run_case' function, which runs in a process of its own (so
+# that the peak memory is that of the conversion alone).
+def _run_case(pml_path: str, gpkg_path: str, format: str,
+      low_memory: bool) -> 'Dict[str, Any]':
+    """
+    This function converts a PipelineML file, and returns the
+    features written and the peak memory.
+    """
+    converter = PipelineMLConverter(ConsoleFeedback(quiet=True),
+                                    format=format, low_memory=low_memory)
+    converter.convert(pml_path, gpkg_path)
+    return {'features': sum(converter.counts.values()),
+            'peak_rss_megabytes': _peak_rss()}
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'main' function.
+def main(argv: 'List[str]' = None) -> int:
+    """
+    This function converts documents of each size, reports the peak
+    memory of each conversion, and returns the exit status.
+    """
+    parser = argparse.ArgumentParser(
+      description='Check that the memory used by a low-memory conversion '
+                  'does not grow with the size of the input.')
+    parser.add_argument(
+      '--megabytes', type=float, nargs='+', default=[32, 128, 512],
+      metavar='M',
+      help='sizes of the documents to convert, which should be larger '
+           'than a batch, so that the memory used has leveled off even in '
+           'the smallest (default: %(default)s)')
+    parser.add_argument(
+      '--vertices', type=int, default=10, metavar='N',
+      help='vertices per pipe (e.g., 100000 for coordinate lists longer '
+           'than the limit on their text; default: %(default)s)')
+    parser.add_argument(
+      '--format', choices=list(FORMATS), default='gpkg',
+      help='output format (default: %(default)s)')
+    parser.add_argument(
+      '--tolerance', type=float, default=16, metavar='MB',
+      help='growth of the peak memory allowed (default: %(default)s)')
+    parser.add_argument(
+      '--no-low-memory', dest='low_memory', action='store_false',
+      help='convert without the limits of the low-memory mode (to see '
+           'how the memory would otherwise grow)')
+    args = parser.parse_args(argv)
+    if _peak_rss() is None:
+        parser.error('the peak memory cannot be measured on this platform')
+
+    peaks = []
+    context = multiprocessing.get_context('spawn')
+    with TemporaryDirectory() as temp_dir:
+        for megabytes in sorted(args.megabytes):
+            pml_path = path.join(temp_dir, 'input.pml')
+            with open(pml_path, 'wb') as pml_file:
+                write_document(pml_file, types=2, vertices=args.vertices,
+                               megabytes=megabytes)
+            gpkg_path = path.join(temp_dir, 'output' +
+                                  FORMATS[args.format].extension)
+            with context.Pool(1) as pool:
+                run = pool.apply(_run_case, (pml_path, gpkg_path,
+                                             args.format, args.low_memory))
+            os.remove(pml_path)
+            peaks.append(run['peak_rss_megabytes'])
+            print(format(megabytes, '8.0f') + ' MB' +
+                  format(run['features'], '12d') + ' features' +
+                  format(run['peak_rss_megabytes'], '10.1f') + ' MB peak')
+
+    growth = peaks[-1] - peaks[0]
+    print('Peak memory grew by ' + format(growth, '.1f') + ' MB')
+    if growth > args.tolerance:
+        print('FAILED: more than ' + format(args.tolerance, 'g') + ' MB')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+This script measures the throughput of the converter on synthetic
+PipelineML documents (see 'generate.py').  For each case, it reports
+features and megabytes per second, the peak resident memory, and how the
+time was split between parsing, building geometries and writing.  The
+results are appended to a file (by default, 'results.jsonl' next to this
+script), and compared with the last results of the same case, so that a
+change can be checked for regressions.  It requires GDAL.
+
+    python3 benchmarks/throughput.py [CASE ...] [--scale F] [--repeat N]
+        [--format FORMAT]
+"""
+
+
+import argparse
+import json
+import multiprocessing
+import subprocess
+import sys
+from datetime import datetime, timezone
+from os import path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+# Import the plugin directory as a package (see 'pml2gpkg.py').
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+import pml2gpkg  # noqa: E402,F401
+from generate import write_document  # noqa: E402
+from pml_geopackager import reader  # noqa: E402
+from pml_geopackager.converter import PipelineMLConverter  # noqa: E402
+from pml_geopackager.feedback import ConsoleFeedback  # noqa: E402
+from pml_geopackager.sinks import FORMATS  # noqa: E402
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# This dictionary defines the benchmark cases (as options of the
+# generator): typical components, components with many fields, pipes with
+# many vertices, and a mixture of every component type.
+CASES = {
+  'typical': {'components': 100000, 'types': 2, 'fields': 7,
+              'vertices': 10},
+  'wide': {'components': 50000, 'types': 2, 'fields': 40, 'vertices': 10},
+  'long': {'components': 20000, 'types': 1, 'fields': 7, 'vertices': 500},
+  'mixed': {'components': 100000, 'types': 8, 'fields': 12,
+            'vertices': 5}}
+
+# This is the default file of results.
+RESULTS_PATH = path.join(path.dirname(path.abspath(__file__)),
+                         'results.jsonl')
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_timed' function.
+def _timed(function: 'Callable', timers: 'Dict[str, float]',
+      stage: str) -> 'Callable':
+    """
+    This function returns a version of 'function' that adds the time
+    spent in it to the given stage of 'timers'.
+    """
+    def timed_function(*args: 'Any') -> 'Any':
+        start = perf_counter()
+        try:
+            return function(*args)
+        finally:
+            timers[stage] += perf_counter() - start
+    return timed_function
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_peak_rss' function.
+def _peak_rss() -> 'Optional[float]':
+    """
+    This function returns the peak resident memory of
+    this process (in megabytes), if it is known.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1048576 if sys.platform == 'darwin' else peak / 1024
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_run_case' function, which runs in a process of its own (so
+# that the peak memory is that of the conversion alone).
+def _run_case(pml_path: str, gpkg_path: str,
+      format: str) -> 'Dict[str, Any]':
+    """
+    This function converts a PipelineML file (to the given output
+    format), and returns the time taken (in total and by stage), the
+    features written and the peak memory.  Features are written in the
+    parsing thread, so that the stages do not overlap.
+    """
+    timers = {'geometry': 0.0, 'write': 0.0}
+    reader.build_wkb = _timed(reader.build_wkb, timers, 'geometry')
+    writer_class = FORMATS[format]
+    for name in ('add_feature', 'create_indexes', 'close'):
+        setattr(writer_class, name,
+                _timed(getattr(writer_class, name), timers, 'write'))
+
+    converter = PipelineMLConverter(ConsoleFeedback(quiet=True),
+                                    queue_size=0, format=format)
+    start = perf_counter()
+    converter.convert(pml_path, gpkg_path)
+    seconds = perf_counter() - start
+    return {'seconds': seconds,
+            'features': sum(converter.counts.values()),
+            'split': {'parse': seconds - timers['geometry']
+                      - timers['write'], **timers},
+            'peak_rss_megabytes': _peak_rss()}
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_revision' function.
+def _revision() -> 'Optional[str]':
+    """
+    This function returns the current Git revision
+    of the plugin (if it can be determined).
+    """
+    try:
+        return subprocess.run(
+          ['git', 'describe', '--always', '--dirty'],
+          cwd=path.dirname(RESULTS_PATH), capture_output=True,
+          text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_previous_results' function.
+def _previous_results(results_path: str) -> 'Dict[str, Dict[str, Any]]':
+    """
+    This function returns the last results of each case (and
+    parameters) recorded in the file at 'results_path'.
+    """
+    previous = {}
+    if not path.exists(results_path):
+        return previous
+    with open(results_path, encoding='utf-8') as results_file:
+        for line in results_file:
+            if line.strip():
+                result = json.loads(line)
+                previous[json.dumps([result['case'], result['parameters'],
+                                     result.get('format', 'gpkg')])] = result
+    return previous
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_report' function.
+def _report(result: 'Dict[str, Any]',
+      previous: 'Optional[Dict[str, Any]]') -> None:
+    """
+    This function prints the results of a case (and the
+    change in throughput since its previous results).
+    """
+    split = result['split']
+    line = (format(result['case'], '<10') +
+            format(result['features_per_second'], '10.0f') + ' features/s' +
+            format(result['megabytes_per_second'], '8.2f') + ' MB/s')
+    if result['peak_rss_megabytes'] is not None:
+        line += format(result['peak_rss_megabytes'], '8.1f') + ' MB peak'
+    line += '   ' + ', '.join(
+      stage + ' ' +
+      format(100 * split[stage] / result['seconds'], '.0f') + '%'
+      for stage in ('parse', 'geometry', 'write'))
+    if previous is not None:
+        change = (result['features_per_second'] /
+                  previous['features_per_second'] - 1)
+        line += ('   ' + format(100 * change, '+.1f') + '% since ' +
+                 (previous['revision'] or previous['time']))
+    print(line)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'main' function.
+def main(argv: 'List[str]' = None) -> None:
+    """
+    This function runs the benchmark cases and reports the results.
+    """
+    parser = argparse.ArgumentParser(
+      description='Measure the throughput of the converter.')
+    parser.add_argument(
+      'cases', nargs='*', metavar='CASE',
+      help='cases to run (' + ', '.join(CASES) + '; default: all)')
+    parser.add_argument(
+      '--scale', type=float, default=1, metavar='F',
+      help='multiply the number of components by this factor')
+    parser.add_argument(
+      '--repeat', type=int, default=1, metavar='N',
+      help='run each case N times, keeping the fastest run')
+    parser.add_argument(
+      '--format', choices=list(FORMATS), default='gpkg',
+      help='output format (default: %(default)s)')
+    parser.add_argument(
+      '--results', default=RESULTS_PATH, metavar='FILE',
+      help='file to which results are appended (default: %(default)s)')
+    parser.add_argument(
+      '--label', help='label to record with the results')
+    parser.add_argument(
+      '--no-save', dest='save', action='store_false',
+      help='do not record the results')
+    args = parser.parse_args(argv)
+    for case in args.cases:
+        if case not in CASES:
+            parser.error('unknown case ' + case)
+
+    previous = _previous_results(args.results)
+    revision = _revision()
+    context = multiprocessing.get_context('spawn')
+    with TemporaryDirectory() as temp_dir:
+        for case in args.cases or list(CASES):
+            parameters = dict(CASES[case])
+            parameters['components'] = max(
+              1, int(parameters['components'] * args.scale))
+            pml_path = path.join(temp_dir, case + '.pml')
+            with open(pml_path, 'wb') as pml_file:
+                write_document(pml_file, **parameters)
+            megabytes = path.getsize(pml_path) / 1048576
+
+            # Run the case (in a new process each time), keeping
+            # the fastest run.
+            best = None
+            for i in range(args.repeat):
+                gpkg_path = path.join(temp_dir, case + str(i) +
+                                      FORMATS[args.format].extension)
+                with context.Pool(1) as pool:
+                    run = pool.apply(_run_case,
+                                     (pml_path, gpkg_path, args.format))
+                if best is None or run['seconds'] < best['seconds']:
+                    best = run
+
+            result = {
+              'time': datetime.now(timezone.utc).isoformat(
+                timespec='seconds'),
+              'revision': revision, 'label': args.label, 'case': case,
+              'parameters': parameters, 'format': args.format,
+              'megabytes': megabytes,
+              'features_per_second': best['features'] / best['seconds'],
+              'megabytes_per_second': megabytes / best['seconds'],
+              **best}
+            _report(result, previous.get(
+              json.dumps([case, parameters, args.format])))
+            if args.save:
+                with open(args.results, 'a', encoding='utf-8') as results:
+                    results.write(json.dumps(result) + '\n')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,603 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+This module defines the 'BulkGeoPackageWriter' class, which writes
+GeoPackages directly with SQLite, rather than feature by feature
+through OGR.
+"""
+
+
+import os
+import sqlite3
+import struct
+from os import path
+from osgeo import gdal
+from osgeo import ogr
+from osgeo.osr import SpatialReference
+from .geometry import (
+  WKB_CIRCULAR_STRING, WKB_COMPOUND_CURVE, WKB_MULTI_CURVE, wkb_envelope)
+from .profiles import sqlite_pragmas
+from .writer import (
+  _SETTERS, GeoPackageWriter, _quote, build_indexes)
+
+
+# These are the 'application_id' of a GeoPackage (the characters 'GPKG')
+# and its 'user_version' (that of version 1.2 of the standard).
+_APPLICATION_ID = 0x47504B47
+_USER_VERSION = 10200
+
+# These statements create the tables that every GeoPackage has.
+_TABLES = (
+  'CREATE TABLE gpkg_spatial_ref_sys ('
+  'srs_name TEXT NOT NULL, srs_id INTEGER PRIMARY KEY, '
+  'organization TEXT NOT NULL, organization_coordsys_id INTEGER NOT NULL, '
+  'definition TEXT NOT NULL, description TEXT)',
+  'CREATE TABLE gpkg_contents ('
+  'table_name TEXT NOT NULL PRIMARY KEY, data_type TEXT NOT NULL, '
+  'identifier TEXT UNIQUE, description TEXT DEFAULT \'\', '
+  'last_change DATETIME NOT NULL DEFAULT '
+  '(strftime(\'%Y-%m-%dT%H:%M:%fZ\', \'now\')), '
+  'min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE, '
+  'srs_id INTEGER, CONSTRAINT fk_gc_r_srs_id FOREIGN KEY (srs_id) '
+  'REFERENCES gpkg_spatial_ref_sys(srs_id))',
+  'CREATE TABLE gpkg_geometry_columns ('
+  'table_name TEXT NOT NULL, column_name TEXT NOT NULL, '
+  'geometry_type_name TEXT NOT NULL, srs_id INTEGER NOT NULL, '
+  'z TINYINT NOT NULL, m TINYINT NOT NULL, '
+  'CONSTRAINT pk_geom_cols PRIMARY KEY (table_name, column_name), '
+  'CONSTRAINT uk_gc_table_name UNIQUE (table_name), '
+  'CONSTRAINT fk_gc_tn FOREIGN KEY (table_name) '
+  'REFERENCES gpkg_contents(table_name), '
+  'CONSTRAINT fk_gc_srs FOREIGN KEY (srs_id) '
+  'REFERENCES gpkg_spatial_ref_sys (srs_id))')
+
+# These are the rows of the undefined spatial reference systems, which
+# every GeoPackage has (along with WGS 84).  The undefined Cartesian one
+# is used for layers that have no CRS.
+_UNDEFINED_SRS = (
+  ('Undefined cartesian SRS', -1, 'NONE', -1, 'undefined',
+   'undefined cartesian coordinate reference system'),
+  ('Undefined geographic SRS', 0, 'NONE', 0, 'undefined',
+   'undefined geographic coordinate reference system'))
+
+# This is the first ID given to a CRS that has no EPSG code.
+_FIRST_SRS_ID = 100000
+
+# This is the name of the geometry column of each layer (as in the
+# GeoPackages written by GDAL).
+GEOMETRY_COLUMN = 'geom'
+
+# This dictionary maps each field type to the type of its column (as
+# GDAL names them, so that it reads each field back with the same type).
+# Any field type not appearing in this dictionary is stored as text.
+_COLUMN_TYPES = {
+  ogr.OFTInteger: 'MEDIUMINT',
+  ogr.OFTInteger64: 'INTEGER',
+  ogr.OFTReal: 'REAL',
+  ogr.OFTDate: 'DATE',
+  ogr.OFTDateTime: 'DATETIME'}
+
+# This structure packs the header of a geometry in the GeoPackage binary
+# format: the magic number, the version (0), the flags (a little-endian
+# header, without an envelope) and the ID of its spatial reference system.
+# The header is followed by the geometry as (ISO) WKB.
+_GEOMETRY_HEADER = struct.Struct('<2sBBi')
+
+# This structure unpacks the (ISO) type of a WKB geometry, which follows
+# its byte order; its thousands give whether it has Z and/or M values.
+_WKB_TYPE = struct.Struct('<I')
+
+# This dictionary maps each curved geometry type (which GeoPackage
+# readers only support through an extension) to its name.
+_CURVE_NAMES = {
+  WKB_CIRCULAR_STRING: 'CIRCULARSTRING',
+  WKB_COMPOUND_CURVE: 'COMPOUNDCURVE',
+  WKB_MULTI_CURVE: 'MULTICURVE'}
+
+# This statement creates the table of extensions
+# (which a GeoPackage only has if it uses one).
+_EXTENSIONS_TABLE = (
+  'CREATE TABLE IF NOT EXISTS gpkg_extensions ('
+  'table_name TEXT, column_name TEXT, extension_name TEXT NOT NULL, '
+  'definition TEXT NOT NULL, scope TEXT NOT NULL, '
+  'CONSTRAINT ge_tce UNIQUE (table_name, column_name, extension_name))')
+
+# This is the definition of the extension for curved geometry types.
+_CURVE_EXTENSION = (
+  'http://www.geopackage.org/spec120/#extension_geometry_types')
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'BulkGeoPackageWriter' class
+# (which extends the 'GeoPackageWriter' class).
+class BulkGeoPackageWriter(GeoPackageWriter):
+    """
+    This class writes features to a new GeoPackage directly with SQLite.
+    The features of a batch are kept (as rows, with their geometries
+    already in the GeoPackage binary format) until it is committed, when
+    each layer's rows are inserted by a single prepared statement, which
+    is much faster than adding features one at a time through OGR.  GDAL
+    is only used to describe CRSs and to build spatial indexes.
+    """
+    format_name = 'GeoPackage (written directly with SQLite)'
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '__init__' method (i.e., the constructor), which
+    # is called when a new object of this class is instantiated.
+    def __init__(self, gpkg_path: str, feedback: 'QgsProcessingFeedback',
+          batch_size: int = 10000, batch_bytes: float = 0,
+          spatial_index: bool = True, index_fields: 'Iterable[str]' = (),
+          pragmas: 'Dict[str, str]' = None, in_memory: bool = False,
+          types: 'TypeRegistry' = None) -> None:
+        """
+        This method creates the GeoPackage at 'gpkg_path' (see
+        'GeoPackageWriter' for the other arguments).  Here, the dataset
+        is an SQLite connection, each entry of 'layers' is the header of
+        the layer's geometries, and the field setters of each layer are
+        just the conversion functions of its fields.
+        """
+
+        # This dictionary holds the rows of the current batch (if any),
+        # as a list for each statement that inserts them.  (A batch is
+        # only written to the GeoPackage when it is committed, so
+        # "in transaction" means that the batch has begun.)
+        self._rows = {}
+
+        # This dictionary maps the WKT of each CRS in the
+        # GeoPackage to its spatial reference system ID.
+        self._srs_ids = {}
+
+        # This is set once indexes have been asked for, if they can only
+        # be built when the GeoPackage is closed (i.e., written to disk).
+        self._indexes_pending = False
+
+        # These dictionaries map the name of each layer to the (WKB)
+        # types of the geometries added to it, and to those already
+        # recorded in the GeoPackage's tables (so that its Z and M
+        # flags, and any extensions for curves, match its geometries).
+        self._geometry_types = {}
+        self._recorded_types = {}
+
+        # These dictionaries map the name of each layer to the extent of
+        # its geometries (as minimum x, minimum y, maximum x and maximum y,
+        # or None if it has none yet), and to the extent last recorded in
+        # the GeoPackage's tables (so that it is known without an index).
+        self._extents = {}
+        self._recorded_extents = {}
+
+        super().__init__(gpkg_path, feedback, batch_size, batch_bytes,
+                         spatial_index, index_fields, pragmas, in_memory,
+                         types)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the '_open' method, which is called (once) by the constructor.
+    def _open(self, gpkg_path: str) -> 'sqlite3.Connection':
+        """
+        This method creates the GeoPackage (replacing any file already at
+        'gpkg_path'), with the tables that every GeoPackage has, and
+        returns the connection to it.  (It may be written to by another
+        thread; see 'WriterThread'.)
+        """
+        if self.in_memory:
+            gpkg_path = ':memory:'
+        elif path.exists(gpkg_path):
+            os.remove(gpkg_path)
+        connection = sqlite3.connect(gpkg_path, isolation_level=None,
+                                     check_same_thread=False)
+
+        # The pragmas are set before any tables are created,
+        # so that even the page size takes effect.
+        for name, value in self.pragmas.items():
+            connection.execute('PRAGMA ' + name + ' = ' + value)
+        connection.execute('PRAGMA application_id = ' +
+                           str(_APPLICATION_ID))
+        connection.execute('PRAGMA user_version = ' + str(_USER_VERSION))
+        for statement in _TABLES:
+            connection.execute(statement)
+        connection.executemany(
+          'INSERT INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?)',
+          _UNDEFINED_SRS)
+        self._dataset = connection
+        wgs84 = SpatialReference()
+        wgs84.ImportFromEPSG(4326)
+        self._add_srs(wgs84)
+        return connection
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_add_srs' method.
+    def _add_srs(self, srs: SpatialReference) -> int:
+        """
+        This method adds a CRS to the GeoPackage's spatial reference
+        systems (unless it is there already), and returns its ID: its
+        EPSG code, if it has one, or else a new ID.  A CRS that is not
+        defined (i.e., that was never set) is the undefined Cartesian
+        spatial reference system.
+        """
+        definition = srs.ExportToWkt()
+        if not definition:
+            return -1
+        srs_id = self._srs_ids.get(definition)
+        if srs_id is not None:
+            return srs_id
+
+        organization = srs.GetAuthorityName(None) or 'NONE'
+        code = srs.GetAuthorityCode(None)
+        if organization.upper() == 'EPSG' and code and code.isdigit():
+            srs_id = int(code)
+        else:
+            organization = 'NONE'
+            srs_id = _FIRST_SRS_ID + len(self._srs_ids)
+        self._dataset.execute(
+          'INSERT OR IGNORE INTO gpkg_spatial_ref_sys '
+          'VALUES (?, ?, ?, ?, ?, ?)',
+          (srs.GetName() or 'Unknown', srs_id, organization, srs_id,
+           definition, None))
+        self._srs_ids[definition] = srs_id
+        return srs_id
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the '_create_layer' method.
+    def _create_layer(self, name: str) -> bytes:
+        """
+        This method creates a layer (i.e., a table of features, and
+        its entries in the GeoPackage's tables), and returns the header
+        of its geometries.
+        """
+        self.commit()
+        self.feedback.pushInfo('Creating ' + name + ' layer')
+        srs_id = self._add_srs(self.srs)
+        connection = self._dataset
+        connection.execute(
+          'CREATE TABLE ' + _quote(name) + ' ('
+          'fid INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, ' +
+          _quote(GEOMETRY_COLUMN) + ' GEOMETRY)')
+        connection.execute(
+          'INSERT INTO gpkg_contents (table_name, data_type, identifier, '
+          'srs_id) VALUES (?, ?, ?, ?)', (name, 'features', name, srs_id))
+
+        # Geometries may be of any type, and may or may not have Z values
+        # (until some have been added; see '_record_geometries').
+        connection.execute(
+          'INSERT INTO gpkg_geometry_columns VALUES (?, ?, ?, ?, ?, ?)',
+          (name, GEOMETRY_COLUMN, 'GEOMETRY', srs_id, 2, 0))
+        header = _GEOMETRY_HEADER.pack(b'GP', 0, 1, srs_id)
+        self._unindexed.append(name)
+        self.layers[name] = header
+        self._field_setters[name] = {}
+        self._schema_versions[name] = 0
+        self._geometry_types[name] = set()
+        self._recorded_types[name] = set()
+        self._extents[name] = None
+        self._recorded_extents[name] = None
+        return header
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the '_create_field' method.
+    def _create_field(self, layer_name: str, name: str) -> 'Callable':
+        """
+        This method creates a field (i.e., a column) in a
+        layer, and returns the field's conversion function.
+        """
+        self.commit()
+        self.feedback.pushInfo('Creating ' + name + ' field'
+                               ' in ' + layer_name + ' layer')
+        type = self.types.field_type(layer_name, name)
+        self._dataset.execute(
+          'ALTER TABLE ' + _quote(layer_name) + ' ADD COLUMN ' +
+          _quote(name) + ' ' + _COLUMN_TYPES.get(type, 'TEXT'))
+        cast = _SETTERS.get(type, (None, str))[1]
+        self._field_setters[layer_name][name] = cast
+        self._schema_versions[layer_name] += 1
+        return cast
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the '_widen_field' method.
+    def _widen_field(self, layer_name: str, name: str, value: str) -> None:
+        """
+        This method changes the type of a field to text.  (SQLite cannot
+        change the type of a column, so the table is made again.)
+        """
+        self.commit()
+        self.feedback.pushInfo('Changing ' + name + ' field in ' +
+                               layer_name + ' layer to text (for the '
+                               'value ' + repr(value) + ')')
+        connection = self._dataset
+        table = _quote(layer_name)
+        copy = _quote(layer_name + '_pml_copy')
+        columns = connection.execute(
+          'PRAGMA table_info(' + table + ')').fetchall()
+        definitions = [
+          'fid INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL',
+          _quote(GEOMETRY_COLUMN) + ' GEOMETRY'] + [
+          _quote(column[1]) + ' ' + ('TEXT' if column[1] == name
+                                     else column[2])
+          for column in columns[2:]]
+        connection.execute('BEGIN')
+        try:
+            connection.execute('CREATE TABLE ' + copy + ' (' +
+                               ', '.join(definitions) + ')')
+            connection.execute('INSERT INTO ' + copy +
+                               ' SELECT * FROM ' + table)
+            connection.execute('DROP TABLE ' + table)
+            connection.execute('ALTER TABLE ' + copy + ' RENAME TO ' + table)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        self._field_setters[layer_name][name] = str
+        self._schema_versions[layer_name] += 1
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the '_prepare' method, which is called when a layout is first
+    # used (and again whenever the fields of its layer have changed).
+    def _prepare(self, layout: 'Layout') -> 'Tuple[Any, ...]':
+        """
+        This method creates the layer and fields of a layout as necessary,
+        and caches (in the layout) what is needed to write its features:
+        the statement that inserts them, the conversion functions of the
+        layout's fields (in order), and the number of changes to the
+        layer's fields at the time.
+        """
+        name = layout.name
+        if name not in self.layers:
+            self._create_layer(name)
+        casts = self._field_setters[name]
+        for field in layout.fields:
+            if field not in casts:
+                self._create_field(name, field)
+        columns = [GEOMETRY_COLUMN] + layout.fields
+        statement = ('INSERT INTO ' + _quote(name) + ' (' +
+                     ', '.join(_quote(column) for column in columns) +
+                     ') VALUES (' + ', '.join('?' * len(columns)) + ')')
+        layout.cache = (statement, [casts[field] for field in layout.fields],
+                        self._schema_versions[name])
+        return layout.cache
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the 'add_feature' method.
+    def add_feature(self, layout: 'Layout', values: 'Tuple',
+          geometry: bytes, position: int = 0) -> None:
+        """
+        This method adds a feature to the current batch (or, if there are
+        no transactions, inserts it at once).  See 'GeoPackageWriter'.
+        """
+        statement, row = self._fill(layout, values, geometry)
+        if self.batch_size < 1:
+            self._dataset.execute(statement, row)
+            return
+        self._begin(position)
+        rows = self._rows.get(statement)
+        if rows is None:
+            rows = self._rows[statement] = []
+        rows.append(row)
+        self._count(position)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the '_fill' method.
+    def _fill(self, layout: 'Layout', values: 'Tuple',
+          geometry: bytes) -> 'Tuple[str, List[Any]]':
+        """
+        This method returns the statement that inserts a feature of the
+        given layout, and the row of the feature: its geometry (in the
+        GeoPackage binary format) and field values.
+        """
+        cache = layout.cache
+        if (cache is None or len(cache[1]) < len(values) or
+              cache[2] != self._schema_versions[layout.name]):
+            cache = self._prepare(layout)
+        statement, casts, count = cache
+
+        # Convert each value by the field's type (changing the field to
+        # text, and starting again, if its type cannot hold the value),
+        # with no value for any fields beyond the end of the tuple.
+        if geometry is None:
+            row = [None]
+        else:
+            row = [self.layers[layout.name] + geometry]
+            self._geometry_types[layout.name].add(
+              _WKB_TYPE.unpack_from(geometry, 1)[0])
+            envelope = wkb_envelope(geometry)
+            extent = self._extents[layout.name]
+            if extent is None:
+                self._extents[layout.name] = envelope
+            elif envelope is not None:
+                self._extents[layout.name] = (
+                  min(extent[0], envelope[0]), min(extent[1], envelope[1]),
+                  max(extent[2], envelope[2]), max(extent[3], envelope[3]))
+        for slot, (value, cast) in enumerate(zip(values, casts)):
+            if value is not None:
+                try:
+                    value = cast(value)
+                except (ValueError, OverflowError):
+                    self._widen_field(layout.name, layout.fields[slot],
+                                      value)
+                    return self._fill(layout, values, geometry)
+            row.append(value)
+        if len(values) < len(casts):
+            row.extend([None] * (len(casts) - len(values)))
+        return statement, row
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the '_begin' method, which is called before
+    # adding a feature when no transaction is open.
+    def _begin(self, position: int) -> None:
+        """
+        This method starts a new batch of features.
+        """
+        if self._in_transaction:
+            return
+        self._in_transaction = True
+        self._batch_count = 0
+        self._batch_start = position
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the 'commit' method, which is called when a batch is
+    # full, before the schema changes, and when writing is complete.
+    def commit(self) -> None:
+        """
+        This method inserts the current batch of features
+        (if any) in a single transaction.
+        """
+        if not self._in_transaction:
+            self._record_geometries()
+            return
+
+        connection = self._dataset
+        connection.execute('BEGIN')
+        try:
+            for statement, rows in self._rows.items():
+                connection.executemany(statement, rows)
+            self._record_geometries()
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        self._rows = {}
+        self._in_transaction = False
+        if self.on_commit is not None:
+            self.on_commit()
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_record_geometries' method.
+    def _record_geometries(self) -> None:
+        """
+        This method records the geometries added to each layer since the
+        last call: it sets the layer's extent (which, if a spatial index
+        is built, is then replaced by the index's) and its Z and M flags
+        (1 if every geometry has the values, 0 if none has, or 2 if only
+        some have), and registers the extension of any curved type.
+        """
+        connection = self._dataset
+        for name, extent in self._extents.items():
+            if extent != self._recorded_extents[name]:
+                connection.execute(
+                  'UPDATE gpkg_contents SET min_x = ?, min_y = ?, '
+                  'max_x = ?, max_y = ? WHERE table_name = ?',
+                  extent + (name,))
+                self._recorded_extents[name] = extent
+        for name, types in self._geometry_types.items():
+            recorded = self._recorded_types[name]
+            if len(types) == len(recorded):
+                continue
+            flags = [[(wkb_type // 1000) in values for wkb_type in types]
+                     for values in ((1, 3), (2, 3))]
+            connection.execute(
+              'UPDATE gpkg_geometry_columns SET z = ?, m = ? '
+              'WHERE table_name = ?',
+              tuple(1 if all(has) else 2 if any(has) else 0
+                    for has in flags) + (name,))
+            curves = {_CURVE_NAMES.get(wkb_type % 1000)
+                      for wkb_type in types - recorded} - {None}
+            if curves:
+                connection.execute(_EXTENSIONS_TABLE)
+                connection.executemany(
+                  'INSERT OR IGNORE INTO gpkg_extensions '
+                  'VALUES (?, ?, ?, ?, ?)',
+                  [(name, GEOMETRY_COLUMN, 'gpkg_geom_' + curve,
+                    _CURVE_EXTENSION, 'read-write') for curve in curves])
+            recorded.update(types)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the 'rollback' method, which is called when
+    # the conversion is canceled or an error occurs.
+    def rollback(self) -> None:
+        """
+        This method discards the current batch of features (if any),
+        along with the types and extent of its geometries.
+        """
+        self._rows = {}
+        self._in_transaction = False
+        for name, types in self._geometry_types.items():
+            types.intersection_update(self._recorded_types[name])
+        self._extents.update(self._recorded_extents)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the 'create_indexes' method, which is
+    # called once every feature has been written.
+    def create_indexes(self) -> None:
+        """
+        This method creates the indexes of the new layers (see
+        'GeoPackageWriter'), or, if the GeoPackage is being built in
+        memory, has them created once it has been written to disk.
+        """
+        self.commit()
+        if self.in_memory:
+            self._indexes_pending = True
+        else:
+            self._build_indexes()
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_build_indexes' method.
+    def _build_indexes(self) -> None:
+        """
+        This method creates the indexes of the new layers, using GDAL
+        (which provides the SQL functions that fill a spatial index), and
+        records the extent of each layer that has a spatial index.
+        """
+        layers = {}
+        for name in self._unindexed:
+            spatial = self.spatial_index
+            fields = [field for field in self.index_fields
+                      if field in self._field_setters[name]]
+            if spatial or fields:
+                layers[name] = (spatial, fields)
+        self._unindexed = []
+        if not layers:
+            return
+
+        with sqlite_pragmas(self.pragmas):
+            dataset = gdal.OpenEx(self.gpkg_path,
+                                  gdal.OF_VECTOR | gdal.OF_UPDATE)
+        if dataset is None:
+            raise IOError('Cannot open ' + self.gpkg_path + ' for update')
+        for name, (spatial, fields) in layers.items():
+            self.feedback.pushInfo('Creating indexes of ' + name + ' layer')
+            build_indexes(dataset, dataset.GetLayerByName(name),
+                          spatial, fields)
+            if spatial:
+                rtree = _quote('rtree_' + name + '_' + GEOMETRY_COLUMN)
+                dataset.ExecuteSQL(
+                  'UPDATE gpkg_contents SET ' + ', '.join(
+                    column + ' = (SELECT ' + function + '(' + bound +
+                    ') FROM ' + rtree + ')'
+                    for column, function, bound in (
+                      ('min_x', 'MIN', 'minx'), ('min_y', 'MIN', 'miny'),
+                      ('max_x', 'MAX', 'maxx'), ('max_y', 'MAX', 'maxy'))) +
+                  ' WHERE table_name = ' + _quote(name, "'"))
+        dataset = None
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the 'close' method.
+    def close(self) -> None:
+        """
+        This method commits any outstanding features, closes the
+        connection (having first written the GeoPackage to its file, if
+        it was built in memory), and creates any indexes still pending.
+        """
+        self.commit()
+        self.layers.clear()
+        if self.in_memory:
+            if path.exists(self.gpkg_path):
+                os.remove(self.gpkg_path)
+            self._dataset.execute(
+              'VACUUM INTO ' + _quote(self.gpkg_path, "'"))
+        self._dataset.close()
+        self._dataset = None
+        if self._indexes_pending:
+            self._indexes_pending = False
+            self._build_indexes()
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+This module defines the 'ConversionCache' class, which keeps copies of
+the GeoPackages converted from PipelineML files, so that converting the
+same file again (with the same converter and options) only takes a copy.
+"""
+
+
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from os import path
+
+
+# This is the number of bytes read at a time while hashing a file.
+_READ_SIZE = 1048576
+
+# This is the version of the converter (see 'converter_version'),
+# once it has been determined.
+_version = None
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'default_directory' function.
+def default_directory() -> str:
+    """
+    This function returns the usual directory for the cache of the
+    current user (e.g., '~/.cache/pml_geopackager' on Linux).
+    """
+    base = (os.environ.get('XDG_CACHE_HOME')
+            or os.environ.get('LOCALAPPDATA')
+            or path.join(path.expanduser('~'), '.cache'))
+    return path.join(base, 'pml_geopackager')
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'converter_version' function.
+def converter_version() -> str:
+    """
+    This function returns a string that changes whenever the converter
+    does: the plugin version, and a hash of the plugin's source code.
+    """
+    global _version
+    if _version is None:
+        directory = path.dirname(path.abspath(__file__))
+        digest = hashlib.blake2b(digest_size=16)
+        for name in sorted(glob.glob(path.join(directory, '*.py'))):
+            with open(name, 'rb') as source_file:
+                digest.update(source_file.read())
+        version = ''
+        with open(path.join(directory, 'metadata.txt'),
+                  encoding='utf-8') as metadata_file:
+            for line in metadata_file:
+                if line.startswith('version='):
+                    version = line[8:].strip()
+        _version = version + '-' + digest.hexdigest()
+    return _version
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_hash_file' function.
+def _hash_file(file_path: str) -> str:
+    """
+    This function returns a hash of the contents of a file.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as hashed_file:
+        while True:
+            data = hashed_file.read(_READ_SIZE)
+            if not data:
+                return digest.hexdigest()
+            digest.update(data)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_hash_json' function.
+def _hash_json(value: 'Any') -> str:
+    """
+    This function returns a hash of a value (as JSON).
+    """
+    return hashlib.blake2b(
+      json.dumps(value, sort_keys=True).encode('utf-8'),
+      digest_size=20).hexdigest()
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'ConversionCache' class.
+class ConversionCache:
+    """
+    This class manages a directory of cached GeoPackages, each stored with
+    the names of its layers and its feature counts.  Entries are removed in
+    least-recently-used order to keep the cache within its size limit.
+    (The modification time of each entry records when it was last used, so
+    that several processes can share the cache without an index file.)
+    Entries are keyed by the content of the PipelineML file; the hash of
+    that content is also kept under the file's path, size and modification
+    time, so that a file that has not changed is not read again.
+    """
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '__init__' method (i.e., the constructor), which
+    # is called when a new object of this class is instantiated.
+    def __init__(self, directory: str, megabytes: float = 1024) -> None:
+        """
+        This method sets up a cache in 'directory' (which is created
+        when first needed) that holds at most 'megabytes' of GeoPackages.
+        """
+        self.directory = directory
+        self.max_bytes = megabytes * 1048576
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'key' method.
+    def key(self, pml_path: str, options: 'Dict[str, Any]') -> str:
+        """
+        This method returns the key of the cache entry for converting
+        the PipelineML file at 'pml_path' with the given options.  The key
+        covers the file's content (wherever it is) and the converter's
+        version.
+        """
+        identity = [self._content_hash(pml_path), converter_version(),
+                    options]
+        return _hash_json(identity)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_content_hash' method.
+    def _content_hash(self, file_path: str) -> str:
+        """
+        This method returns the hash of a file's content, as recorded for
+        the file's path, size and modification time (or, if none has been
+        recorded, by reading the whole file, and then records it).
+        """
+        status = os.stat(file_path)
+        hash_path = path.join(self.directory, _hash_json(
+          [path.abspath(file_path), status.st_size,
+           status.st_mtime_ns]) + '.hash')
+        try:
+            with open(hash_path, encoding='utf-8') as hash_file:
+                content_hash = hash_file.read()
+            if content_hash:
+                os.utime(hash_path)
+                return content_hash
+        except OSError:
+            pass
+
+        # Record the hash for next time (if the cache can be written).
+        content_hash = _hash_file(file_path)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            descriptor, temporary_path = tempfile.mkstemp(
+              dir=self.directory)
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as hash_file:
+                hash_file.write(content_hash)
+            os.replace(temporary_path, hash_path)
+        except OSError:
+            pass
+        return content_hash
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_paths' method.
+    def _paths(self, key: str) -> 'Tuple[str, str]':
+        """
+        This method returns the paths of the GeoPackage
+        and the information file of a cache entry.
+        """
+        base = path.join(self.directory, key)
+        return base + '.gpkg', base + '.json'
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'fetch' method.
+    def fetch(self, key: str, gpkg_path: str) -> 'Optional[Dict[str, Any]]':
+        """
+        This method copies the GeoPackage of a cache entry to 'gpkg_path'
+        and returns the entry's information (or returns None if there is
+        no such entry).
+        """
+        entry_path, info_path = self._paths(key)
+        try:
+            with open(info_path, encoding='utf-8') as info_file:
+                info = json.load(info_file)
+            shutil.copyfile(entry_path, gpkg_path)
+
+            # Mark the entry as the most recently used.  (Another
+            # process may have evicted it since.)
+            os.utime(entry_path)
+        except (OSError, ValueError):
+            return None
+        return info
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'store' method.
+    def store(self, key: str, gpkg_path: str,
+          info: 'Dict[str, Any]') -> None:
+        """
+        This method adds a copy of the GeoPackage at 'gpkg_path' (with the
+        given information) to the cache, and evicts entries as needed.
+        If the cache cannot be written (e.g., the disk is full), an
+        OSError is raised, having removed any partial files.
+        """
+        if path.getsize(gpkg_path) > self.max_bytes:
+            return
+        entry_path, info_path = self._paths(key)
+
+        # Write each file under a temporary name first, so that other
+        # processes never see a partial entry.
+        temporary_path = None
+        partial_paths = []
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            descriptor, temporary_path = tempfile.mkstemp(
+              dir=self.directory)
+            os.close(descriptor)
+            shutil.copyfile(gpkg_path, temporary_path)
+            os.replace(temporary_path, entry_path)
+            partial_paths.append(entry_path)
+            descriptor, temporary_path = tempfile.mkstemp(
+              dir=self.directory)
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as info_file:
+                json.dump(info, info_file)
+            os.replace(temporary_path, info_path)
+        except OSError:
+            if temporary_path is not None:
+                partial_paths.append(temporary_path)
+            for file_path in partial_paths:
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    pass
+            raise
+        self.evict()
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'evict' method.
+    def evict(self) -> None:
+        """
+        This method removes the least recently used entries until the
+        cache is within its size limit, along with the recorded hashes
+        that have not been used since the last entry removed was.
+        """
+        entries = []
+        for entry_path in glob.glob(path.join(self.directory, '*.gpkg')):
+            try:
+                status = os.stat(entry_path)
+            except OSError:
+                continue
+            entries.append((status.st_mtime, status.st_size, entry_path))
+        total = sum(size for used, size, entry_path in entries)
+        last_used = None
+        for used, size, entry_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for file_path in (entry_path, entry_path[:-5] + '.json'):
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    pass
+            total -= size
+            last_used = used
+        if last_used is None:
+            return
+        for hash_path in glob.glob(path.join(self.directory, '*.hash')):
+            try:
+                if os.stat(hash_path).st_mtime <= last_used:
+                    os.remove(hash_path)
+            except OSError:
+                pass
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+This module implements the 'pml2gpkg' command-line interface,
+which converts PipelineML files without running QGIS.
+"""
+
+
+import argparse
+from os import path
+from .batch import convert_many
+from .cache import default_directory
+from .profiles import PRAGMAS, PROFILES, parse_pragmas
+from .converter import convert
+from .feedback import ConsoleFeedback
+from .sinks import FORMATS
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_create_parser' function, which
+# defines the command-line arguments.
+def _create_parser() -> argparse.ArgumentParser:
+    """
+    This function returns a parser for the command-line arguments.
+    """
+    parser = argparse.ArgumentParser(
+      prog='pml2gpkg',
+      description='Translate PipelineML files into GeoPackages.  Given '
+                  'several input files or a directory, the files are '
+                  'converted in parallel, either to one GeoPackage each '
+                  '(in the output directory) or, with --merge, to a single '
+                  'GeoPackage.')
+    parser.add_argument('input', nargs='+',
+                        help='source PipelineML file(s) (possibly '
+                             'compressed, as .gz or .zip) or directory, '
+                             'or - for standard input')
+    parser.add_argument('output',
+                        help='destination GeoPackage (or directory)')
+    parser.add_argument(
+      '-f', '--format', choices=list(FORMATS), default='gpkg',
+      help='output format: a GeoPackage written through OGR (gpkg) or '
+           'directly with SQLite (gpkg-bulk), or a directory with a '
+           'FlatGeobuf or GeoParquet file for each layer '
+           '(default: %(default)s)')
+    parser.add_argument(
+      '-j', '--jobs', type=int, metavar='N',
+      help='number of worker processes (default: one per CPU for several '
+           'input files; for a single file, parse it in this process)')
+    parser.add_argument(
+      '--merge', action='store_true',
+      help='merge several input files into a single GeoPackage')
+    parser.add_argument(
+      '--layer', dest='layers', action='append', metavar='NAME',
+      help='only convert this layer (i.e., component type; may be given '
+           'more than once)')
+    parser.add_argument(
+      '--exclude-layer', dest='exclude_layers', action='append',
+      default=[], metavar='NAME',
+      help='do not convert this layer (may be given more than once)')
+    parser.add_argument(
+      '--bbox', nargs=4, type=float,
+      metavar=('XMIN', 'YMIN', 'XMAX', 'YMAX'),
+      help='only convert components whose geometries intersect this '
+           'box (in the coordinates of the input)')
+    parser.add_argument(
+      '--batch-size', type=int, default=10000, metavar='N',
+      help='features per transaction (0 disables transactions; '
+           'default: %(default)s)')
+    parser.add_argument(
+      '--batch-megabytes', type=float, default=64, metavar='M',
+      help='megabytes of PipelineML per transaction '
+           '(0 for no limit; default: %(default)s)')
+    parser.add_argument(
+      '--prescan', action='store_true',
+      help='scan the input for layers and fields before converting it')
+    parser.add_argument(
+      '--schema', metavar='FILE',
+      help='read layers and fields from this JSON file (or, if it does '
+           'not exist, scan the input and write them to it)')
+    parser.add_argument(
+      '--types', metavar='FILE',
+      help='read field types from this JSON file (mapping field names, '
+           'or LAYER.FIELD, to String, Integer, Integer64, Real, Date or '
+           'DateTime)')
+    parser.add_argument(
+      '--xsd', metavar='FILE',
+      help='take field types from this PipelineML XML schema')
+    parser.add_argument(
+      '--infer-types', action='store_true',
+      help='infer the types of other fields from a sample of the input')
+    parser.add_argument(
+      '--update', action='store_true',
+      help='update the output GeoPackage if it exists, writing only the '
+           'features that have changed (matched by the key field)')
+    parser.add_argument(
+      '--key-field', default='id', metavar='NAME',
+      help='field that identifies each component when updating '
+           '(default: %(default)s)')
+    parser.add_argument(
+      '--index', action='append', default=[], metavar='FIELD',
+      help='create an index on this field in every layer that has it '
+           '(may be given more than once)')
+    parser.add_argument(
+      '--no-spatial-index', dest='spatial_index', action='store_false',
+      help='do not create spatial indexes')
+    parser.add_argument(
+      '--profile', choices=list(PROFILES), default='default',
+      help='output performance profile: SQLite settings that trade '
+           'durability for speed (default: %(default)s)')
+    parser.add_argument(
+      '--pragma', action='append', default=[], metavar='NAME=VALUE',
+      help='set an SQLite pragma, replacing that of the profile (one of '
+           + ', '.join(PRAGMAS) + '; may be given more than once)')
+    parser.add_argument(
+      '--in-memory', action='store_true',
+      help='build the GeoPackage in memory, and write it to the output '
+           'file in a single pass at the end')
+    parser.add_argument(
+      '--low-memory', action='store_true',
+      help='limit the memory used, whatever the size of the input (by '
+           'parsing coordinates incrementally, and limiting the writer '
+           'queue, batches and the SQLite cache)')
+    parser.add_argument(
+      '--cache', nargs='?', const=default_directory(), metavar='DIR',
+      help='keep converted GeoPackages in a cache (by default, in '
+           '%(const)s), so that converting an unchanged file again only '
+           'copies its GeoPackage')
+    parser.add_argument(
+      '--cache-megabytes', type=float, default=1024, metavar='M',
+      help='size limit of the cache (default: %(default)s)')
+    parser.add_argument(
+      '--queue-size', type=int, default=64, metavar='N',
+      help='blocks of features queued for the writer thread (0 writes '
+           'them in the parsing thread; default: %(default)s)')
+    parser.add_argument(
+      '-v', '--verbose', action='store_true',
+      help='log every feature (for debugging)')
+    parser.add_argument(
+      '--timing', action='store_true',
+      help='time each stage of the conversion, logging a summary and '
+           'writing a report (OUTPUT.report.json) next to the output')
+    parser.add_argument(
+      '--cprofile', action='store_true',
+      help='with --timing, also profile the conversion with cProfile '
+           '(writing OUTPUT.prof)')
+    parser.add_argument(
+      '-q', '--quiet', action='store_true',
+      help='only report errors')
+    parser.add_argument(
+      '--progress', action='store_true',
+      help='show the percentage of the input processed')
+    return parser
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'main' function, which runs the command-line
+# interface and returns the process exit status.
+def main(argv: 'List[str]' = None) -> int:
+    """
+    This function converts a PipelineML file as directed
+    by the command-line arguments ('argv').
+    """
+    parser = _create_parser()
+    args = parser.parse_args(argv)
+    try:
+        pragmas = parse_pragmas(','.join(args.pragma))
+    except ValueError as error:
+        parser.error(str(error))
+    feedback = ConsoleFeedback(quiet=args.quiet, progress=args.progress)
+    options = {'batch_size': args.batch_size,
+               'batch_megabytes': args.batch_megabytes,
+               'verbose': args.verbose,
+               'timing': args.timing,
+               'cprofile': args.cprofile,
+               'prescan': args.prescan,
+               'schema_path': args.schema,
+               'queue_size': args.queue_size,
+               'update': args.update,
+               'key_field': args.key_field,
+               'cache_dir': args.cache,
+               'cache_megabytes': args.cache_megabytes,
+               'spatial_index': args.spatial_index,
+               'index_fields': args.index,
+               'profile': args.profile,
+               'pragmas': pragmas,
+               'in_memory': args.in_memory,
+               'format': args.format,
+               'layers': args.layers,
+               'exclude_layers': args.exclude_layers,
+               'bbox': args.bbox,
+               'types_path': args.types,
+               'xsd_path': args.xsd,
+               'infer_types': args.infer_types,
+               'low_memory': args.low_memory}
+
+    # A single input file is converted in this process;
+    # anything else is a batch, converted by worker processes.
+    try:
+        if (len(args.input) == 1 and not path.isdir(args.input[0])
+              and not args.merge):
+            convert(args.input[0], args.output, feedback,
+                    jobs=args.jobs or 1, **options)
+        else:
+            summary = convert_many(args.input, args.output, args.merge,
+                                   args.jobs, feedback, **options)
+            if summary['failed'] > 0:
+                return 1
+    except KeyboardInterrupt:
+        feedback.reportError('Interrupted')
+        return 130
+    except Exception as error:
+        feedback.reportError(str(error))
+        return 1
+    return 0
@@ -0,0 +1,595 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+This module defines the 'PipelineMLConverter' class and the 'convert'
+function.  It depends only on the Python standard library and GDAL/OGR
+(not QGIS), so it can be used in scripts and on headless servers.
+"""
+
+
+import os
+from os import path
+from .cache import ConversionCache
+from .feedback import ConsoleFeedback
+from .fieldtypes import load_types, sample_types
+from .instrumentation import Instrumentation
+from .parallel import read_chunks, scan_header, split
+from .pipeline import WriterThread
+from .profiles import profile_pragmas
+from .progress import ProgressReporter
+from .reader import PipelineMLReader, keeps_layer
+from .records import Layout
+from .schema import load_schema, save_schema, scan_schema
+from .sinks import FORMATS
+from .source import STDIN, PipelineMLSource
+from .update import GeoPackageUpdater
+
+
+# These are the limits of a low-memory conversion: the characters of a
+# list of coordinates collected before they are parsed, the blocks of
+# features queued for the writer thread, the megabytes of PipelineML per
+# transaction and per chunk parsed by a worker process, and the SQLite
+# pragmas (a small page cache, with the rollback journal and temporary
+# tables on disk rather than in memory).
+LOW_MEMORY = {
+  'text_limit': 1048576,
+  'queue_size': 4,
+  'batch_megabytes': 16,
+  'chunk_megabytes': 4,
+  'pragmas': {'cache_size': '-2048', 'journal_mode': 'DELETE',
+              'temp_store': 'FILE'}}
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_Canceled' exception class, which is raised (between
+# chunks of the input) to abort parsing when the user cancels.
+class _Canceled(Exception):
+    """
+    This class signals that the conversion has been canceled.
+    """
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'PipelineMLConverter' class.
+class PipelineMLConverter:
+    """
+    This class translates a PipelineML file into a GeoPackage.  All of
+    the state of a conversion belongs to the converter object, so any
+    number of conversions may run at the same time (each with its own
+    converter object).
+    """
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '__init__' method (i.e., the constructor), which
+    # is called when a new object of this class is instantiated.
+    def __init__(self, feedback: 'QgsProcessingFeedback',
+          batch_size: int = 10000, batch_megabytes: float = 64,
+          verbose: bool = False, jobs: int = 1,
+          chunk_megabytes: float = 16, prescan: bool = False,
+          schema_path: str = None, queue_size: int = 64,
+          update: bool = False, key_field: str = 'id',
+          cache_dir: str = None, cache_megabytes: float = 1024,
+          spatial_index: bool = True, index_fields: 'Iterable[str]' = (),
+          profile: str = 'default', pragmas: 'Dict[str, str]' = None,
+          in_memory: bool = False, timing: bool = False,
+          cprofile: bool = False,
+          format: str = 'gpkg', layers: 'Iterable[str]' = None,
+          exclude_layers: 'Iterable[str]' = (),
+          bbox: 'Tuple[float, float, float, float]' = None,
+          xsd_path: str = None, types_path: str = None,
+          infer_types: bool = False, low_memory: bool = False,
+          handle_commit: 'Callable[[Dict[str, int]], None]' = None) -> None:
+        """
+        This method saves the conversion options, which are described
+        below by concern (every option has a default, so only
+        'feedback' is needed).  The 'feedback' object must provide
+        'setProgress', 'pushInfo', 'reportError' and 'isCanceled' methods.
+        """
+        if format not in FORMATS:
+            raise ValueError('Unknown format ' + format + ' (expected ' +
+                             ', '.join(FORMATS) + ')')
+        if update and FORMATS[format].extension != '.gpkg':
+            raise ValueError('Only GeoPackages can be updated')
+        if update and (layers is not None or exclude_layers
+                       or bbox is not None):
+            raise ValueError('A GeoPackage cannot be updated from part of '
+                             'a file (the rest would be deleted)')
+        if update and in_memory:
+            raise ValueError('A GeoPackage cannot be updated in memory')
+        if update and low_memory:
+            raise ValueError('A GeoPackage cannot be updated in low-memory '
+                             'mode (the key of every feature is kept)')
+        if low_memory and in_memory:
+            raise ValueError('A GeoPackage cannot be built in memory '
+                             'in low-memory mode')
+        self.feedback = feedback
+
+        # Output: the 'format' is one of those in 'sinks.FORMATS'; formats
+        # other than GeoPackage are written to a directory, with a file for
+        # each layer, and need the schema in advance.  If 'update' is set,
+        # an existing GeoPackage is updated rather than replaced, matching
+        # features by their 'key_field' field (see 'GeoPackageUpdater').
+        self.format = format
+        self.update = update
+        self.key_field = key_field
+
+        # Batches: features are committed in transactions of at most
+        # 'batch_size' features or 'batch_megabytes' of PipelineML (zero
+        # disables either limit; a 'batch_size' of zero disables
+        # transactions altogether).  If 'handle_commit' is given, it is
+        # called (in the writing thread) after each commit, with the number
+        # of features then in the GeoPackage for each layer.
+        self.batch_size = batch_size
+        self.batch_bytes = batch_megabytes * 1048576
+        self.handle_commit = handle_commit
+
+        # Parsing: if 'jobs' is more than one (or zero, for one per CPU),
+        # the file is split into chunks of about 'chunk_megabytes' parsed
+        # by that many worker processes.  Otherwise, features are written
+        # by a separate thread, through a queue of up to 'queue_size'
+        # blocks of features (zero writes them in the parsing thread).
+        self.jobs = jobs if jobs > 0 else os.cpu_count() or 1
+        self.chunk_size = int(chunk_megabytes * 1048576)
+        self.queue_size = queue_size
+
+        # Schema and types: if 'prescan' is set, the file is scanned for
+        # its schema first, so that every layer is created with all of its
+        # fields; if 'schema_path' is given, the schema is read from that
+        # JSON file (or scanned and saved to it).  Fields are given the
+        # built-in PipelineML types, those of the XML schema at 'xsd_path'
+        # and those in the JSON file at 'types_path' (which take
+        # precedence); if 'infer_types' is set, the types of other fields
+        # are inferred from a sample of the file (see 'fieldtypes').
+        self.prescan = prescan
+        self.schema_path = schema_path
+        self.types = load_types(xsd_path, types_path)
+        self.infer_types = infer_types
+
+        # Filters: only the layers named in 'layers' (if given) and not in
+        # 'exclude_layers' are converted, and only the features whose
+        # geometries intersect 'bbox' (minimum x, minimum y, maximum x and
+        # maximum y, in the file's coordinates); the rest are skipped as
+        # the file is parsed.
+        self.layers = None if layers is None else sorted(set(layers))
+        self.exclude_layers = sorted(set(exclude_layers))
+        self.bbox = None if bbox is None else tuple(bbox)
+
+        # Indexes and SQLite: once every feature has been written, each
+        # layer is given a spatial index (unless 'spatial_index' is
+        # cleared) and an index on each of the 'index_fields' it has.  The
+        # GeoPackage is written with the pragmas of the output 'profile'
+        # (overridden by any 'pragmas' given), and is built in memory (and
+        # written in a single pass) if 'in_memory' is set.
+        self.spatial_index = spatial_index
+        self.index_fields = list(index_fields)
+        self.pragmas = profile_pragmas(profile, pragmas)
+        self.in_memory = in_memory
+
+        # Cache: if 'cache_dir' is given, GeoPackages are kept in a cache
+        # there (of up to 'cache_megabytes'), and converting the same file
+        # again only takes a copy (see 'ConversionCache').
+        self.cache_dir = cache_dir
+        self.cache_megabytes = cache_megabytes
+
+        # Debugging: if 'verbose' is set, a message is logged for every
+        # feature.  If 'timing' is set, the time spent in each stage is
+        # measured (see 'Instrumentation'), and a report is written next to
+        # the output (with a 'cProfile' profile, if 'cprofile' is set).
+        self.verbose = verbose
+        self.timing = timing
+        self.cprofile = cprofile
+
+        # Memory: if 'low_memory' is set, the memory used does not grow
+        # with the size of the file (see 'LOW_MEMORY'), except for the size
+        # of a single geometry.  (It cannot be combined with 'update',
+        # which keeps the key and hash of every feature.)
+        self.low_memory = low_memory
+        self.text_limit = 0
+
+        # Apply the limits of a low-memory conversion (keeping the
+        # queue, batch and chunk sizes given, where they are smaller).
+        if low_memory:
+            self.text_limit = LOW_MEMORY['text_limit']
+            self.queue_size = min(queue_size, LOW_MEMORY['queue_size'])
+            self.batch_bytes = min(
+              self.batch_bytes or float('inf'),
+              LOW_MEMORY['batch_megabytes'] * 1048576)
+            self.chunk_size = min(self.chunk_size,
+                                  LOW_MEMORY['chunk_megabytes'] * 1048576)
+            self.pragmas.update(LOW_MEMORY['pragmas'])
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'convert' method, which performs the
+    # conversion and returns the names of the layers created.
+    def convert(self, pml_path: str, gpkg_path: str) -> 'List[str]':
+        """
+        This method translates the contents of the PipelineML file at
+        'pml_path' into a new GeoPackage at 'gpkg_path'.  The file may be
+        compressed (if its name ends with '.gz' or '.zip'); if 'pml_path'
+        is '-', PipelineML is read from standard input.
+        """
+        self.canceled = False
+
+        # Use the cache (if any) unless updating, which depends on the
+        # existing GeoPackage, reading a stream, which can't be hashed, or
+        # writing a directory, which the cache can't hold.
+        if (self.cache_dir is None or self.update or pml_path == STDIN
+              or not FORMATS[self.format].extension):
+            return self._convert(pml_path, gpkg_path)
+        cache = ConversionCache(self.cache_dir, self.cache_megabytes)
+        key = cache.key(pml_path, self._cache_options())
+        info = cache.fetch(key, gpkg_path)
+        if info is not None:
+            self.feedback.pushInfo('Copied ' + gpkg_path + ' from the cache')
+
+            # Save the schema, as the conversion would have.
+            if (self.schema_path is not None and info.get('schema')
+                  and not path.exists(self.schema_path)):
+                save_schema(self.schema_path, info['schema'])
+            self.feedback.setProgress(100)
+            self.counts = info['counts']
+            return info['layers']
+
+        # Only a complete conversion is worth keeping.
+        layer_names = self._convert(pml_path, gpkg_path)
+        if not self.canceled:
+            info = {'layers': layer_names, 'counts': self.counts}
+            if self.schema_path is not None and path.exists(self.schema_path):
+                info['schema'] = load_schema(self.schema_path)
+            try:
+                cache.store(key, gpkg_path, info)
+            except OSError as error:
+                self.feedback.reportError(
+                  'Could not keep ' + gpkg_path + ' in the cache (' +
+                  str(error) + ')')
+        return layer_names
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_cache_options' method.
+    def _cache_options(self) -> 'Dict[str, Any]':
+        """
+        This method returns the options that affect the contents of the
+        GeoPackage (as opposed to how quickly it is made), which are part
+        of the cache key.  (The schema is given by its content, if the
+        schema file exists, since the file may change.)
+        """
+        schema = None
+        if self.schema_path is not None and path.exists(self.schema_path):
+            schema = load_schema(self.schema_path)
+        return {'schema': schema, 'schema_file': self.schema_path is not None,
+                'spatial_index': self.spatial_index,
+                'index_fields': self.index_fields,
+                'format': self.format, 'types': self.types.types,
+                'infer_types': self.infer_types, **self._reader_options()}
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_reader_options' method.
+    def _reader_options(self) -> 'Dict[str, Any]':
+        """
+        This method returns the options of the reader: which
+        layers and features are to be converted.
+        """
+        return {'layers': self.layers, 'exclude_layers': self.exclude_layers,
+                'bbox': self.bbox}
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'layer_path' method.
+    def layer_path(self, gpkg_path: str, name: str) -> str:
+        """
+        This method returns the path by which QGIS can open the
+        named layer of the output written to 'gpkg_path'.
+        """
+        return FORMATS[self.format].layer_path(gpkg_path, name)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_convert' method, which is called by 'convert'.
+    def _convert(self, pml_path: str, gpkg_path: str) -> 'List[str]':
+        """
+        This method performs the conversion.
+        """
+
+        # Open the PipelineML file (or standard input) for reading.
+        with PipelineMLSource(pml_path) as source:
+            # Set up the object that throttles progress and log messages
+            # (based on how much of the file has been read, if its size
+            # is known).
+            self._source = source
+            self._progress = ProgressReporter(self.feedback, source.size,
+                                              self.verbose)
+
+            # Determine the types of the fields (inferring those of any
+            # other fields, if asked to).
+            types = self.types
+            if self.infer_types:
+                types = self._infer_types(source)
+
+            # Create the output (e.g., a GeoPackage), or open the
+            # GeoPackage if it is to be updated.
+            if self.update:
+                self._writer = GeoPackageUpdater(
+                  gpkg_path, self.feedback, self.batch_size,
+                  self.batch_bytes, self.key_field, self.spatial_index,
+                  self.index_fields, self.pragmas, types)
+            else:
+                self._writer = FORMATS[self.format](
+                  gpkg_path, self.feedback, self.batch_size,
+                  self.batch_bytes, self.spatial_index, self.index_fields,
+                  self.pragmas, self.in_memory, types)
+            self._layouts = {}
+
+            # Set up the instrumentation (if any) of the conversion.
+            # (Features are written within the reader's 'features' stage
+            # only when they are written in the parsing thread.)
+            create_schema = self._create_schema
+            self._instrumentation = None
+            if self.timing:
+                self._instrumentation = Instrumentation(self.cprofile)
+                self._instrumentation.instrument_source(source)
+                self._instrumentation.instrument_writer(
+                  self._writer, 'features' if self.queue_size < 1 else None)
+                create_schema = self._instrumentation.timed(
+                  create_schema, 'schema')
+                self._instrumentation.start()
+
+            # Report each batch as it is committed (if asked to).
+            if self.handle_commit is not None:
+                self._report_commits()
+
+            # Discard the current batch if the user cancels or an error
+            # occurs, and otherwise commit the final batch.
+            try:
+                # Create the layers and fields first, if the schema is
+                # to be determined in advance (or the output needs it).
+                if (self.prescan or self.schema_path is not None
+                      or self._writer.needs_schema):
+                    create_schema(source)
+
+                if self.jobs > 1 and source.is_plain:
+                    self._read_parallel(source.file, pml_path)
+                else:
+                    self._read(source)
+
+                # When updating, the features that are no longer
+                # present can only be deleted once all have been read.
+                if self.update:
+                    self._writer.remove_missing()
+                self._writer.create_indexes()
+            except _Canceled:
+                self.canceled = True
+                self._writer.rollback()
+            except BaseException:
+                if self._instrumentation is not None:
+                    self._instrumentation.stop()
+                self._writer.rollback()
+                self._writer.close()
+                raise
+            self._progress.finish()
+            bytes_read = source.position
+
+        # Close the GeoPackage, keeping the names of its layers
+        # and the number of features added to each layer.
+        layer_names = list(self._writer.layers)
+        self._writer.close()
+        self.counts = self._progress.counts
+
+        # Report the measurements (if any).
+        if self._instrumentation is not None:
+            self._instrumentation.stop()
+            self._instrumentation.counters['bytes read'] = bytes_read
+            self._instrumentation.save(gpkg_path, self.counts, self.feedback)
+        return layer_names
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_report_commits' method.
+    def _report_commits(self) -> None:
+        """
+        This method has the writer call 'handle_commit' once each batch
+        of features is committed (see the writer's 'on_commit').  Features
+        are counted (in the writer's thread) once the writer has them, so
+        those counted by then are in the batch committed or an earlier
+        one.
+        """
+        counts = self._progress.counts
+        handle_commit = self.handle_commit
+
+        def report_commit() -> None:
+            handle_commit(dict(counts))
+        self._writer.on_commit = report_commit
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_infer_types' method.
+    def _infer_types(self, source: PipelineMLSource) -> 'TypeRegistry':
+        """
+        This method returns the registry of types, extended by the types
+        inferred from a sample of the file (for fields with no type).
+        """
+
+        # Sampling requires reading the input twice,
+        # which is not possible for a pipe.
+        if not source.file.seekable():
+            self.feedback.pushInfo('Field types will not be inferred, '
+                                   'since the input is a stream')
+            return self.types
+
+        self.feedback.pushInfo('Sampling field types')
+        types = self.types.extended(sample_types(source))
+        source.rewind()
+        return types
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_create_schema' method, which creates all
+    # layers and fields before any features are added.
+    def _create_schema(self, source: PipelineMLSource) -> None:
+        """
+        This method loads or scans the schema, and creates it.
+        """
+
+        # Scanning requires reading the input twice,
+        # which is not possible for a pipe.
+        if not source.file.seekable():
+            self.feedback.pushInfo('Layers and fields will be created as '
+                                   'needed, since the input is a stream')
+            return
+
+        if self.schema_path is not None and path.exists(self.schema_path):
+            self.feedback.pushInfo('Reading schema from ' + self.schema_path)
+            schema = load_schema(self.schema_path)
+        else:
+            self.feedback.pushInfo('Scanning schema')
+            schema = scan_schema(source)
+            source.rewind()
+            if self.schema_path is not None:
+                save_schema(self.schema_path, schema)
+
+        # The default CRS must be known before any layers are created,
+        # and it appears before the components, so read it first.
+        header = scan_header(source)
+        source.rewind()
+        if header['crs'] is not None:
+            self._writer.set_crs(header['crs'])
+
+        # Only the layers to be converted are created (the saved schema,
+        # if any, is that of the whole file, so it can be reused).
+        schema = {name: fields for name, fields in schema.items()
+                  if keeps_layer(name, self.layers, self.exclude_layers)}
+        self._writer.create_schema(schema)
+
+        # Lay out the features of each layer in the same order
+        # as its fields (which saves extending them as they grow).
+        self._layouts = {name: Layout(name, fields)
+                         for name, fields in schema.items()}
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_read' method, which parses the
+    # PipelineML file in this process, as it is written.
+    def _read(self, source: PipelineMLSource) -> None:
+        """
+        This method parses the PipelineML file.
+        """
+
+        # The handler methods called by the reader populate the
+        # GeoPackage as features are found (either directly, or by
+        # way of a writer thread, so that parsing and writing overlap).
+        self._thread = None
+        handle_crs = self._writer.set_crs
+        if self.queue_size > 0:
+            self._thread = WriterThread(
+              self._writer, self._progress, self.queue_size)
+            handle_crs = self._thread.set_crs
+        self._reader = PipelineMLReader(
+          handle_crs, self._add_feature, self.feedback, self._layouts,
+          text_limit=self.text_limit, verbose=self.verbose,
+          **self._reader_options())
+        if self._instrumentation is not None:
+            self._instrumentation.instrument_reader(self._reader)
+        try:
+            self._reader.parse_file(source, self._handle_chunk)
+        except BaseException:
+            if self._thread is not None:
+                self._thread.stop()
+            raise
+        if self._thread is not None:
+            self._thread.finish()
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_handle_chunk' method, which is called (by
+    # the reader) after each chunk of the input is parsed.
+    def _handle_chunk(self) -> None:
+        """
+        This method updates the progress bar, and aborts
+        the conversion if the user has canceled.
+        """
+        self._progress.update(self._source.position)
+        if self.feedback.isCanceled():
+            raise _Canceled()
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_add_feature' method, which is called
+    # (by the reader) for every feature found.
+    def _add_feature(self, layout: Layout, values: 'Tuple',
+          geometry: bytes) -> None:
+        """
+        This method writes a feature to the GeoPackage.
+        """
+        if self.verbose:
+            self._progress.info('Adding feature to ' + layout.name + ' layer')
+        if self._thread is not None:
+            self._thread.add_feature(
+              layout, values, geometry, self._reader.position)
+            return
+        self._writer.add_feature(
+          layout, values, geometry, self._reader.position)
+        self._progress.count(layout.name)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_read_parallel' method, which has worker processes
+    # parse chunks of the PipelineML file while this process writes.
+    def _read_parallel(self, pml_file: 'BinaryIO', pml_path: str) -> None:
+        """
+        This method parses the PipelineML file in parallel.
+        """
+
+        # Split the file at component boundaries (after reading the
+        # default CRS).  If it cannot be split, parse it as usual.
+        header = scan_header(pml_file)
+        chunks = split(pml_file, header, self.chunk_size)
+        pml_file.seek(0)
+        if not chunks:
+            self.feedback.pushInfo('Parsing in a single process, since '
+                                   'the file cannot be split at its '
+                                   'components')
+        if len(chunks) < 2:
+            self._read(self._source)
+            return
+        if header['crs'] is not None:
+            self._writer.set_crs(header['crs'])
+
+        # Write the features of each chunk (in order) as they arrive.
+        self.feedback.pushInfo('Parsing ' + str(len(chunks)) + ' chunks'
+                               ' with ' + str(self.jobs) + ' processes')
+        options = dict(self._reader_options(), text_limit=self.text_limit)
+        for position, features in read_chunks(
+              pml_path, header, chunks, self.jobs, options, self.feedback):
+            for layout, values, geometry in features:
+                if self.verbose:
+                    self._progress.info(
+                      'Adding feature to ' + layout.name + ' layer')
+                self._writer.add_feature(layout, values, geometry, position)
+                self._progress.count(layout.name)
+            self._progress.update(position)
+            if self.feedback.isCanceled():
+                raise _Canceled()
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'convert' function, which is the
+# simplest way to convert a PipelineML file.
+def convert(pml_path: str, gpkg_path: str,
+      feedback: 'QgsProcessingFeedback' = None,
+      **options: 'Any') -> 'List[str]':
+    """
+    This function translates the contents of the PipelineML file at
+    'pml_path' into a new GeoPackage at 'gpkg_path', and returns the
+    names of the layers created.  Any keyword arguments are passed on to
+    the 'PipelineMLConverter' constructor.  If no 'feedback' object is
+    given, messages are written to standard error.
+    """
+    if feedback is None:
+        feedback = ConsoleFeedback()
+    converter = PipelineMLConverter(feedback, **options)
+    return converter.convert(pml_path, gpkg_path)
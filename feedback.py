@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+This module defines the 'ConsoleFeedback' class.
+"""
+
+
+import sys
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'ConsoleFeedback' class.
+class ConsoleFeedback:
+    """
+    This class provides the subset of the 'QgsProcessingFeedback'
+    interface used by the converter, writing messages to a
+    text stream (standard error, by default) instead of QGIS.
+    """
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '__init__' method (i.e., the constructor), which
+    # is called when a new object of this class is instantiated.
+    def __init__(self, stream: 'TextIO' = None, quiet: bool = False,
+          progress: bool = False) -> None:
+        """
+        This method saves the output options.  Informational messages are
+        suppressed if 'quiet' is set; the progress percentage is only
+        written if 'progress' is set.
+        """
+        self.stream = sys.stderr if stream is None else stream
+        self.quiet = quiet
+        self.progress = progress
+        self.canceled = False
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'setProgress' method.
+    def setProgress(self, progress: float) -> None:
+        """
+        This method reports the percentage of work done.
+        """
+        if self.progress:
+            self.stream.write('\r{:3.0f}%'.format(progress))
+            if progress >= 100:
+                self.stream.write('\n')
+            self.stream.flush()
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'pushInfo' method.
+    def pushInfo(self, info: str) -> None:
+        """
+        This method reports an informational message.
+        """
+        if not self.quiet:
+            self.stream.write(info + '\n')
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'reportError' method.
+    def reportError(self, error: str, fatalError: bool = False) -> None:
+        """
+        This method reports an error message.
+        """
+        self.stream.write('Error: ' + error + '\n')
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'isCanceled' method.
+    def isCanceled(self) -> bool:
+        """
+        This method returns whether the conversion should stop.
+        """
+        return self.canceled
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'cancel' method.
+    def cancel(self) -> None:
+        """
+        This method asks the conversion to stop.
+        """
+        self.canceled = True
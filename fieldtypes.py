@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+This module defines the 'TypeRegistry' class, which determines the type
+of each field of the output, and the functions that build registries: from
+the built-in types of the standard PipelineML fields, types taken from a
+PipelineML XML schema (XSD), and a file of types given by the user.  Types
+can also be inferred from a sample of the values in a PipelineML file.  A
+file of types is a JSON object mapping field names (or 'Layer.field', for
+a field of one layer only) to type names (see 'TYPE_NAMES').
+"""
+
+
+import json
+import os
+import re
+from functools import lru_cache
+from os import path
+from xml.etree import ElementTree
+from xml.parsers import expat
+from osgeo import ogr
+
+
+# This dictionary maps the name of each field type to its OGR type.
+TYPE_NAMES = {
+  'String': ogr.OFTString,
+  'Integer': ogr.OFTInteger,
+  'Integer64': ogr.OFTInteger64,
+  'Real': ogr.OFTReal,
+  'Date': ogr.OFTDate,
+  'DateTime': ogr.OFTDateTime}
+
+# This dictionary holds the types of the standard PipelineML fields that are
+# not text.  Any field not given a type (here, by an XML schema or by the
+# user) is taken as text, unless its type is inferred from the file.
+DEFAULT_TYPES = {
+  'length': 'Real',
+  'startEngineeringStation': 'Real',
+  'endEngineeringStation': 'Real',
+  'pressureRating': 'Real',
+  'startPosition': 'Real',
+  'endPosition': 'Real',
+  'compressorPowerRating': 'Real',
+  'compressorRatedFlow': 'Real',
+  'compressorPressureSuction': 'Real',
+  'compressorPressureDischarge': 'Real',
+  'linepipeCoverDepthMinimum': 'Real',
+  'meterFlowRateMinimum': 'Real',
+  'meterFlowRateMaximum': 'Real',
+  'pumpPowerRating': 'Real',
+  'pumpRatedFlow': 'Real',
+  'pumpPressureSuction': 'Real',
+  'pumpPressureDischarge': 'Real',
+  'teeCenterToEndRun': 'Real',
+  'teeCenterToEndOutlet': 'Real',
+  'valveActuationTime': 'Real',
+  'casingVentCount': 'Integer',
+  'coatingLayerNumber': 'Integer',
+  'sleevePressureRating': 'Real',
+  'pipeconnectorNumber': 'Integer'}
+
+# This dictionary maps XML schema types (and the GML types of measures,
+# which are numbers with units) to field types.  Types are matched by
+# local name (whatever their namespace), as elements are in conversions.
+_XSD_TYPES = {
+  'double': 'Real', 'float': 'Real', 'decimal': 'Real',
+  'MeasureType': 'Real', 'LengthType': 'Real', 'AngleType': 'Real',
+  'AreaType': 'Real', 'VolumeType': 'Real', 'SpeedType': 'Real',
+  'ScaleType': 'Real', 'TimeType': 'Real',
+  'int': 'Integer', 'short': 'Integer', 'byte': 'Integer',
+  'unsignedShort': 'Integer', 'unsignedByte': 'Integer',
+  'integer': 'Integer64', 'long': 'Integer64', 'unsignedInt': 'Integer64',
+  'unsignedLong': 'Integer64', 'nonNegativeInteger': 'Integer64',
+  'positiveInteger': 'Integer64', 'nonPositiveInteger': 'Integer64',
+  'negativeInteger': 'Integer64',
+  'date': 'Date', 'dateTime': 'DateTime'}
+
+# This is the namespace of XML schemas.
+_XSD = '{http://www.w3.org/2001/XMLSchema}'
+
+# These patterns match the text of values of each type (other than text)
+# when types are inferred, in the order in which they are tried.  Numbers
+# with leading zeros (e.g., '007') are identifiers, which are kept as text.
+_PATTERNS = (
+  ('Integer', re.compile(r'[+-]?(0|[1-9]\d*)$')),
+  ('Real', re.compile(
+    r'[+-]?((0|[1-9]\d*)(\.\d*)?|\.\d+)([eE][+-]?\d+)?$')),
+  ('Date', re.compile(r'\d{4}-\d\d-\d\d$')),
+  ('DateTime', re.compile(
+    r'\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(\.\d+)?(Z|[+-]\d\d:\d\d)?$')))
+
+# This dictionary maps pairs of different types to the type that can hold
+# the values of both (any other pair can only be held as text).
+_WIDER = {
+  ('Integer', 'Integer64'): 'Integer64', ('Integer', 'Real'): 'Real',
+  ('Integer64', 'Real'): 'Real', ('Date', 'DateTime'): 'DateTime'}
+
+# This is the number of bytes read at a time while sampling.
+_SAMPLE_SIZE = 1048576
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_widen' function.
+def _widen(type: str, other: str) -> str:
+    """
+    This function returns the type that can hold values of both types.
+    """
+    if type == other:
+        return type
+    return _WIDER.get((type, other)) or _WIDER.get((other, type), 'String')
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'TypeRegistry' class.
+class TypeRegistry:
+    """
+    This class maps fields to their types.  A field's type is looked up
+    by its layer and name ('Layer.field') and then by its name alone; a
+    field with neither is text.  Registries are shared (see 'load_types'),
+    so they are not changed once made.
+    """
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '__init__' method (i.e., the constructor), which
+    # is called when a new object of this class is instantiated.
+    def __init__(self, types: 'Dict[str, str]' = None) -> None:
+        """
+        This method saves the type names of the fields (by default, those
+        of the standard PipelineML fields), checking that they are known.
+        """
+        self.types = dict(DEFAULT_TYPES if types is None else types)
+        for name, type in self.types.items():
+            if type not in TYPE_NAMES:
+                raise ValueError('Unknown type ' + str(type) + ' of ' +
+                                 name + ' (expected ' +
+                                 ', '.join(TYPE_NAMES) + ')')
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'field_type' method.
+    def field_type(self, layer_name: str, name: str) -> int:
+        """
+        This method returns the OGR type of a field of a layer.
+        """
+        type = self.types.get(layer_name + '.' + name) or self.types.get(name)
+        return TYPE_NAMES[type] if type else ogr.OFTString
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'extended' method.
+    def extended(self, types: 'Dict[str, str]') -> 'TypeRegistry':
+        """
+        This method returns a new registry with the given types (e.g.,
+        inferred ones) added for the fields that have no type here (either
+        by their layer and name, or by their name alone).
+        """
+        added = dict(self.types)
+        for key, type in types.items():
+            if key not in added and key.rpartition('.')[2] not in added:
+                added[key] = type
+        return TypeRegistry(added)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'read_types' function.
+def read_types(types_path: str) -> 'Dict[str, str]':
+    """
+    This function reads a file of types given by the user.
+    """
+    with open(types_path, encoding='utf-8') as types_file:
+        types = json.load(types_file)
+    if not isinstance(types, dict):
+        raise ValueError('Expected an object mapping fields to types in ' +
+                         types_path)
+    return types
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_read_xsd' function.
+def _read_xsd(xsd_path: str,
+      roots: 'Dict[str, ElementTree.Element]') -> None:
+    """
+    This function parses an XML schema, adding its root element to
+    'roots' (by path), along with those of the (local) schemas it
+    includes or imports (each only once).
+    """
+    if xsd_path in roots:
+        return
+    root = roots[xsd_path] = ElementTree.parse(xsd_path).getroot()
+    for tag in ('include', 'import', 'redefine'):
+        for element in root.iter(_XSD + tag):
+            location = element.get('schemaLocation')
+            if location and '://' not in location:
+                location = path.join(path.dirname(xsd_path), location)
+                if path.exists(location):
+                    _read_xsd(path.normpath(location), roots)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'parse_xsd' function.
+def parse_xsd(xsd_path: str) -> 'Dict[str, str]':
+    """
+    This function returns the types of the fields declared in an XML
+    schema (and the local schemas it includes or imports): each element
+    with a simple type (or simple content) that is a number, date or date
+    and time.  Elements of the same name with different types are given
+    a type that holds them all.
+    """
+    roots = {}
+    _read_xsd(path.normpath(xsd_path), roots)
+    roots = list(roots.values())
+
+    # Find the base type of each named simple type (or complex type with
+    # simple content, such as a measure), by local name.
+    bases = {}
+    for root in roots:
+        for tag in ('simpleType', 'complexType'):
+            for element in root.iter(_XSD + tag):
+                name = element.get('name')
+                base = _base(element)
+                if name and base:
+                    bases[name] = base
+
+    def resolve(type: str) -> 'Optional[str]':
+        seen = set()
+        while type not in seen:
+            seen.add(type)
+            if type in bases:
+                type = bases[type]
+            elif type in _XSD_TYPES:
+                return _XSD_TYPES[type]
+            else:
+                return None
+        return None
+
+    types = {}
+    for root in roots:
+        for element in root.iter(_XSD + 'element'):
+            name = element.get('name')
+            type = element.get('type')
+            type = (type.rpartition(':')[2] if type is not None
+                    else _base(element))
+            if name is None or type is None:
+                continue
+            type = resolve(type) or 'String'
+            types[name] = _widen(types.get(name, type), type)
+    return {name: type for name, type in types.items() if type != 'String'}
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_base' function.
+def _base(element: 'ElementTree.Element') -> 'Optional[str]':
+    """
+    This function returns the local name of the base type of a simple
+    type or of simple content (within the given element), if any.
+    """
+    for content in (element, element.find(_XSD + 'simpleType'),
+                    element.find(_XSD + 'simpleContent'),
+                    element.find(_XSD + 'complexType/' +
+                                 _XSD + 'simpleContent')):
+        if content is None:
+            continue
+        for kind in ('restriction', 'extension'):
+            child = content.find(_XSD + kind)
+            if child is not None and child.get('base'):
+                return child.get('base').rpartition(':')[2]
+    return None
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_modified' function.
+def _modified(file_path: 'Optional[str]') -> 'Optional[float]':
+    """
+    This function returns the time at which a file was last modified
+    (or None, if there is no file).
+    """
+    return None if file_path is None else os.stat(file_path).st_mtime
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'load_types' function.
+def load_types(xsd_path: str = None,
+      types_path: str = None) -> TypeRegistry:
+    """
+    This function returns the registry of the built-in types, extended by
+    the types in an XML schema (if 'xsd_path' is given) and replaced by
+    those in a file of types (if 'types_path' is given).  Registries are
+    cached (until their files change), so the files are only read once.
+    """
+    return _load_types(xsd_path, _modified(xsd_path),
+                       types_path, _modified(types_path))
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_load_types' function, which is called by 'load_types'.
+@lru_cache(maxsize=16)
+def _load_types(xsd_path: 'Optional[str]', xsd_modified: 'Optional[float]',
+      types_path: 'Optional[str]',
+      types_modified: 'Optional[float]') -> TypeRegistry:
+    """
+    This function builds a registry (see 'load_types').
+    """
+    types = dict(DEFAULT_TYPES)
+    if xsd_path is not None:
+        types.update(parse_xsd(xsd_path))
+    if types_path is not None:
+        types.update(read_types(types_path))
+    return TypeRegistry(types)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_infer' function.
+def _infer(value: str) -> str:
+    """
+    This function returns the type of a value (given as text).
+    """
+    for type, pattern in _PATTERNS:
+        if pattern.match(value):
+            if type == 'Integer' and not -2 ** 31 <= int(value) < 2 ** 31:
+                return 'Integer64'
+            return type
+    return 'String'
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'sample_types' function.
+def sample_types(pml_file: 'BinaryIO',
+      megabytes: float = 16) -> 'Dict[str, str]':
+    """
+    This function infers the types of the fields of a PipelineML file
+    (opened in binary mode) from their values in (about) the first
+    'megabytes' of the file.  A field's type is one that holds every
+    value sampled (e.g., a field of whole numbers and decimals is 'Real').
+    Types are given for each layer's fields ('Layer.field'), and only
+    for fields that are not text.
+    """
+    types = {}
+    stack = []
+    text = []
+
+    # Define the handlers for the XML parser.  (As in a conversion, the
+    # value of a field is its 'title' attribute, if it has one, or else
+    # its character data; values that are blank are ignored.)
+    def add_value(value: str) -> None:
+        value = value.strip()
+        if value:
+            key = stack[-2] + '.' + stack[-1]
+            type = _infer(value)
+            types[key] = _widen(types.get(key, type), type)
+
+    def handle_element_start(name: str, attributes: dict) -> None:
+        stack.append(name.rpartition(' ')[2])
+        if (len(stack) > 2 and stack[-3] == 'component' and
+              stack[-1] != 'location'):
+            text.clear()
+            for key, value in attributes.items():
+                if key.rpartition(' ')[2] == 'title':
+                    add_value(value)
+                    stack[-1] = None
+                    break
+
+    def handle_character_data(data: str) -> None:
+        if len(stack) > 2 and stack[-3] == 'component' and stack[-1]:
+            text.append(data)
+
+    def handle_element_end(name: str) -> None:
+        if (len(stack) > 2 and stack[-3] == 'component' and stack[-1] and
+              stack[-1] != 'location'):
+            add_value(''.join(text))
+        stack.pop()
+
+    parser = expat.ParserCreate(namespace_separator=' ')
+    parser.StartElementHandler = handle_element_start
+    parser.CharacterDataHandler = handle_character_data
+    parser.EndElementHandler = handle_element_end
+    parser.buffer_text = True
+    limit = megabytes * 1048576
+    size = 0
+    while size < limit:
+        data = pml_file.read(_SAMPLE_SIZE)
+        if not data:
+            break
+        parser.Parse(data, False)
+        size += len(data)
+    return {key: type for key, type in types.items() if type != 'String'}
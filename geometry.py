@@ -0,0 +1,544 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+This module defines the 'GmlElement' class and functions that convert
+GML geometries into well-known binary (WKB) geometries in bulk, rather
+than point by point.  NumPy is used to parse coordinates if it is
+available.
+"""
+
+
+import struct
+import sys
+import warnings
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Older versions of NumPy stop at the first token of a list that is not a
+# number, with only a warning; make that an error, as in newer versions.
+warnings.filterwarnings('error', 'string or file could not be read',
+                        DeprecationWarning)
+
+
+# These are the (ISO) WKB geometry type codes.  For a geometry with Z
+# coordinates, 1000 is added to the code (e.g., 1002 is LineString Z),
+# and for one with Z and M coordinates, 3000.
+WKB_POINT = 1
+WKB_LINE_STRING = 2
+WKB_POLYGON = 3
+WKB_MULTI_POINT = 4
+WKB_MULTI_LINE_STRING = 5
+WKB_MULTI_POLYGON = 6
+WKB_CIRCULAR_STRING = 8
+WKB_COMPOUND_CURVE = 9
+WKB_MULTI_CURVE = 11
+
+# This dictionary maps each coordinate dimension
+# beyond two to the amount added to a type code.
+_DIMENSION_CODES = {3: 1000, 4: 3000}
+
+# This structure packs the header of a WKB geometry
+# (little-endian byte order, geometry type, and count).
+_HEADER = struct.Struct('<BII')
+
+# This structure packs the header of a WKB
+# geometry without a count (i.e., a point).
+_POINT_HEADER = struct.Struct('<BI')
+
+# These structures unpack a count (or geometry type) in WKB,
+# and the first two coordinates of a point.
+_COUNT = struct.Struct('<I')
+_XY = struct.Struct('<2d')
+
+# This is the number of points up to which the envelope of a sequence
+# of points is found without NumPy (whose overhead is then too great).
+_FEW_POINTS = 32
+
+# These sets contain the (local) names of GML elements
+# that represent segments of curves, and those that
+# represent rings (i.e., boundaries) of surfaces.  (A line
+# string within a curve, e.g., as a member of a composite
+# curve, is treated as a linear segment.)
+_LINEAR_SEGMENTS = {'LineStringSegment', 'GeodesicString', 'Geodesic',
+                    'LineString'}
+_ARC_SEGMENTS = {'ArcString', 'Arc', 'Circle'}
+_EXTERIORS = {'exterior', 'outerBoundaryIs'}
+_INTERIORS = {'interior', 'innerBoundaryIs'}
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'GmlElement' class.
+class GmlElement:
+    """
+    This class represents an element of a GML geometry, with the
+    coordinates it contains directly and its child elements.
+    """
+    __slots__ = ('name', 'dimension', 'attributes', 'parts', 'children')
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '__init__' method (i.e., the constructor), which
+    # is called when a new object of this class is instantiated.
+    def __init__(self, name: str, dimension: int,
+          attributes: dict) -> None:
+        """
+        This method creates an element with the given local name,
+        coordinate dimension (0 if not yet known) and attributes.
+        """
+        self.name = name
+        self.dimension = dimension
+        self.attributes = attributes
+        self.parts = []
+        self.children = []
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'parse_coordinates' function.
+def parse_coordinates(text: str) -> 'array':
+    """
+    This function converts a whitespace-separated list of
+    numbers (e.g., the content of a 'gml:posList' element)
+    into an array of double-precision floating point numbers.
+    Anything other than a number raises a ValueError.
+    """
+    try:
+        if numpy is not None:
+            return numpy.fromstring(text, dtype='<f8', sep=' ')
+        return array('d', map(float, text.split()))
+    except (ValueError, DeprecationWarning):
+        raise ValueError('Expected numbers, not ' + repr(text[:40]))
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'parse_tuples' function.
+def parse_tuples(text: str, cs: str = ',', ts: str = ' ',
+      decimal: str = '.') -> 'Tuple[array, int]':
+    """
+    This function converts the content of a (GML 2) 'gml:coordinates'
+    element, in which coordinates are separated by 'cs' and tuples by
+    'ts', into an array of numbers, and returns it with the number of
+    coordinates in the first tuple (i.e., the dimension).
+    """
+    text = text.strip()
+    if ts.isspace():
+        first = text.split(None, 1)[0] if text else ''
+    else:
+        first = text.split(ts, 1)[0]
+    dimension = first.count(cs) + 1
+    text = text.replace(cs, ' ')
+    if not ts.isspace():
+        text = text.replace(ts, ' ')
+    if decimal != '.':
+        text = text.replace(decimal, '.')
+    return parse_coordinates(text), dimension
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_to_bytes' function.
+def _to_bytes(coordinates: 'array') -> bytes:
+    """
+    This function returns the little-endian
+    representation of an array of coordinates.
+    """
+    if numpy is not None and isinstance(coordinates, numpy.ndarray):
+        return coordinates.astype('<f8', copy=False).tobytes()
+    if sys.byteorder == 'big':
+        coordinates = array('d', coordinates)
+        coordinates.byteswap()
+    return coordinates.tobytes()
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_concatenate' function.
+def _concatenate(parts: 'List[array]') -> 'array':
+    """
+    This function joins several arrays of coordinates into one.
+    """
+    if len(parts) == 1:
+        return parts[0]
+    if numpy is not None:
+        return numpy.concatenate(parts) if parts else numpy.empty(0)
+    coordinates = array('d')
+    for part in parts:
+        coordinates.extend(part)
+    return coordinates
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_coordinates' function.
+def _coordinates(element: GmlElement) -> 'array':
+    """
+    This function returns all of the coordinates within an
+    element (including those of its descendants), in order.
+    """
+    if not element.children:
+        return _concatenate(element.parts)
+    parts = list(element.parts)
+    for child in element.children:
+        parts.append(_coordinates(child))
+    return _concatenate(parts)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'intersects' function.
+def intersects(element: GmlElement,
+      bbox: 'Tuple[float, float, float, float]') -> bool:
+    """
+    This function tells whether the envelope of the coordinates of a GML
+    geometry intersects a bounding box (minimum x, minimum y, maximum x,
+    maximum y).  For curves with arcs, the envelope of the control points
+    is used, so the result is approximate.
+    """
+    dimension = element.dimension or 2
+    coordinates = _coordinates(element)
+    if len(coordinates) < dimension:
+        return False
+    xs = coordinates[0::dimension]
+    ys = coordinates[1::dimension]
+    if numpy is not None and isinstance(coordinates, numpy.ndarray):
+        return (xs.max() >= bbox[0] and ys.max() >= bbox[1] and
+                xs.min() <= bbox[2] and ys.min() <= bbox[3])
+    return (max(xs) >= bbox[0] and max(ys) >= bbox[1] and
+            min(xs) <= bbox[2] and min(ys) <= bbox[3])
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_find' function.
+def _find(element: GmlElement, names: 'Set[str]') -> 'List[GmlElement]':
+    """
+    This function returns the descendants of an element whose names are
+    among 'names' (not including descendants of those descendants).
+    """
+    found = []
+    for child in element.children:
+        if child.name in names:
+            found.append(child)
+        else:
+            found.extend(_find(child, names))
+    return found
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_type' function.
+def _type(wkb_type: int, dimension: int) -> int:
+    """
+    This function returns the WKB type code for a
+    geometry type of the given coordinate dimension.
+    """
+    return wkb_type + _DIMENSION_CODES.get(dimension, 0)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_check' function.
+def _check(coordinates: 'array', dimension: int) -> None:
+    """
+    This function raises a ValueError if the given coordinates do not
+    make up whole points of the given dimension (which would otherwise
+    give a WKB geometry whose point count does not match its points).
+    """
+    if len(coordinates) % dimension != 0 or len(coordinates) < 1:
+        raise ValueError('Expected a positive multiple of ' +
+                         str(dimension) + ' coordinates, not ' +
+                         str(len(coordinates)))
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_linear' function.
+def _linear(wkb_type: int, coordinates: 'array', dimension: int) -> bytes:
+    """
+    This function returns a WKB geometry consisting of a single sequence
+    of points (e.g., a line string).  It raises a ValueError if the
+    number of coordinates is not a multiple of the dimension.
+    """
+    _check(coordinates, dimension)
+    return (_HEADER.pack(1, _type(wkb_type, dimension),
+                         len(coordinates) // dimension)
+            + _to_bytes(coordinates))
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_collection' function.
+def _collection(wkb_type: int, members: 'List[bytes]',
+      dimension: int) -> bytes:
+    """
+    This function returns a WKB geometry consisting
+    of other geometries (e.g., a multi-polygon).
+    """
+    return (_HEADER.pack(1, _type(wkb_type, dimension), len(members))
+            + b''.join(members))
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_ring' function.
+def _ring(element: GmlElement, dimension: int) -> bytes:
+    """
+    This function returns the (WKB) point count and points of a ring,
+    appending the first point if necessary to close the ring.
+    """
+    coordinates = _coordinates(element)
+    _check(coordinates, dimension)
+    if (len(coordinates) >= dimension and
+          list(coordinates[:dimension]) != list(coordinates[-dimension:])):
+        coordinates = _concatenate([coordinates, coordinates[:dimension]])
+    return (struct.pack('<I', len(coordinates) // dimension)
+            + _to_bytes(coordinates))
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_point' function.
+def _point(element: GmlElement) -> bytes:
+    """
+    This function converts a GML point into WKB.
+    """
+    coordinates = _coordinates(element)
+    dimension = element.dimension or 2
+    if len(coordinates) < dimension:
+        return None
+    return (_POINT_HEADER.pack(1, _type(WKB_POINT, dimension))
+            + _to_bytes(coordinates[:dimension]))
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_line_string' function.
+def _line_string(element: GmlElement) -> bytes:
+    """
+    This function converts a GML line string (whose points may be in a
+    'gml:posList' element or several 'gml:pos' elements) into WKB.
+    """
+    dimension = element.dimension or 2
+    return _linear(WKB_LINE_STRING, _coordinates(element), dimension)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_curve' function.
+def _curve(element: GmlElement) -> bytes:
+    """
+    This function converts a GML curve (or composite curve, whose members
+    may be line strings or curves) into a WKB line string if all of its
+    segments are linear, or into a WKB compound curve (of line strings
+    and circular strings) if any are arcs.  A curve without any points
+    raises a ValueError.
+    """
+    dimension = element.dimension or 2
+    segments = [segment for segment in
+                _find(element, _LINEAR_SEGMENTS | _ARC_SEGMENTS)
+                if len(_coordinates(segment))]
+    if not segments:
+        raise ValueError('Expected the points of a ' + element.name)
+    if all(segment.name in _LINEAR_SEGMENTS for segment in segments):
+        # Join the segments, dropping the first point of each segment
+        # after the first (since it repeats the last point of the
+        # previous segment).
+        parts = [_coordinates(segment) for segment in segments]
+        parts[1:] = [part[dimension:] for part in parts[1:]]
+        return _linear(WKB_LINE_STRING, _concatenate(parts), dimension)
+    members = [
+      _linear(WKB_LINE_STRING if segment.name in _LINEAR_SEGMENTS
+              else WKB_CIRCULAR_STRING, _coordinates(segment), dimension)
+      for segment in segments]
+    return _collection(WKB_COMPOUND_CURVE, members, dimension)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_polygon' function.
+def _polygon(element: GmlElement) -> bytes:
+    """
+    This function converts a GML polygon (or polygon patch) into WKB.
+    Rings made of curves are treated as linear rings through the
+    curves' points.
+    """
+    dimension = element.dimension or 2
+    rings = (_find(element, _EXTERIORS)[:1] + _find(element, _INTERIORS))
+    if len(rings) < 1:
+        return None
+    return (_HEADER.pack(1, _type(WKB_POLYGON, dimension), len(rings))
+            + b''.join(_ring(ring, dimension) for ring in rings))
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_multi_point' function.
+def _multi_point(element: GmlElement) -> bytes:
+    """
+    This function converts a GML multi-point into WKB.
+    """
+    members = [_point(point) for point in _find(element, {'Point'})]
+    members = [member for member in members if member is not None]
+    return _collection(WKB_MULTI_POINT, members, element.dimension or 2)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_multi_curve' function.
+def _multi_curve(element: GmlElement) -> bytes:
+    """
+    This function converts a GML multi-curve (or multi-line string) into
+    a WKB multi-line string, or into a WKB multi-curve if any of its
+    members are curved.
+    """
+    members = [build_wkb(member) for member in
+               _find(element, {'LineString', 'Curve', 'CompositeCurve'})]
+    members = [member for member in members if member is not None]
+    dimension = element.dimension or 2
+    if any(struct.unpack_from('<I', member, 1)[0] % 1000
+           in (WKB_COMPOUND_CURVE, WKB_CIRCULAR_STRING)
+           for member in members):
+        return _collection(WKB_MULTI_CURVE, members, dimension)
+    return _collection(WKB_MULTI_LINE_STRING, members, dimension)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_multi_surface' function.
+def _multi_surface(element: GmlElement) -> bytes:
+    """
+    This function converts a GML multi-surface (or multi-polygon,
+    surface or composite surface) into a WKB multi-polygon.
+    """
+    members = [_polygon(polygon) for polygon in
+               _find(element, {'Polygon', 'PolygonPatch'})]
+    members = [member for member in members if member is not None]
+    return _collection(WKB_MULTI_POLYGON, members, element.dimension or 2)
+
+
+# This dictionary maps the (local) name of each supported
+# GML geometry element to the function that converts it.
+_BUILDERS = {
+  'Point': _point,
+  'LineString': _line_string,
+  'LinearRing': _line_string,
+  'Curve': _curve,
+  'CompositeCurve': _curve,
+  'Polygon': _polygon,
+  'MultiPoint': _multi_point,
+  'MultiCurve': _multi_curve,
+  'MultiLineString': _multi_curve,
+  'MultiSurface': _multi_surface,
+  'MultiPolygon': _multi_surface,
+  'Surface': _multi_surface,
+  'CompositeSurface': _multi_surface}
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'is_supported' function.
+def is_supported(name: str) -> bool:
+    """
+    This function returns whether GML geometries
+    with the given (local) name can be converted.
+    """
+    return name in _BUILDERS
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'build_wkb' function.
+def build_wkb(element: GmlElement) -> bytes:
+    """
+    This function converts a GML geometry into WKB (or returns None if
+    it is not supported).  A geometry that cannot be converted (e.g., one
+    without points, or with an incomplete point) raises a ValueError.
+    """
+    build = _BUILDERS.get(element.name)
+    if build is None:
+        return None
+    try:
+        return build(element)
+    except IndexError:
+        raise ValueError('Incomplete ' + element.name)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_add_points_envelope' function.
+def _add_points_envelope(wkb: bytes, offset: int, count: int,
+      dimension: int, envelopes: 'List[Tuple[float, ...]]') -> int:
+    """
+    This function adds the envelope of a sequence of 'count' points in
+    'wkb' (starting at 'offset') to 'envelopes', and returns the offset
+    just past the points.
+    """
+    end = offset + 8 * count * dimension
+    if count == 1:
+        x, y = _XY.unpack_from(wkb, offset)
+        if x == x:
+            envelopes.append((x, y, x, y))
+    elif count > 1:
+        # (NumPy only pays off for longer sequences of points.)
+        if numpy is not None and count > _FEW_POINTS:
+            coordinates = numpy.frombuffer(wkb, '<f8', count * dimension,
+                                           offset)
+            xs = coordinates[0::dimension]
+            ys = coordinates[1::dimension]
+            envelopes.append((xs.min(), ys.min(), xs.max(), ys.max()))
+        else:
+            coordinates = struct.unpack_from(
+              '<' + str(count * dimension) + 'd', wkb, offset)
+            xs = coordinates[0::dimension]
+            ys = coordinates[1::dimension]
+            envelopes.append((min(xs), min(ys), max(xs), max(ys)))
+    return end
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_add_envelope' function.
+def _add_envelope(wkb: bytes, offset: int,
+      envelopes: 'List[Tuple[float, ...]]') -> int:
+    """
+    This function adds the envelopes of the parts of the (little-endian,
+    ISO) WKB geometry at 'offset' in 'wkb' to 'envelopes', and returns
+    the offset just past the geometry.
+    """
+    wkb_type = _COUNT.unpack_from(wkb, offset + 1)[0]
+    dimension = 2 + (wkb_type // 1000 + 1) // 2
+    wkb_type %= 1000
+    offset += 5
+    if wkb_type == WKB_POINT:
+        return _add_points_envelope(wkb, offset, 1, dimension, envelopes)
+    count = _COUNT.unpack_from(wkb, offset)[0]
+    offset += 4
+    if wkb_type in (WKB_LINE_STRING, WKB_CIRCULAR_STRING):
+        return _add_points_envelope(wkb, offset, count, dimension,
+                                    envelopes)
+    if wkb_type == WKB_POLYGON:
+        for ring in range(count):
+            points = _COUNT.unpack_from(wkb, offset)[0]
+            offset = _add_points_envelope(wkb, offset + 4, points,
+                                          dimension, envelopes)
+        return offset
+    for member in range(count):
+        offset = _add_envelope(wkb, offset, envelopes)
+    return offset
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'wkb_envelope' function.
+def wkb_envelope(wkb: bytes) -> 'Optional[Tuple[float, ...]]':
+    """
+    This function returns the envelope (minimum x, minimum y, maximum x,
+    maximum y) of a WKB geometry built by 'build_wkb', or None if it has
+    no points.  (For curves with arcs, the envelope of the control points
+    is returned.)
+    """
+    envelopes = []
+    _add_envelope(wkb, 0, envelopes)
+    if not envelopes:
+        return None
+    if len(envelopes) == 1:
+        return tuple(float(bound) for bound in envelopes[0])
+    return (float(min(envelope[0] for envelope in envelopes)),
+            float(min(envelope[1] for envelope in envelopes)),
+            float(max(envelope[2] for envelope in envelopes)),
+            float(max(envelope[3] for envelope in envelopes)))
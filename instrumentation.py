@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+This module defines the 'Instrumentation' class, which measures where
+the time of a conversion goes: reading the input, the XML parser and each
+kind of callback, building geometries, and each part of writing.
+"""
+
+
+import cProfile
+import json
+from os import path
+from time import perf_counter
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_vertices' function.
+def _vertices(element: 'GmlElement') -> int:
+    """
+    This function returns the number of vertices in
+    a GML geometry (including its child elements).
+    """
+    count = sum(len(part) for part in element.parts) // (
+      element.dimension or 2)
+    for child in element.children:
+        count += _vertices(child)
+    return count
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'Instrumentation' class.
+class Instrumentation:
+    """
+    This class times the stages of a conversion and counts what passes
+    through them.  Each stage is a method (of the source, reader or
+    writer) whose calls are timed, replacing the method on that object
+    only, so that a conversion that is not instrumented pays nothing.
+    Stages may be nested within others (e.g., geometries are built at
+    end tags); the time of a stage that is not spent in the stages within
+    it is reported as 'other' (for parsing, that is mostly the XML parser
+    itself).
+    """
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '__init__' method (i.e., the constructor), which
+    # is called when a new object of this class is instantiated.
+    def __init__(self, cprofile: bool = False) -> None:
+        """
+        This method sets up the timers and counters.  If 'cprofile' is
+        set, the conversion is also profiled (in the thread that starts
+        it) using 'cProfile'.
+        """
+
+        # This dictionary maps the name of each stage to a list of its
+        # total time (in seconds), the number of calls, and the name of
+        # the stage it is within (if any).
+        self.stages = {}
+
+        # This dictionary holds counters that are not the number
+        # of calls of a stage (e.g., the number of vertices).
+        self.counters = {'vertices': 0, 'commits': 0, 'bytes read': 0}
+
+        self.seconds = 0.0
+        self._start = None
+        self._profiler = cProfile.Profile() if cprofile else None
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'timed' method.
+    def timed(self, function: 'Callable', stage: str,
+          within: str = None) -> 'Callable':
+        """
+        This method returns a version of 'function' whose
+        calls are timed (and counted) as the given stage.
+        """
+        timer = self.stages.setdefault(stage, [0.0, 0, within])
+
+        def timed_function(*args: 'Any') -> 'Any':
+            start = perf_counter()
+            try:
+                return function(*args)
+            finally:
+                timer[0] += perf_counter() - start
+                timer[1] += 1
+        return timed_function
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_wrap' method.
+    def _wrap(self, owner: 'Any', name: str, stage: str,
+          within: str = None) -> None:
+        """
+        This method replaces the method (or other callable attribute)
+        'name' of the 'owner' object with a timed version.
+        """
+        setattr(owner, name,
+                self.timed(getattr(owner, name), stage, within))
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'instrument_source' method.
+    def instrument_source(self, source: 'PipelineMLSource') -> None:
+        """
+        This method times the reading of the input.
+        """
+        self._wrap(source, 'read', 'read', 'parse')
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'instrument_reader' method, which must be
+    # called before the reader is used.
+    def instrument_reader(self, reader: 'PipelineMLReader') -> None:
+        """
+        This method times the parsing of the input, each kind of
+        callback from the XML parser, the parsing of coordinates, the
+        building of geometries and the handling of features, and counts
+        the vertices of the geometries.
+        """
+        self._wrap(reader, 'parse_file', 'parse')
+        parser = reader._parser
+        self._wrap(parser, 'StartElementHandler', 'start tags', 'parse')
+        self._wrap(parser, 'CharacterDataHandler', 'text', 'parse')
+        self._wrap(parser, 'EndElementHandler', 'end tags', 'parse')
+        self._wrap(reader, '_add_coordinates', 'coordinates', 'end tags')
+        self._wrap(reader, '_build_geometry', 'geometry', 'end tags')
+        self._wrap(reader, 'handle_feature', 'features', 'end tags')
+
+        # Count the vertices of each geometry (outside of the timer).
+        build_geometry = reader._build_geometry
+        counters = self.counters
+
+        def count_vertices(element: 'GmlElement') -> bytes:
+            counters['vertices'] += _vertices(element)
+            return build_geometry(element)
+        reader._build_geometry = count_vertices
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'instrument_writer' method.
+    def instrument_writer(self, writer: 'GeoPackageWriter',
+          within: str = None) -> None:
+        """
+        This method times the writing of features (as 'write', within the
+        given stage, if they are written there), filling in of feature
+        objects, the creation of layers and fields, commits, the creation
+        of indexes and the closing of the GeoPackage, and counts commits.
+        """
+        commit = writer.commit
+        counters = self.counters
+
+        def count_commit() -> None:
+            committing = writer.in_transaction
+            commit()
+            if committing and not writer.in_transaction:
+                counters['commits'] += 1
+        writer.commit = count_commit
+
+        self._wrap(writer, 'add_feature', 'write', within)
+        self._wrap(writer, '_fill', 'fill', 'write')
+        self._wrap(writer, '_create_layer', 'create layer')
+        self._wrap(writer, '_create_field', 'create field')
+        self._wrap(writer, 'commit', 'commit')
+        self._wrap(writer, 'create_indexes', 'indexes')
+        self._wrap(writer, 'close', 'close')
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'start' method.
+    def start(self) -> None:
+        """
+        This method starts timing (and profiling) the conversion.
+        """
+        self._start = perf_counter()
+        if self._profiler is not None:
+            self._profiler.enable()
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'stop' method.
+    def stop(self) -> None:
+        """
+        This method stops timing (and profiling) the conversion.
+        """
+        if self._profiler is not None:
+            self._profiler.disable()
+        self.seconds += perf_counter() - self._start
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'report' method.
+    def report(self, counts: 'Dict[str, int]') -> 'Dict[str, Any]':
+        """
+        This method returns the results: the total time, the time and
+        number of calls of each stage (and the stage it is within), the
+        counters, and the number of features added to each layer.
+        """
+        stages = {name: {'seconds': seconds, 'calls': calls,
+                         'within': within}
+                  for name, (seconds, calls, within) in self.stages.items()}
+        counters = dict(self.counters)
+        for counter, stage in (('elements', 'start tags'),
+                               ('layers', 'create layer'),
+                               ('fields', 'create field')):
+            counters[counter] = self.stages.get(stage, (0, 0))[1]
+        return {'seconds': self.seconds, 'stages': stages,
+                'counters': counters, 'features': counts}
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_summarize' method.
+    def _summarize(self, lines: 'List[str]', within: str,
+          depth: int) -> None:
+        """
+        This method adds a line to the summary for each stage within
+        the given stage (or at the top level, if 'within' is None), and
+        for the stages within each of those, and so on.
+        """
+        for name, (seconds, calls, parent) in self.stages.items():
+            if (parent if parent in self.stages else None) != within:
+                continue
+            if calls == 0:
+                continue
+            lines.append('  ' * depth + name + ': ' +
+                         format(seconds, '.3f') + ' s (' + str(calls) +
+                         ' call' + ('s' if calls != 1 else '') + ')')
+            inner = sum(stage[0] for stage in self.stages.values()
+                        if stage[2] == name and stage[1] > 0)
+            if inner > 0:
+                self._summarize(lines, name, depth + 1)
+                lines.append('  ' * (depth + 1) + 'other: ' +
+                             format(seconds - inner, '.3f') + ' s')
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'save' method, which is called once the
+    # conversion is complete (or has been canceled).
+    def save(self, gpkg_path: str, counts: 'Dict[str, int]',
+          feedback: 'QgsProcessingFeedback') -> str:
+        """
+        This method writes the report (as JSON) and the profile (if any)
+        next to the GeoPackage, logs a summary, and returns the path of
+        the report.
+        """
+        base = path.splitext(gpkg_path)[0]
+        report = self.report(counts)
+        report['profile'] = None
+        if self._profiler is not None:
+            report['profile'] = base + '.prof'
+            self._profiler.dump_stats(report['profile'])
+        report_path = base + '.report.json'
+        with open(report_path, 'w', encoding='utf-8') as report_file:
+            json.dump(report, report_file, indent=2)
+
+        lines = ['Conversion took ' + format(self.seconds, '.3f') + ' s:']
+        self._summarize(lines, None, 1)
+        lines.append('  ' + ', '.join(
+          str(count) + ' ' + counter
+          for counter, count in report['counters'].items()))
+        lines.append('Report written to ' + report_path)
+        if report['profile'] is not None:
+            lines.append('Profile written to ' + report['profile'] +
+                         ' (see python3 -m pstats)')
+        feedback.pushInfo('\n'.join(lines))
+        return report_path
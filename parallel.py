@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+This module defines functions that split a PipelineML file at component
+boundaries, so that its parts can be parsed in parallel (by worker
+processes) while the features are written by a single process.
+"""
+
+
+import mmap
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from xml.parsers import expat
+from xml.sax.saxutils import quoteattr
+from .feedback import ConsoleFeedback
+from .reader import PipelineMLReader
+
+
+# This is the number of bytes read at a time while scanning the header.
+_SCAN_SIZE = 65536
+
+# These are the bytes that may follow an element name in a tag.
+_NAME_ENDS = b' \t\r\n/>'
+
+# These are the delimiters of the sections of a document in which
+# markup is not recognized (and so 'component' start-tags cannot be).
+# (Attribute values cannot contain '<', so they need not be checked.)
+_OPAQUE_SECTIONS = ((b'<!--', b'-->'), (b'<![CDATA[', b']]>'),
+                    (b'<?', b'?>'))
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_local_name' function.
+def _local_name(name: str) -> str:
+    """
+    This function returns the local name of an element
+    (i.e., its name without any namespace prefix).
+    """
+    return name.rpartition(':')[2]
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_StopScan' exception class, which is raised (from
+# within an XML parser handler) once the first component is found.
+class _StopScan(Exception):
+    """
+    This class signals that the header has been scanned.
+    """
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'scan_header' function.
+def scan_header(pml_file: 'BinaryIO') -> 'Dict[str, Any]':
+    """
+    This function parses a PipelineML file (opened in binary mode) up to
+    its first 'component' element, and returns the information needed to
+    parse the rest of it in parts: the XML declaration and start-tag of
+    the root element (as 'prolog'), the end-tag of the root element (as
+    'epilog'), the default CRS ('crs'), the byte offset of the first
+    'component' element ('start'; None if there is no component) and its
+    name ('component', with the prefix of its namespace, if any).
+    Elements are matched by their local names, whatever their prefixes.
+    """
+    header = {'encoding': None, 'root': None, 'attributes': {},
+              'crs': None, 'start': None, 'component': None}
+    stack = []
+
+    # Define the handlers for the XML parser.
+    def handle_xml_decl(version: str, encoding: str,
+          standalone: int) -> None:
+        header['encoding'] = encoding
+
+    def handle_element_start(name: str, attributes: dict) -> None:
+        if len(stack) < 1:
+            header['root'] = name
+            header['attributes'] = attributes
+        elif len(stack) == 1 and _local_name(name) == 'component':
+            header['start'] = parser.CurrentByteIndex
+            header['component'] = name
+            raise _StopScan()
+        stack.append(name)
+
+    def handle_character_data(data: str) -> None:
+        if (len(stack) > 1 and _local_name(stack[-1]) == 'defaultCRS'
+              and not data.isspace()):
+            header['crs'] = data.partition(' ')[2].strip('()')
+
+    def handle_element_end(name: str) -> None:
+        stack.pop()
+
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    parser.XmlDeclHandler = handle_xml_decl
+    parser.StartElementHandler = handle_element_start
+    parser.CharacterDataHandler = handle_character_data
+    parser.EndElementHandler = handle_element_end
+    try:
+        while True:
+            data = pml_file.read(_SCAN_SIZE)
+            parser.Parse(data, not data)
+            if not data:
+                break
+    except _StopScan:
+        pass
+
+    # Reconstruct the prolog and epilog (in the encoding of the file).
+    encoding = header['encoding'] or 'utf-8'
+    prolog = '<?xml version="1.0" encoding="' + encoding + '"?>'
+    if header['root'] is not None:
+        prolog += '<' + header['root'] + ''.join(
+          ' ' + key + '=' + quoteattr(value)
+          for key, value in header['attributes'].items()) + '>'
+        header['epilog'] = ('</' + header['root'] + '>').encode(encoding)
+    header['prolog'] = prolog.encode(encoding)
+    return header
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_find_component' function.
+def _find_component(data: 'mmap.mmap', tag: bytes, origin: int,
+      start: int, end: int) -> int:
+    """
+    This function returns the offset of the first 'component' start-tag
+    (given as 'tag', i.e., '<' and the element's name, with any prefix)
+    in 'data' between 'start' and 'end' (or -1 if there is none).  A tag
+    within a comment, CDATA section or processing instruction opened
+    since 'origin' (which must not be within one) is skipped.
+    """
+    while True:
+        start = data.find(tag, start, end)
+        if start < 0:
+            return start
+        if data[start + len(tag):start + len(tag) + 1] not in _NAME_ENDS:
+            start += len(tag)
+            continue
+
+        # Check whether the tag is within a section opened (but not
+        # closed) since the origin, and if so, skip to the section's end.
+        for opening, closing in _OPAQUE_SECTIONS:
+            opened = data.rfind(opening, origin, start)
+            if opened >= 0 and data.find(
+                  closing, opened + len(opening), start) < 0:
+                closed = data.find(closing, start, end)
+                if closed < 0:
+                    return -1
+                start = origin = closed + len(closing)
+                break
+        else:
+            return start
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'split' function.
+def split(pml_file: 'BinaryIO', header: 'Dict[str, Any]',
+      chunk_size: int) -> 'List[Tuple[int, int]]':
+    """
+    This function divides the 'component' elements of a PipelineML file
+    (opened in binary mode) into ranges of bytes of about 'chunk_size'
+    each, beginning at a 'component' start-tag and ending at the next one
+    (or at the end-tag of the root element).  The list is empty if the
+    file cannot be split (e.g., if it has no components, or if it is not
+    in an ASCII-compatible encoding).  Components are found by the name
+    of the first one (so they are expected to share its prefix).
+    """
+    encoding = (header['encoding'] or 'utf-8').lower().replace('_', '-')
+    if header['start'] is None or encoding.startswith(('utf-16', 'utf-32')):
+        return []
+
+    # Note that this scan does not fully parse the file (e.g., '<!--' in
+    # a CDATA section is taken for a comment), so 'read_chunks' falls back
+    # to parsing the rest of the file in one process if a chunk is bad.
+    with mmap.mmap(pml_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        end = data.rfind(b'</' + header['root'].encode(encoding))
+        tag = ('<' + header['component']).encode(encoding)
+        chunks = []
+        start = header['start']
+        while start < end:
+            cut = _find_component(data, tag, start, start + chunk_size,
+                                  end)
+            if cut < 0:
+                cut = end
+            chunks.append((start, cut))
+            start = cut
+    return chunks
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_read_chunk' function, which runs in a worker process.
+# (It must be defined at module level so that it can be pickled.)
+def _read_chunk(pml_path: str, start: int, end: int, prolog: bytes,
+      epilog: bytes, reader_options: 'Dict[str, Any]' = None
+      ) -> 'List[Tuple[Layout, Tuple, bytes]]':
+    """
+    This function parses the given range of bytes of a PipelineML file
+    (wrapped in the file's prolog and epilog), and returns the features
+    found (each as its layout, field values and geometry as WKB).  Any
+    'reader_options' (e.g., layer filters) are passed on to the reader.
+    """
+    features = []
+
+    def handle_feature(layout: 'Layout', values: 'Tuple',
+          geometry: bytes) -> None:
+        features.append((layout, values, geometry))
+
+    with open(pml_path, 'rb') as pml_file:
+        pml_file.seek(start)
+        data = pml_file.read(end - start)
+    reader = PipelineMLReader(lambda name: None, handle_feature,
+                              ConsoleFeedback(quiet=True),
+                              **(reader_options or {}))
+    reader.parse(prolog + data + epilog)
+    return features
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_read_rest' function.
+def _read_rest(pml_path: str, start: int, prolog: bytes,
+      reader_options: 'Dict[str, Any]' = None
+      ) -> 'Iterator[Tuple[int, List[Any]]]':
+    """
+    This function parses a PipelineML file from the given offset to its
+    end (preceded by the file's prolog) in this process, and yields the
+    features found as 'read_chunks' does, a block of the file at a time.
+    """
+    features = []
+
+    def handle_feature(layout: 'Layout', values: 'Tuple',
+          geometry: bytes) -> None:
+        features.append((layout, values, geometry))
+
+    reader = PipelineMLReader(lambda name: None, handle_feature,
+                              ConsoleFeedback(quiet=True),
+                              **(reader_options or {}))
+    reader.parse(prolog, False)
+    with open(pml_path, 'rb') as pml_file:
+        pml_file.seek(start)
+        while True:
+            data = pml_file.read(_SCAN_SIZE)
+            reader.parse(data, not data)
+            start += len(data)
+            if features:
+                yield start, features
+                features = []
+            if not data:
+                break
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'read_chunks' function.
+def read_chunks(pml_path: str, header: 'Dict[str, Any]',
+      chunks: 'List[Tuple[int, int]]', jobs: int = None,
+      reader_options: 'Dict[str, Any]' = None,
+      feedback: 'QgsProcessingFeedback' = None
+      ) -> 'Iterator[Tuple[int, List[Any]]]':
+    """
+    This function parses the given chunks (see 'split') of a PipelineML
+    file using 'jobs' worker processes (by default, one per CPU), and
+    yields the end offset and features of each chunk, in order (passing
+    any 'reader_options' on to the reader of each chunk).  Only a
+    few chunks are parsed ahead of the one being consumed, so the memory
+    used does not depend on the size of the file.  If a chunk cannot be
+    parsed (e.g., because it was cut at a 'component' start-tag that
+    'split' did not recognize as text), the rest of the file is parsed
+    in this process instead (reporting this to any 'feedback' object).
+    """
+    jobs = jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(jobs) as executor:
+        window = 2 * jobs
+        pending = deque()
+        chunks = iter(chunks)
+        try:
+            while True:
+                # Keep the window of chunks being parsed full.
+                while len(pending) < window:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    future = executor.submit(
+                      _read_chunk, pml_path, chunk[0], chunk[1],
+                      header['prolog'], header['epilog'], reader_options)
+                    pending.append((chunk, future))
+                if len(pending) < 1:
+                    return
+                chunk, future = pending.popleft()
+                try:
+                    features = future.result()
+                except expat.ExpatError as error:
+                    start, failure = chunk[0], error
+                    break
+                yield chunk[1], features
+        finally:
+            # If the consumer stops early (e.g., because the user
+            # canceled, or a chunk failed), don't parse the others.
+            for chunk, future in pending:
+                future.cancel()
+
+    # (Any error in the rest of the file is then raised from here.)
+    if feedback is not None:
+        feedback.pushInfo('Parsing the rest of the file in a single '
+                          'process, since the chunk at byte '
+                          + str(start) + ' could not be parsed ('
+                          + str(failure) + ')')
+    yield from _read_rest(pml_path, start, header['prolog'],
+                          reader_options)
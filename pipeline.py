@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+This module defines the 'WriterThread' class, which writes features in a
+thread of its own, so that parsing the PipelineML (in the main thread)
+overlaps with writing the GeoPackage.
+"""
+
+
+import queue
+import threading
+
+
+# This is the number of records passed through the queue at a time.
+# (Passing them in blocks, rather than one by one, keeps the cost of
+# locking the queue small.)  A block is passed on sooner if its records
+# span this many bytes of PipelineML, so that the memory held in the
+# queue is limited even when features are huge.
+BLOCK_SIZE = 256
+BLOCK_BYTES = 1048576
+
+# This is the number of seconds to wait at a time for room in the queue,
+# between checks that the writer thread is still running.
+_TIMEOUT = 0.1
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'WriterThread' class.
+class WriterThread:
+    """
+    This class consumes the records produced by a reader, passing them to a
+    'GeoPackageWriter' in a separate thread.  It has the same 'set_crs' and
+    'add_feature' methods as the writer, so it can be put between the two.
+    """
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '__init__' method (i.e., the constructor), which
+    # is called when a new object of this class is instantiated.
+    def __init__(self, writer: 'GeoPackageWriter',
+          progress: 'ProgressReporter', queue_size: int = 64) -> None:
+        """
+        This method starts the writer thread.  At most 'queue_size' blocks
+        of records are held in the queue; once it is full, the reader waits
+        for the writer to catch up.
+        """
+        self.writer = writer
+        self.progress = progress
+
+        # This is the exception raised in the writer thread (if any).
+        self.error = None
+
+        self._queue = queue.Queue(queue_size)
+        self._block = []
+        self._block_start = 0
+        self._stopping = False
+        self._thread = threading.Thread(
+          target=self._run, name='GeoPackage writer', daemon=True)
+        self._thread.start()
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'set_crs' method.
+    def set_crs(self, name: str) -> None:
+        """
+        This method queues a change of the default CRS (so that it
+        takes effect in order with the features around it).
+        """
+        self._block.append((None, name, None, 0))
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'add_feature' method.
+    def add_feature(self, layout: 'Layout', values: 'Tuple',
+          geometry: bytes, position: int = 0) -> None:
+        """
+        This method queues a feature to be added (see
+        'GeoPackageWriter.add_feature').
+        """
+        block = self._block
+        block.append((layout, values, geometry, position))
+        if (len(block) >= BLOCK_SIZE or
+              position - self._block_start >= BLOCK_BYTES):
+            self._block = []
+            self._block_start = position
+            self._put(block)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_put' method.
+    def _put(self, block: 'Optional[List[Tuple]]') -> None:
+        """
+        This method adds a block of records to the queue, waiting for room
+        if necessary.  If the writer thread has failed, its exception is
+        raised here instead.
+        """
+        while True:
+            if self.error is not None:
+                raise self.error
+            try:
+                self._queue.put(block, timeout=_TIMEOUT)
+                return
+            except queue.Full:
+                pass
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_run' method, which is the body of the writer thread.
+    def _run(self) -> None:
+        """
+        This method writes the queued records until it is told to stop
+        (by a block of None).
+        """
+        writer = self.writer
+        count = self.progress.count
+        try:
+            while True:
+                block = self._queue.get()
+                if block is None or self._stopping:
+                    return
+                for layout, values, geometry, position in block:
+                    if layout is None:
+                        writer.set_crs(values)
+                        continue
+                    writer.add_feature(layout, values, geometry, position)
+                    count(layout.name)
+        except BaseException as error:
+            self.error = error
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'finish' method, which is called once
+    # the reader has produced all of its records.
+    def finish(self) -> None:
+        """
+        This method waits until every queued record has been written, and
+        raises the exception of the writer thread (if it failed).
+        """
+        if self._block:
+            self._put(self._block)
+            self._block = []
+        self._put(None)
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'stop' method, which is called when
+    # the conversion is canceled or an error occurs.
+    def stop(self) -> None:
+        """
+        This method stops the writer thread as soon as it has written the
+        current block, discarding the rest of the queue.
+        """
+        self._stopping = True
+        self._block = []
+        while self._thread.is_alive():
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                pass
+            self._thread.join(_TIMEOUT)
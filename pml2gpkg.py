@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+This script runs the 'pml2gpkg' command-line interface.  It may be run
+directly from the plugin directory (whatever that directory is named),
+and does not require QGIS.
+"""
+
+
+import sys
+from importlib import util
+from os import path
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_import_package' function, which imports the plugin
+# directory as a package, so that its modules' relative imports work.
+def _import_package() -> 'ModuleType':
+    """
+    This function imports and returns the plugin package.
+    """
+    directory = path.dirname(path.abspath(__file__))
+    spec = util.spec_from_file_location(
+      'pml_geopackager', path.join(directory, '__init__.py'),
+      submodule_search_locations=[directory])
+    package = util.module_from_spec(spec)
+    sys.modules[spec.name] = package
+    spec.loader.exec_module(package)
+    return package
+
+
+# Import the package even when this script is imported rather than run,
+# which is how worker processes are started on some platforms.
+_import_package()
+if __name__ == '__main__':
+    from pml_geopackager.cli import main
+    sys.exit(main())
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+This module defines the output performance profiles, which set the SQLite
+pragmas used while a GeoPackage is written.  Faster profiles give up some
+durability: if the process (or the machine) fails during a conversion,
+the GeoPackage may be corrupt rather than merely incomplete.
+"""
+
+
+from contextlib import contextmanager
+from osgeo import gdal
+
+
+# These are the pragmas that may be set (in profiles or individually).
+PRAGMAS = ('journal_mode', 'synchronous', 'cache_size', 'page_size',
+           'temp_store', 'busy_timeout')
+
+# These are the journal modes that may be set.  (The journal is never
+# turned off entirely, since canceling a conversion relies on rolling
+# back the open transaction.)
+JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'MEMORY', 'WAL')
+
+# This dictionary defines the pragmas of each profile.  (A negative
+# cache size is in kibibytes.)
+PROFILES = {
+  'default': {},
+  'fast': {'journal_mode': 'MEMORY', 'synchronous': 'OFF',
+           'cache_size': '-262144', 'temp_store': 'MEMORY'},
+  'scratch': {'journal_mode': 'MEMORY', 'synchronous': 'OFF',
+              'cache_size': '-1048576', 'temp_store': 'MEMORY',
+              'page_size': '65536'}}
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'parse_pragmas' function.
+def parse_pragmas(text: str) -> 'Dict[str, str]':
+    """
+    This function parses pragmas given as text
+    (e.g., 'synchronous=OFF, cache_size=-65536').
+    """
+    pragmas = {}
+    for item in text.split(','):
+        if not item.strip():
+            continue
+        name, separator, value = item.partition('=')
+        if not separator:
+            raise ValueError('Expected NAME=VALUE, not ' + item.strip())
+        pragmas[name.strip()] = value.strip()
+    return pragmas
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'profile_pragmas' function.
+def profile_pragmas(profile: str = 'default',
+      overrides: 'Dict[str, str]' = None) -> 'Dict[str, str]':
+    """
+    This function returns the pragmas of a profile, with any of them
+    replaced by 'overrides' (which are checked, so that, e.g., the
+    journal cannot be turned off).
+    """
+    if profile not in PROFILES:
+        raise ValueError('Unknown profile ' + profile + ' (expected ' +
+                         ', '.join(PROFILES) + ')')
+    pragmas = dict(PROFILES[profile])
+    for name, value in (overrides or {}).items():
+        if name not in PRAGMAS:
+            raise ValueError('Unknown pragma ' + name + ' (expected ' +
+                             ', '.join(PRAGMAS) + ')')
+        if not value.lstrip('-').isalnum():
+            raise ValueError('Invalid value for ' + name + ': ' + value)
+        if name == 'journal_mode' and value.upper() not in JOURNAL_MODES:
+            raise ValueError('Invalid journal mode ' + value + ' (expected ' +
+                             ', '.join(JOURNAL_MODES) + ')')
+        pragmas[name] = value
+    return pragmas
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'sqlite_pragmas' function, which is a context manager.
+@contextmanager
+def sqlite_pragmas(pragmas: 'Dict[str, str]') -> 'Iterator[None]':
+    """
+    This function sets the given pragmas for the SQLite databases (e.g.,
+    GeoPackages) that GDAL creates or opens in the current thread within
+    the 'with' block.  (GDAL sets them as soon as it opens the database,
+    before creating any tables, so even the page size takes effect.)
+    """
+    previous = gdal.GetThreadLocalConfigOption('OGR_SQLITE_PRAGMA', None)
+    gdal.SetThreadLocalConfigOption(
+      'OGR_SQLITE_PRAGMA',
+      ','.join(name + '=' + value for name, value in pragmas.items())
+      or previous)
+    try:
+        yield
+    finally:
+        gdal.SetThreadLocalConfigOption('OGR_SQLITE_PRAGMA', previous)
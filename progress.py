@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+This module defines the 'ProgressReporter' class.
+"""
+
+
+from time import monotonic
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'ProgressReporter' class.
+class ProgressReporter:
+    """
+    This class throttles the progress and log messages
+    sent to a processing feedback object.
+    """
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '__init__' method (i.e., the constructor), which
+    # is called when a new object of this class is instantiated.
+    def __init__(self, feedback: 'QgsProcessingFeedback',
+          total: 'Optional[int]', verbose: bool = False,
+          interval: float = 0.25) -> None:
+        """
+        This method prepares to report progress through 'total' units of
+        work (e.g., bytes), at most once per integer percent and (unless
+        'interval' is zero) no more often than once every 'interval'
+        seconds.  If 'total' is None (i.e., unknown), no progress is shown.
+        Per-feature messages are only logged if 'verbose' is set.
+        """
+        self.feedback = feedback
+        self.verbose = verbose
+        self.counts = {}
+        self._total = max(total or 0, 1)
+        self._interval = interval
+        self._time = 0.0
+        self._percent = -1
+
+        # This is the position at which the next integer percent is
+        # reached.  Comparing against it keeps the common case (no
+        # report necessary) down to a single integer comparison.
+        self._next = 0 if total is not None else float('inf')
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'update' method, which may be called as often as
+    # desired (e.g., for every XML element) with the current position.
+    def update(self, position: int) -> None:
+        """
+        This method updates the progress bar if enough
+        progress (and time) has passed since the last update.
+        """
+
+        # Return immediately if the next percent has not been reached.
+        if position < self._next:
+            return
+
+        # Determine the integer percent and the position at which it
+        # will next change.  If the last report was too recent, wait for
+        # the next percent rather than checking the clock on every call.
+        percent = min(100 * position // self._total, 100)
+        self._next = ((percent + 1) * self._total + 99) // 100
+        now = monotonic()
+        if percent == self._percent or now - self._time < self._interval:
+            return
+        self._percent = percent
+        self._time = now
+        self.feedback.setProgress(percent)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'info' method, which is used for messages that
+    # would be issued for every feature (and are therefore only
+    # worth logging while debugging).
+    def info(self, message: str) -> None:
+        """
+        This method logs a per-feature message in verbose mode.
+        """
+        if self.verbose:
+            self.feedback.pushInfo(message)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'count' method, which should be called
+    # once for every feature added to the output.
+    def count(self, layer_name: str) -> None:
+        """
+        This method increments the feature count for a layer.
+        """
+        self.counts[layer_name] = self.counts.get(layer_name, 0) + 1
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'finish' method, which should be called once
+    # all work is done.  It logs the per-layer feature counts
+    # as a single summary message.
+    def finish(self) -> None:
+        """
+        This method completes the progress bar and logs a summary.
+        """
+        self.feedback.setProgress(100)
+        total = sum(self.counts.values())
+        message = 'Added ' + str(total) + ' features'
+        if total > 0:
+            message += ': ' + ', '.join(
+              name + ' (' + str(count) + ')'
+              for name, count in sorted(self.counts.items()))
+        self.feedback.pushInfo(message)
@@ -0,0 +1,637 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+This module defines the 'PipelineMLReader' class.
+"""
+
+
+import re
+import sys
+from xml.parsers import expat
+from .geometry import (
+  GmlElement, build_wkb, intersects, is_supported, parse_coordinates,
+  parse_tuples)
+from .records import Layout
+
+
+# This regular expression matches the EPSG code in
+# the various forms of CRS name used in GML (e.g.,
+# 'EPSG:4326', 'urn:ogc:def:crs:EPSG::4326' and
+# 'http://www.opengis.net/def/crs/EPSG/0/4326').
+_EPSG_CODE = re.compile(r'EPSG\W+(?:[\d.]+\W+)?(\d+)$', re.IGNORECASE)
+
+# This is the number of bytes passed to the XML parser at a time.
+CHUNK_SIZE = 65536
+
+# This is the character that the XML parser puts between the namespace URI
+# and the local name of an element or attribute (e.g., between
+# 'http://www.opengis.net/gml/3.2' and 'Point'), and the end of the name of
+# a 'title' attribute in any namespace (e.g., 'xlink:title').
+_SEPARATOR = ' '
+_TITLE = _SEPARATOR + 'title'
+
+# These are the states of the reader, one for each kind of element: the
+# document itself (before the root element), any element outside of the
+# components (which may contain components or the default CRS), the
+# default CRS, a component, a feature (within a component), a field (within
+# a feature), a feature's location, a GML geometry (within a location), an
+# element within a GML geometry, and an element that is skipped along with
+# everything in it.
+(_DOCUMENT, _CONTAINER, _CRS, _COMPONENT, _FEATURE, _FIELD, _LOCATION,
+ _GEOMETRY, _GML, _SKIP) = range(10)
+
+# This dictionary is the transition table of the reader.  For each state,
+# it gives the states of child elements with particular local names, and
+# the state of any other child element.
+_TRANSITIONS = {
+  _DOCUMENT: ({}, _CONTAINER),
+  _CONTAINER: ({'defaultCRS': _CRS, 'component': _COMPONENT}, _CONTAINER),
+  _CRS: ({}, _SKIP),
+  _COMPONENT: ({}, _FEATURE),
+  _FEATURE: ({'location': _LOCATION}, _FIELD),
+  _FIELD: ({}, _SKIP),
+  _LOCATION: ({}, _GEOMETRY),
+  _GEOMETRY: ({}, _GML),
+  _GML: ({}, _GML),
+  _SKIP: ({}, _SKIP)}
+
+# This tuple tells (by state) whether the content of elements is kept.
+_COLLECTS = tuple(state in (_CRS, _FIELD, _GEOMETRY, _GML)
+                  for state in range(len(_TRANSITIONS)))
+
+# These dictionaries name the methods that are called at the start
+# and at the end of elements in each state (if any).  (Fields, being by
+# far the most common elements, are mostly handled without such calls.)
+_STARTS = {_CRS: '_start_crs', _FEATURE: '_start_feature',
+           _FIELD: '_start_field', _GEOMETRY: '_start_geometry',
+           _GML: '_start_gml'}
+_ENDS = {_CRS: '_end_crs', _FEATURE: '_end_feature',
+         _GEOMETRY: '_end_geometry', _GML: '_end_gml'}
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_ignore' function, which stands in
+# for optional callbacks that were not provided.
+def _ignore(*args: 'Any') -> None:
+    """
+    This function does nothing.
+    """
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_normalize_crs' function.
+def _normalize_crs(name: str) -> str:
+    """
+    This function returns a CRS name in a form that can be compared
+    with other names for the same CRS (e.g., 'EPSG:4326').
+    """
+    match = _EPSG_CODE.search(name.strip())
+    return name.strip() if match is None else 'EPSG:' + match.group(1)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'keeps_layer' function.
+def keeps_layer(name: str, layers: 'Container[str]' = None,
+      exclude_layers: 'Container[str]' = ()) -> bool:
+    """
+    This function tells whether the named layer is to be converted: it
+    must be among 'layers' (unless that is None) and not among
+    'exclude_layers'.
+    """
+    return ((layers is None or name in layers)
+            and name not in exclude_layers)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'PipelineMLReader' class.
+class PipelineMLReader:
+    """
+    This class parses PipelineML, calling back with the default
+    coordinate reference system (CRS) and with each feature found.
+    It knows nothing of the output, so it can be used wherever the
+    features are to be written (e.g., in another process).
+    """
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '__init__' method (i.e., the constructor), which
+    # is called when a new object of this class is instantiated.
+    def __init__(self, handle_crs: 'Callable[[str], None]',
+          handle_feature: 'Callable[[Layout, Tuple, bytes], None]',
+          feedback: 'QgsProcessingFeedback',
+          layouts: 'Dict[str, Layout]' = None,
+          layers: 'Iterable[str]' = None,
+          exclude_layers: 'Iterable[str]' = (),
+          bbox: 'Tuple[float, float, float, float]' = None,
+          text_limit: int = 0, verbose: bool = False) -> None:
+        """
+        This method saves the callbacks.  The 'handle_crs' function is
+        called with the name of the default CRS (e.g., 'EPSG:4326'); the
+        'handle_feature' function is called with the layout of the layer,
+        the tuple of field values (in the order of the layout's fields)
+        and the geometry of each feature.  The 'layouts' dictionary (by
+        layer name) is used and extended as layers and fields are found.
+        Only the features of the layers named in 'layers' (if given) and
+        not in 'exclude_layers' are parsed; the elements of any other
+        components are skipped.  If a bounding box is given (as minimum x,
+        minimum y, maximum x and maximum y, in the coordinates of the
+        file), only features whose geometries intersect it are passed on.
+        If 'text_limit' is given, the coordinates of a GML element are
+        parsed whenever that many characters of them have been collected
+        (rather than all at once, at its end-tag), so that the text of a
+        long list of coordinates is never held in memory in full.  If
+        'verbose' is set, a message is logged for every geometry created.
+        """
+        self.handle_crs = handle_crs
+        self.handle_feature = handle_feature
+        self.feedback = feedback
+        self.layouts = {} if layouts is None else layouts
+        self.layers = None if layers is None else set(layers)
+        self.exclude_layers = set(exclude_layers)
+        self.bbox = bbox
+        self.text_limit = text_limit
+        self.verbose = verbose
+
+        # This list serves as a stack of the states of the XML elements
+        # being parsed.  These lists hold (by state) the methods called at
+        # the start and at the end of elements, and the transitions found
+        # so far (as a dictionary mapping each element name to the entry
+        # made by '_compile'), so that the work of each element is mostly
+        # a dictionary lookup.
+        self._states = [_DOCUMENT]
+        self._starts = [getattr(self, _STARTS[state])
+                        if state in _STARTS else None
+                        for state in range(len(_TRANSITIONS))]
+        self._ends = [getattr(self, _ENDS[state]) if state in _ENDS else None
+                      for state in range(len(_TRANSITIONS))]
+        self._table = [{} for state in range(len(_TRANSITIONS))]
+
+        # These variables keep track of the current feature: the layout
+        # of its layer, its field values (by slot), and the slot and
+        # content (so far) of the field currently being parsed.
+        self._layout = None
+        self._values = []
+        self._slot = 0
+        self._field = None
+
+        # This is the geometry of the current feature (if any), as WKB,
+        # whether the feature is within the bounding box (if any), and
+        # whether the GML geometry being parsed has invalid coordinates.
+        self._geometry = None
+        self._inside = True
+        self._invalid = False
+
+        # These variables keep track of the GML geometry being parsed (if
+        # any): the stack of its elements being parsed (the first being
+        # the geometry itself), and the pieces of text of the innermost
+        # (and their total length, if it is limited).
+        self._elements = []
+        self._text = []
+        self._text_size = 0
+
+        # This is the (normalized) name of the CRS of the dataset, once
+        # known, and the set of problems (e.g., unsupported geometry
+        # types) already reported, so that each is reported only once.
+        self._crs = None
+        self._reported = set()
+
+        # Create the XML parser (which separates namespace URIs from local
+        # names).  The handler methods called by the parser identify the
+        # features.
+        self._parser = expat.ParserCreate(namespace_separator=_SEPARATOR)
+        self._parser.buffer_text = True
+        self._parser.StartElementHandler = self._handle_element_start
+        self._parser.CharacterDataHandler = self._handle_character_data
+        self._parser.EndElementHandler = self._handle_element_end
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'position' property.
+    @property
+    def position(self) -> int:
+        """
+        This property is the parser's current byte index in the input.
+        """
+        return self._parser.CurrentByteIndex
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'parse_file' method.
+    def parse_file(self, pml_file: 'BinaryIO',
+          handle_chunk: 'Callable[[], None]' = _ignore,
+          chunk_size: int = CHUNK_SIZE) -> None:
+        """
+        This method parses the contents of a PipelineML file (which must
+        be opened in binary mode, or be any object with a binary 'read'
+        method), feeding it to the parser in chunks of 'chunk_size' bytes.
+        The 'handle_chunk' function is called after each chunk (e.g., to
+        update the progress bar, or to abort by raising an exception).
+        """
+        parser = self._parser
+        while True:
+            data = pml_file.read(chunk_size)
+            parser.Parse(data, not data)
+            if not data:
+                return
+            handle_chunk()
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'parse' method.
+    def parse(self, data: bytes, final: bool = True) -> None:
+        """
+        This method parses a PipelineML document (or, unless
+        'final' is set, the next part of one) from memory.
+        """
+        self._parser.Parse(data, final)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_compile' method, which is called the first time an
+    # element with a given (qualified) name is found in a given state.
+    def _compile(self, state: int, name: str) -> 'Tuple[int, str, Any]':
+        """
+        This method determines (and caches) the state of an element with
+        the given name (in the parser's 'URI local-name' form) within an
+        element in the given state, the element's local name, and the
+        method to call at its start-tag (if any).  Elements are matched by
+        local name, whatever their namespace.
+        """
+        local = sys.intern(name.rpartition(_SEPARATOR)[2])
+        named, default = _TRANSITIONS[state]
+        new_state = named.get(local, default)
+
+        # The features of layers that are not to be
+        # converted are skipped (along with their content).
+        if new_state == _FEATURE and not keeps_layer(
+              local, self.layers, self.exclude_layers):
+            new_state = _SKIP
+        entry = (new_state, local, self._starts[new_state])
+        self._table[state][name] = entry
+        return entry
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_handle_element_start' method, which is called (by the
+    # XML parser) for the start of every element in the PipelineML file.
+    def _handle_element_start(self, name: str, attributes: dict) -> None:
+        """
+        This method processes the start-tag of a PipelineML element:
+        it looks up the element's state (from the state of its parent
+        and its name), and calls the method for that state (if any).
+        """
+        states = self._states
+        entry = self._table[states[-1]].get(name)
+        if entry is None:
+            entry = self._compile(states[-1], name)
+        state, local, start = entry
+        states.append(state)
+
+        # Fields are by far the most common elements, so the start of a
+        # field already in the layout (without attributes) is handled here,
+        # rather than by calling '_start_field'.
+        if state == _FIELD:
+            slot = self._layout.slots.get(local)
+            if slot is None or slot >= len(self._values) or attributes:
+                self._start_field(local, attributes)
+                return
+            self._slot = slot
+            self._field = None
+        elif start is not None:
+            start(local, attributes)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_handle_character_data' method, which is called
+    # (by the XML parser) for character data in the PipelineML file.
+    def _handle_character_data(self, data: str) -> None:
+        """
+        This method collects the content of a PipelineML element, if the
+        element's state calls for it.  (Content may arrive in several
+        pieces, e.g., when it spans chunks of the input, which are joined.
+        Whitespace is kept, since it may separate numbers.)
+        """
+        state = self._states[-1]
+        if state == _FIELD:
+            field = self._field
+            self._field = data if field is None else field + data
+        elif _COLLECTS[state]:
+            self._text.append(data)
+            if state == _GML and self.text_limit:
+                self._text_size += len(data)
+                if self._text_size >= self.text_limit:
+                    self._flush_text()
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_handle_element_end' method, which is called (by the
+    # XML parser) for the end of every element in the PipelineML file.
+    def _handle_element_end(self, name: str) -> None:
+        """
+        This method processes the end-tag of a PipelineML element, by
+        calling the method for the element's state (if any).  The content
+        of a field (unless it is only whitespace) is used as its value.
+        """
+        state = self._states.pop()
+        if state == _FIELD:
+            text = self._field
+            if text is not None and not text.isspace():
+                self._values[self._slot] = text
+            return
+        end = self._ends[state]
+        if end is not None:
+            end()
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_start_crs' method, which is called at
+    # the start of the element that gives the default CRS.
+    def _start_crs(self, name: str, attributes: dict) -> None:
+        """
+        This method prepares to collect the name of the default CRS.
+        """
+        self._text = []
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_end_crs' method.
+    def _end_crs(self) -> None:
+        """
+        This method sets the default CRS for the dataset from
+        the content of the element (e.g., 'urn (EPSG:4326)').
+        """
+        text = ''.join(self._text)
+        if text and not text.isspace():
+            crs = text.partition(' ')[2].strip('()')
+            self._crs = _normalize_crs(crs)
+            self.handle_crs(crs)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_start_feature' method, which is called at the start of
+    # each element within a 'component' element (i.e., of each feature).
+    def _start_feature(self, name: str, attributes: dict) -> None:
+        """
+        This method begins a feature of the layer named for the element.
+        """
+        layout = self.layouts.get(name)
+        if layout is None:
+            layout = self.layouts[name] = Layout(name)
+        self._layout = layout
+        self._values = [None] * len(layout.fields)
+        self._inside = self.bbox is None
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_end_feature' method.
+    def _end_feature(self) -> None:
+        """
+        This method passes the feature just parsed to 'handle_feature'
+        (unless it is outside the bounding box).
+        """
+        geometry = self._geometry
+        self._geometry = None
+        if self._inside:
+            self.handle_feature(self._layout, tuple(self._values), geometry)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_start_field' method, which is called at the start of
+    # each element within a feature (other than its 'location').
+    def _start_field(self, name: str, attributes: dict) -> None:
+        """
+        This method finds the field's slot in the layout, adding the field
+        to the layout if it is new.  (The field is recorded even if it
+        turns out to have no value, so that the output schema includes
+        every field present.)
+        """
+        layout = self._layout
+        slot = layout.slots.get(name)
+        if slot is None:
+            slot = layout.add(name)
+        values = self._values
+        if slot >= len(values):
+            values.extend([None] * (slot + 1 - len(values)))
+        self._slot = slot
+        self._field = None
+
+        # If this element has a 'title' attribute (e.g., 'xlink:title'),
+        # use that attribute's value as the field value.  (Otherwise, the
+        # field value should be in the character data.)
+        if attributes:
+            for key, value in attributes.items():
+                if key == 'title' or key.endswith(_TITLE):
+                    values[slot] = value
+                    break
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_start_geometry' method, which is called at the start
+    # of the element within 'location' (i.e., of a GML geometry).
+    def _start_geometry(self, name: str, attributes: dict) -> None:
+        """
+        This method begins the tree of a GML geometry.
+        """
+        self._elements.append(GmlElement(
+          name, self._dimension(attributes), attributes))
+        self._text = []
+        self._invalid = False
+        srs_name = attributes.get('srsName')
+        if srs_name:
+            self._check_crs(srs_name)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_end_geometry' method.
+    def _end_geometry(self) -> None:
+        """
+        This method builds the GML geometry just parsed, unless it is
+        outside the bounding box (in which case neither it nor its
+        feature is kept), or has invalid coordinates (in which case the
+        feature is kept without it).
+        """
+        element = self._elements[0]
+        self._end_gml()
+        if self._invalid:
+            self._geometry = None
+            return
+        if self.bbox is not None:
+            self._inside = intersects(element, self.bbox)
+            if not self._inside:
+                self._geometry = None
+                return
+        self._geometry = self._build_geometry(element)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_start_gml' method, which is called at the
+    # start of each element within a GML geometry.
+    def _start_gml(self, name: str, attributes: dict) -> None:
+        """
+        This method adds the element to the tree of the geometry.  (Its
+        dimension is given by its 'srsDimension' attribute, if any, or
+        else is that of its parent.  An element such as 'gml:posList' may
+        give the dimension of its parents.)
+        """
+        elements = self._elements
+        dimension = self._dimension(attributes)
+        if dimension:
+            self._set_dimension(dimension)
+        element = GmlElement(
+          name, dimension or elements[-1].dimension, attributes)
+        elements[-1].children.append(element)
+        elements.append(element)
+        self._text = []
+        self._text_size = 0
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_end_gml' method.
+    def _end_gml(self) -> None:
+        """
+        This method parses the coordinates in the element (if any).
+        """
+        element = self._elements.pop()
+        if self._text:
+            text = ''.join(self._text)
+            self._text = []
+            self._text_size = 0
+            if text and not text.isspace():
+                self._add_coordinates(element, text)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_flush_text' method, which is called when the text
+    # collected for an element of a GML geometry reaches the limit.
+    def _flush_text(self) -> None:
+        """
+        This method parses the coordinates in the text collected so far,
+        up to the last separator between tuples (or numbers), keeping the
+        rest (which may be part of a number) to be parsed with the text
+        that follows.  (A single position is always parsed at its end-tag,
+        since its dimension is inferred from it.)
+        """
+        element = self._elements[-1]
+        if element.name == 'pos':
+            return
+        text = ''.join(self._text)
+        separator = ' '
+        if element.name == 'coordinates':
+            separator = element.attributes.get('ts', ' ')
+        if separator.isspace():
+            cut = max(text.rfind(space) for space in ' \t\n\r')
+            rest = text[cut:] if cut >= 0 else text
+        else:
+            cut = text.rfind(separator)
+            rest = text[cut + len(separator):] if cut >= 0 else text
+        if cut > 0 and not text[:cut].isspace():
+            self._add_coordinates(element, text[:cut])
+        self._text = [rest]
+        self._text_size = len(rest)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_add_coordinates' method, which is called at the
+    # end of each element of a GML geometry that has content.
+    def _add_coordinates(self, element: GmlElement, text: str) -> None:
+        """
+        This method parses the coordinates in an element of a GML
+        geometry.  If the element does not have a known dimension, it is
+        inferred from a single position ('gml:pos') or from the tuples of
+        'gml:coordinates', and applied to the enclosing elements.  If
+        the coordinates are not all numbers, the geometry is marked as
+        invalid (and reported).
+        """
+        if self._invalid:
+            return
+        try:
+            if element.name == 'coordinates':
+                attributes = element.attributes
+                coordinates, dimension = parse_tuples(
+                  text, attributes.get('cs', ','),
+                  attributes.get('ts', ' '), attributes.get('decimal', '.'))
+            else:
+                coordinates = parse_coordinates(text)
+                dimension = len(coordinates) if element.name == 'pos' else 0
+        except ValueError as error:
+            self._invalid = True
+            self.feedback.reportError(
+              'Skipping the geometry of a ' + self._layout.name +
+              ' feature (' + str(error) + ')')
+            return
+        element.parts.append(coordinates)
+        if not element.dimension and dimension in (2, 3):
+            self._set_dimension(dimension)
+            element.dimension = dimension
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_dimension' method.
+    def _dimension(self, attributes: dict) -> int:
+        """
+        This method returns the dimension given by the 'srsDimension'
+        attribute of an element of a GML geometry (or 0 if there is none).
+        Any value other than 2, 3 or 4 is reported (once) and ignored, so
+        that the dimension is inherited or inferred instead.
+        """
+        value = attributes.get('srsDimension')
+        if value is None:
+            return 0
+        if value.strip() in ('2', '3', '4'):
+            return int(value)
+        if ('srsDimension', value) not in self._reported:
+            self._reported.add(('srsDimension', value))
+            self.feedback.reportError(
+              'Ignoring srsDimension="' + value + '" (expected 2, 3 or 4)')
+        return 0
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_set_dimension' method.
+    def _set_dimension(self, dimension: int) -> None:
+        """
+        This method sets the dimension of the enclosing
+        elements of a GML geometry that have none yet.
+        """
+        for element in reversed(self._elements):
+            if element.dimension:
+                break
+            element.dimension = dimension
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_check_crs' method, which is called for
+    # each GML geometry that has a 'srsName' attribute.
+    def _check_crs(self, srs_name: str) -> None:
+        """
+        This method uses the CRS of a geometry as the default CRS if none
+        has been given (by a 'defaultCRS' element).  Geometries are not
+        transformed, so a different CRS is reported (once).
+        """
+        crs = _normalize_crs(srs_name)
+        if self._crs is None:
+            self._crs = crs
+            self.handle_crs(srs_name)
+        elif crs != self._crs and crs not in self._reported:
+            self._reported.add(crs)
+            self.feedback.reportError(
+              'Geometries in ' + srs_name + ' are not transformed'
+              ' to ' + self._crs)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_build_geometry' method, which is called
+    # at the end of the GML geometry of a feature.
+    def _build_geometry(self, element: GmlElement) -> bytes:
+        """
+        This method returns the GML geometry just parsed, as WKB (or
+        None, having reported the problem, if it cannot be converted).
+        """
+        if not is_supported(element.name):
+            if element.name not in self._reported:
+                self._reported.add(element.name)
+                self.feedback.reportError(
+                  'Unknown geometry type: ' + element.name)
+            return None
+        if self.verbose:
+            self.feedback.pushInfo('Creating ' + element.name + ' geometry'
+                                   ' for ' + self._layout.name + ' feature')
+        try:
+            return build_wkb(element)
+        except ValueError as error:
+            self.feedback.reportError(
+              'Skipping the geometry of a ' + self._layout.name +
+              ' feature (' + str(error) + ')')
+            return None
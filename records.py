@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+This module defines the 'Layout' class.  The reader represents each
+feature compactly, by the layout of its layer and a tuple of field values
+in the order of the layout's fields (rather than by a dictionary of field
+names and values), with its geometry as WKB.
+"""
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'Layout' class.
+class Layout:
+    """
+    This class represents the fields of a layer, in the order in which they
+    were first found.  Fields are only ever added to the end, so a tuple of
+    values made for an earlier state of the layout is still valid (and
+    simply shorter).
+    """
+    __slots__ = ('name', 'fields', 'slots', 'cache')
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '__init__' method (i.e., the constructor), which
+    # is called when a new object of this class is instantiated.
+    def __init__(self, name: str, fields: 'Iterable[str]' = ()) -> None:
+        """
+        This method creates the layout of the named layer, with
+        the given fields (if any).
+        """
+        self.name = name
+
+        # This list holds the field names, and this dictionary
+        # maps each field name to its position (slot) in the list.
+        self.fields = []
+        self.slots = {}
+
+        # This is where the writer keeps whatever it needs to write
+        # features with this layout (e.g., field setters).  It is not
+        # passed on to other processes.
+        self.cache = None
+
+        for field in fields:
+            self.add(field)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'add' method.
+    def add(self, field: str) -> int:
+        """
+        This method adds a field, and returns its slot.
+        """
+        slot = len(self.fields)
+        self.fields.append(field)
+        self.slots[field] = slot
+        return slot
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '__getstate__' and '__setstate__' methods, which
+    # control how a layout is pickled (e.g., to be returned by a
+    # worker process).
+    def __getstate__(self) -> 'Tuple[str, List[str]]':
+        """
+        This method returns the name and fields of the layout.
+        """
+        return self.name, self.fields
+
+    def __setstate__(self, state: 'Tuple[str, List[str]]') -> None:
+        """
+        This method restores a layout from its name and fields.
+        """
+        self.__init__(*state)
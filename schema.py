@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+This module defines functions that discover the schema of a PipelineML
+file (i.e., its component types and their fields) before it is converted,
+so that the output can be created with its final schema up front.  A
+schema is a dictionary mapping each layer name to a list of field names.
+"""
+
+
+import json
+from xml.parsers import expat
+
+
+# This is the number of bytes read at a time while scanning.
+_SCAN_SIZE = 1048576
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'scan_schema' function.
+def scan_schema(pml_file: 'BinaryIO') -> 'Dict[str, List[str]]':
+    """
+    This function quickly parses a PipelineML file (opened in binary
+    mode), noting only the names of elements, and returns its schema.
+    Layers and fields are listed in the order of their first appearance,
+    which is the order in which a conversion would create them.
+    """
+    schema = {}
+    stack = []
+
+    # Define the handlers for the XML parser.  (Character data is
+    # not needed, which makes this much faster than a conversion.  As
+    # in a conversion, elements are matched by local name, whatever
+    # their namespace.)
+    def handle_element_start(name: str, attributes: dict) -> None:
+        name = name.rpartition(' ')[2]
+        if len(stack) > 1:
+            if stack[-1] == 'component':
+                if name not in schema:
+                    schema[name] = []
+            elif stack[-2] == 'component' and name != 'location':
+                fields = schema[stack[-1]]
+                if name not in fields:
+                    fields.append(name)
+        stack.append(name)
+
+    def handle_element_end(name: str) -> None:
+        stack.pop()
+
+    parser = expat.ParserCreate(namespace_separator=' ')
+    parser.StartElementHandler = handle_element_start
+    parser.EndElementHandler = handle_element_end
+    while True:
+        data = pml_file.read(_SCAN_SIZE)
+        parser.Parse(data, not data)
+        if not data:
+            return schema
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'load_schema' function.
+def load_schema(schema_path: str) -> 'Dict[str, List[str]]':
+    """
+    This function reads a schema from a JSON file.
+    """
+    with open(schema_path, encoding='utf-8') as schema_file:
+        return json.load(schema_file)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'save_schema' function.
+def save_schema(schema_path: str, schema: 'Dict[str, List[str]]') -> None:
+    """
+    This function writes a schema to a JSON file, so that it can be
+    reused for other PipelineML files with the same schema.
+    """
+    with open(schema_path, 'w', encoding='utf-8') as schema_file:
+        json.dump(schema, schema_file, indent=2)
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+This module defines the writers of the formats other than GeoPackage
+(the 'LayerFileWriter' class and its subclasses), and the 'FORMATS'
+dictionary of every writer.  Each writer has the interface of the
+'GeoPackageWriter' class, so the converter (and the writer thread) can
+feed any of them the features found by the reader.
+"""
+
+
+import os
+from os import path
+from osgeo import gdal
+from osgeo import ogr
+from .bulk import BulkGeoPackageWriter
+from .writer import GeoPackageWriter
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'LayerFileWriter' class
+# (which extends the 'GeoPackageWriter' class).
+class LayerFileWriter(GeoPackageWriter):
+    """
+    This class writes each layer to a file of its own, in a directory, in
+    a format that GDAL writes in a single pass (e.g., FlatGeobuf).  Such
+    formats have no transactions (so features are never rolled back), and
+    every field of a layer must be created before its first feature is
+    added, so the converter determines the schema in advance.  SQLite
+    pragmas do not apply, and nothing is built in memory.
+    """
+
+    # These are the name of the format, the name of its GDAL driver and
+    # the extension of the name of each layer's file.  (The output is a
+    # directory, and the schema must be known in advance.)
+    format_name = None
+    driver_name = None
+    layer_extension = None
+    extension = ''
+    needs_schema = True
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '__init__' method (i.e., the constructor), which
+    # is called when a new object of this class is instantiated.
+    def __init__(self, gpkg_path: str, feedback: 'QgsProcessingFeedback',
+          batch_size: int = 10000, batch_bytes: float = 0,
+          spatial_index: bool = True, index_fields: 'Iterable[str]' = (),
+          pragmas: 'Dict[str, str]' = None, in_memory: bool = False,
+          types: 'TypeRegistry' = None) -> None:
+        """
+        This method creates the directory at 'gpkg_path' (if it does not
+        exist yet).  See 'GeoPackageWriter' for the other arguments.
+        """
+
+        # This dictionary holds the dataset (i.e., the file) of each layer,
+        # and this set holds the names of the layers that have features.
+        self._datasets = {}
+        self._started = set()
+
+        super().__init__(gpkg_path, feedback, batch_size, batch_bytes,
+                         spatial_index, index_fields, pragmas, in_memory,
+                         types)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the 'layer_path' method (a class method).
+    @classmethod
+    def layer_path(cls, gpkg_path: str, name: str) -> str:
+        """
+        This method returns the path of the named layer's file.
+        """
+        return path.join(gpkg_path, name + cls.layer_extension)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the '_open' method, which is called (once) by the constructor.
+    def _open(self, gpkg_path: str) -> None:
+        """
+        This method creates the directory.  (The file of
+        each layer is created along with the layer.)
+        """
+        if gdal.GetDriverByName(self.driver_name) is None:
+            raise IOError('GDAL cannot write ' + self.format_name +
+                          ' files (it has no ' + self.driver_name +
+                          ' driver)')
+        os.makedirs(gpkg_path, exist_ok=True)
+        return None
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_layer_options' method.
+    def _layer_options(self) -> 'List[str]':
+        """
+        This method returns the options with which layers are created.
+        """
+        return []
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the '_make_layer' method, which is called by '_create_layer'.
+    def _make_layer(self, name: str) -> 'ogr.Layer':
+        """
+        This method creates the file of a layer (replacing any file
+        already there), and returns the layer.
+        """
+        layer_path = self.layer_path(self.gpkg_path, name)
+        driver = gdal.GetDriverByName(self.driver_name)
+        if path.exists(layer_path):
+            driver.Delete(layer_path)
+        dataset = driver.Create(layer_path, 0, 0, 0, gdal.GDT_Unknown)
+        self._datasets[name] = dataset
+        return dataset.CreateLayer(name, self.srs, ogr.wkbUnknown,
+                                   self._layer_options())
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the '_create_field' method.
+    def _create_field(self, layer_name: str,
+          name: str) -> 'Tuple[int, Callable, Callable]':
+        """
+        This method creates a field in a layer that has no features yet
+        (see 'GeoPackageWriter'), and raises an error otherwise.
+        """
+        if layer_name in self._started:
+            raise ValueError(
+              'The ' + name + ' field of the ' + layer_name + ' layer was '
+              'found after features of that layer were written, which ' +
+              self.format_name + ' does not allow (the schema must list '
+              'every field)')
+        return super()._create_field(layer_name, name)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the 'add_feature' method.
+    def add_feature(self, layout: 'Layout', values: 'Tuple',
+          geometry: bytes, position: int = 0) -> None:
+        """
+        This method adds a feature to the layer of the given layout
+        (see 'GeoPackageWriter').
+        """
+        feature = self._fill(layout, values, geometry)
+        self.layers[layout.name].CreateFeature(feature)
+        self._started.add(layout.name)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the 'create_indexes' method, which is
+    # called once every feature has been written.
+    def create_indexes(self) -> None:
+        """
+        This method reports that fields cannot be indexed.  (A spatial
+        index, if the format has one, is written along with each file; see
+        '_layer_options'.)
+        """
+        if self.index_fields:
+            self.feedback.pushInfo(self.format_name + ' files have no '
+                                   'field indexes')
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the 'close' method.
+    def close(self) -> None:
+        """
+        This method closes the file of each layer, which
+        completes it (e.g., by writing its spatial index).
+        """
+        self.layers.clear()
+        self._feature_defns.clear()
+        self._datasets.clear()
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'FlatGeobufWriter' class
+# (which extends the 'LayerFileWriter' class).
+class FlatGeobufWriter(LayerFileWriter):
+    """
+    This class writes each layer to a FlatGeobuf file.
+    """
+    format_name = 'FlatGeobuf'
+    driver_name = 'FlatGeobuf'
+    layer_extension = '.fgb'
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the '_layer_options' method.
+    def _layer_options(self) -> 'List[str]':
+        """
+        This method returns the options with which layers are created,
+        which determine whether each file has a spatial index.
+        """
+        return ['SPATIAL_INDEX=' + ('YES' if self.spatial_index else 'NO')]
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'GeoParquetWriter' class
+# (which extends the 'LayerFileWriter' class).
+class GeoParquetWriter(LayerFileWriter):
+    """
+    This class writes each layer to a GeoParquet file (which requires
+    GDAL to have been built with its Parquet driver).
+    """
+    format_name = 'GeoParquet'
+    driver_name = 'Parquet'
+    layer_extension = '.parquet'
+
+
+# This dictionary maps the name of each output format to its writer class.
+FORMATS = {
+  'gpkg': GeoPackageWriter,
+  'gpkg-bulk': BulkGeoPackageWriter,
+  'flatgeobuf': FlatGeobufWriter,
+  'geoparquet': GeoParquetWriter}
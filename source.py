@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+This module defines the 'PipelineMLSource' class, which reads PipelineML
+from a file, from a compressed file (gzip or ZIP) without decompressing
+it to disk, or from standard input.
+"""
+
+
+import gzip
+import os
+import sys
+import zipfile
+from os import path
+
+
+# This is the name that stands for standard input.
+STDIN = '-'
+
+# These are the file name extensions of PipelineML files, and of the
+# compressed files that may contain them.
+EXTENSIONS = ('.pml', '.xml', '.pml.gz', '.xml.gz', '.zip')
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'base_name' function.
+def base_name(pml_path: str) -> str:
+    """
+    This function returns the name of a PipelineML file without its
+    directory and extensions (e.g., 'network' for 'data/network.pml.gz').
+    """
+    name = path.basename(pml_path)
+    if name.lower().endswith('.gz'):
+        name = name[:-3]
+    return path.splitext(name)[0]
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_open_member' function.
+def _open_member(archive: zipfile.ZipFile) -> 'BinaryIO':
+    """
+    This function opens the PipelineML file in a ZIP archive (i.e., the
+    first file with a PipelineML extension, or else the only file).
+    """
+    names = [name for name in archive.namelist() if not name.endswith('/')]
+    for name in names:
+        if name.lower().endswith(EXTENSIONS):
+            return archive.open(name)
+    if len(names) == 1:
+        return archive.open(names[0])
+    raise ValueError('No PipelineML file found in ' + archive.filename)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'PipelineMLSource' class.
+class PipelineMLSource:
+    """
+    This class provides the content of a PipelineML file as a binary
+    stream, decompressing it as it is read if necessary, and keeps track
+    of how much of the underlying file has been read (for progress).
+    """
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '__init__' method (i.e., the constructor), which
+    # is called when a new object of this class is instantiated.
+    def __init__(self, pml_path: str) -> None:
+        """
+        This method opens the PipelineML file at 'pml_path' (which is
+        decompressed if it ends with '.gz' or '.zip'), or standard input
+        if 'pml_path' is '-'.
+        """
+        self.path = pml_path
+        self._archive = None
+        self._count = 0
+
+        # This is the size of the underlying file in
+        # bytes (or None if it is unknown, for a pipe).
+        self.size = None
+
+        if pml_path == STDIN:
+            self._raw = sys.stdin.buffer
+            self.file = self._raw
+            return
+        self._raw = open(pml_path, 'rb')
+        self.size = os.fstat(self._raw.fileno()).st_size
+        name = pml_path.lower()
+        try:
+            if name.endswith('.gz'):
+                self.file = gzip.GzipFile(fileobj=self._raw, mode='rb')
+            elif name.endswith('.zip'):
+                self._archive = zipfile.ZipFile(self._raw)
+                self.file = _open_member(self._archive)
+            else:
+                self.file = self._raw
+        except BaseException:
+            self.close()
+            raise
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '__enter__' and '__exit__' methods, so that
+    # a source can be used in a 'with' statement.
+    def __enter__(self) -> 'PipelineMLSource':
+        """
+        This method returns the source itself.
+        """
+        return self
+
+    def __exit__(self, *args: 'Any') -> None:
+        """
+        This method closes the source.
+        """
+        self.close()
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'is_plain' property.
+    @property
+    def is_plain(self) -> bool:
+        """
+        This property is whether the source is an uncompressed file (which
+        can be mapped into memory and split, e.g., for parallel parsing).
+        """
+        return self.file is self._raw and self.path != STDIN
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'position' property.
+    @property
+    def position(self) -> int:
+        """
+        This property is the number of bytes of the
+        underlying file read so far (compare with 'size').
+        """
+        if self.size is None:
+            return self._count
+        return self._raw.tell()
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'read' method.
+    def read(self, size: int = -1) -> bytes:
+        """
+        This method reads (up to) 'size' bytes of PipelineML.
+        """
+        data = self.file.read(size)
+        self._count += len(data)
+        return data
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'rewind' method, which is used to read
+    # the PipelineML more than once (e.g., to scan it first).
+    def rewind(self) -> bool:
+        """
+        This method returns to the start of the PipelineML, and returns
+        whether that was possible (it is not for a pipe).
+        """
+        if not self.file.seekable():
+            return False
+        self.file.seek(0)
+        self._count = 0
+        return True
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'close' method.
+    def close(self) -> None:
+        """
+        This method closes the source (but not standard input).
+        """
+        if self.path == STDIN:
+            return
+        if hasattr(self, 'file') and self.file is not self._raw:
+            self.file.close()
+        if self._archive is not None:
+            self._archive.close()
+        self._raw.close()
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+This module defines the 'ConversionTask' class, which converts a
+PipelineML file in the background (as a QGIS task), adding the layers to
+the project as soon as their first features are committed.
+"""
+
+
+from os import path
+from time import monotonic
+from qgis.core import (
+  Qgis, QgsApplication, QgsMessageLog, QgsProject, QgsTask,
+  QgsVectorLayer)
+from qgis.PyQt.QtCore import pyqtSignal, pyqtSlot
+from .converter import PipelineMLConverter
+from .sinks import FORMATS
+
+
+# This is the minimum number of seconds between refreshes of the
+# layers shown while the conversion is still in progress.
+REFRESH_SECONDS = 5
+
+# This is the number of milliseconds for which a commit waits for QGIS
+# to finish reading the GeoPackage (unless the pragmas given say
+# otherwise), rather than failing at once.
+BUSY_MILLISECONDS = 60000
+
+# This set holds the tasks that are running, so that they are not
+# garbage collected while the task manager still needs them.
+_TASKS = set()
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'ConversionTask' class
+# (which extends the 'QgsTask' class).
+class ConversionTask(QgsTask):
+    """
+    This class runs a conversion as a QGIS task, so that QGIS (and the
+    processing dialog) remain usable while it proceeds.  The task serves
+    as the converter's feedback object (reporting its progress and
+    messages, and whether it has been canceled).  The layers of a
+    GeoPackage written directly to disk can be opened as soon as a batch
+    of their features has been committed, so each is added to the project
+    then, and the layers shown are refreshed (every 'REFRESH_SECONDS', at
+    most) as further batches are committed; other outputs are only added
+    once the conversion is complete.
+    """
+
+    # This signal is emitted (in the task's thread) after each batch
+    # is committed, with the number of features in each layer so far.
+    committed = pyqtSignal(object)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '__init__' method (i.e., the constructor), which
+    # is called when a new object of this class is instantiated.
+    def __init__(self, pml_path: str, gpkg_path: str,
+          options: 'Dict[str, Any]', project: QgsProject = None,
+          load_layers: 'Iterable[str]' = None) -> None:
+        """
+        This method creates the converter (with the given 'options', as
+        for 'PipelineMLConverter'), which raises an exception at once if
+        they are not valid.  The layers are added to 'project' (if given),
+        or only those named in 'load_layers' (if given).
+        """
+        super().__init__('Converting ' + path.basename(pml_path),
+                         QgsTask.CanCancel)
+        self.pml_path = pml_path
+        self.gpkg_path = gpkg_path
+        self.project = project
+        self.load_layers = None if not load_layers else set(load_layers)
+        self.layer_names = []
+        self.exception = None
+
+        # The layers of a GeoPackage can be shown while it is written,
+        # unless it is built in memory (or the layers are not shown).
+        self.converter = PipelineMLConverter(self, **options)
+        if (project is not None and not self.converter.in_memory
+              and FORMATS[self.converter.format].extension == '.gpkg'):
+            self.converter.handle_commit = self.committed.emit
+            self.converter.pragmas.setdefault('busy_timeout',
+                                              str(BUSY_MILLISECONDS))
+
+        # The layers are added (and refreshed) by the main thread, where
+        # the task must live for the signal to be delivered there (as the
+        # task may have been created by the thread of a processing
+        # algorithm).
+        self._layer_ids = {}
+        self._refreshed = monotonic()
+        self._finished = False
+        self.moveToThread(QgsApplication.instance().thread())
+        self.committed.connect(self._show_layers)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'start' method.
+    def start(self) -> None:
+        """
+        This method adds the task to the application's task manager,
+        which runs it in the background.
+        """
+        _TASKS.add(self)
+        QgsApplication.taskManager().addTask(self)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the 'run' method, which is called in a background thread.
+    def run(self) -> bool:
+        """
+        This method performs the conversion, and returns whether it
+        completed (rather than failing or being canceled).
+        """
+        try:
+            self.layer_names = self.converter.convert(self.pml_path,
+                                                      self.gpkg_path)
+        except Exception as exception:
+            self.exception = exception
+            return False
+        return not self.converter.canceled
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the 'finished' method, which is called in the main thread
+    # once the task is complete (or has failed or been canceled).
+    def finished(self, result: bool) -> None:
+        """
+        This method adds the layers that are not yet shown to the project
+        (along with those partly converted, if the task was canceled),
+        refreshes those that are, and reports the outcome.
+        """
+        self._finished = True
+        _TASKS.discard(self)
+        if self.exception is None:
+            self._add_layers(self.layer_names)
+            self._refresh_layers()
+        if result:
+            self.pushInfo('Converted ' + self.pml_path + ' to ' +
+                          self.gpkg_path)
+        elif self.exception is not None:
+            self.reportError(str(self.exception), True)
+        else:
+            self.pushInfo('Conversion of ' + self.pml_path + ' canceled')
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_show_layers' method, which is called (in the main
+    # thread) after each batch is committed.
+    @pyqtSlot(object)
+    def _show_layers(self, counts: 'Dict[str, int]') -> None:
+        """
+        This method adds the layers that now have features to the
+        project, and refreshes those already shown (if they have not
+        been refreshed recently).
+        """
+        if self._finished:
+            return
+        self._add_layers(name for name, count in counts.items() if count)
+        if monotonic() - self._refreshed >= REFRESH_SECONDS:
+            self._refresh_layers()
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_add_layers' method.
+    def _add_layers(self, names: 'Iterable[str]') -> None:
+        """
+        This method adds the named layers to the project (except
+        those already added, and those not to be loaded).
+        """
+        if self.project is None:
+            return
+        for name in names:
+            if name in self._layer_ids:
+                continue
+            if self.load_layers is not None and name not in self.load_layers:
+                continue
+            layer = QgsVectorLayer(
+              self.converter.layer_path(self.gpkg_path, name), name, 'ogr')
+            if not layer.isValid():
+                continue
+            self.project.addMapLayer(layer)
+            self._layer_ids[name] = layer.id()
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_refresh_layers' method.
+    def _refresh_layers(self) -> None:
+        """
+        This method reloads the features of the layers that have been
+        added to the project (and that are still there), and redraws them.
+        Once the conversion is complete, their extents are also updated.
+        (While the layers have no spatial index, that would mean reading
+        every feature, so their extents are left until then.)
+        """
+        self._refreshed = monotonic()
+        for layer_id in self._layer_ids.values():
+            layer = self.project.mapLayer(layer_id)
+            if layer is None:
+                continue
+            layer.reload()
+            if self._finished:
+                layer.updateExtents()
+            layer.triggerRepaint()
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'pushInfo' method.
+    def pushInfo(self, info: str) -> None:
+        """
+        This method logs an informational message.
+        """
+        QgsMessageLog.logMessage(info, 'PipelineML', Qgis.Info)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'reportError' method.
+    def reportError(self, error: str, fatalError: bool = False) -> None:
+        """
+        This method logs an error message.
+        """
+        QgsMessageLog.logMessage(error, 'PipelineML', Qgis.Critical)
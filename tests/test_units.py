@@ -0,0 +1,710 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+These tests cover the parts of the converter that do not need GDAL or
+QGIS: parsing coordinates and building WKB geometries, the PipelineML
+reader, splitting a file for parallel parsing, and the conversion cache.
+(Field types and SQLite profiles are tested too, when GDAL is installed,
+since their modules use its constants.)  Run them from the plugin
+directory with 'python3 -m unittest discover tests' (or with pytest).
+"""
+
+
+import io
+import os
+import struct
+import sys
+import tempfile
+import unittest
+from os import path
+from xml.parsers import expat
+
+# Import the plugin directory as a package (see 'pml2gpkg.py').
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+import pml2gpkg  # noqa: E402,F401
+from pml_geopackager import geometry, parallel  # noqa: E402
+from pml_geopackager.cache import ConversionCache  # noqa: E402
+from pml_geopackager.feedback import ConsoleFeedback  # noqa: E402
+from pml_geopackager.reader import PipelineMLReader  # noqa: E402
+
+try:
+    from osgeo import ogr
+    from pml_geopackager import fieldtypes, profiles
+except ImportError:
+    ogr = fieldtypes = profiles = None
+
+
+# These are the start and end of the test documents, which wrap
+# the given components (and declare the GML namespace).
+_PROLOG = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<pipelineML xmlns="http://www.pipelineml.org/ns"'
+           ' xmlns:gml="http://www.opengis.net/gml/3.2">\n'
+           '  <defaultCRS>urn:ogc:def:crs:EPSG::4326 (EPSG:4326)'
+           '</defaultCRS>\n')
+_EPILOG = '</pipelineML>\n'
+
+# This is a document with components of two types, and
+# a Pipe component that has a field the first one lacks.
+_SAMPLE = (_PROLOG +
+           '  <component><Pipe><length>12.5</length>'
+           '<location><gml:LineString><gml:posList>1 2 3 4 5 6'
+           '</gml:posList></gml:LineString></location></Pipe></component>\n'
+           '  <component><Valve><valveActuationTime>3</valveActuationTime>'
+           '<location><gml:Point><gml:pos>7 8</gml:pos></gml:Point>'
+           '</location></Valve></component>\n'
+           '  <component><Pipe><coatingLayerNumber>4</coatingLayerNumber>'
+           '<location><gml:LineString><gml:posList>1 2 3 4</gml:posList>'
+           '</gml:LineString></location></Pipe></component>\n' +
+           _EPILOG).encode('utf-8')
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_document' function.
+def _document(location: str) -> bytes:
+    """
+    This function returns a document with a single Pipe component,
+    whose location is the given GML geometry.
+    """
+    return (_PROLOG + '<component><Pipe><location>' + location +
+            '</location></Pipe></component>' + _EPILOG).encode('utf-8')
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_read' function.
+def _read(data: bytes, **options: 'Any') -> 'Tuple[List[Tuple], str]':
+    """
+    This function parses a document, and returns the features found (as
+    layer name, field values and geometry) and the errors reported.
+    Any keyword arguments are passed on to the reader.
+    """
+    features = []
+    stream = io.StringIO()
+
+    def handle_feature(layout: 'Layout', values: 'Tuple',
+          geometry: bytes) -> None:
+        features.append((layout.name, dict(zip(layout.fields, values)),
+                         geometry))
+
+    reader = PipelineMLReader(lambda name: None, handle_feature,
+                              ConsoleFeedback(stream, quiet=True),
+                              **options)
+    reader.parse(data)
+    return features, stream.getvalue()
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_wkb' function.
+def _wkb(location: str) -> bytes:
+    """
+    This function returns the WKB geometry built from a GML geometry.
+    """
+    features, errors = _read(_document(location))
+    return features[0][2]
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_points' function.
+def _points(wkb_type: int, *coordinates: float) -> bytes:
+    """
+    This function returns the expected WKB of a geometry of the given
+    type made of a sequence of points (i.e., a line string or circular
+    string, in two dimensions unless 'wkb_type' says otherwise).
+    """
+    dimension = 3 if wkb_type > 1000 else 2
+    return struct.pack('<BII' + str(len(coordinates)) + 'd', 1, wkb_type,
+                       len(coordinates) // dimension, *coordinates)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_collection' function.
+def _collection(wkb_type: int, *members: bytes) -> bytes:
+    """
+    This function returns the expected WKB of a collection (or of a
+    polygon, given the WKB of its rings without their headers).
+    """
+    return struct.pack('<BII', 1, wkb_type, len(members)) + b''.join(members)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'CoordinatesTest' class.
+class CoordinatesTest(unittest.TestCase):
+    """
+    This class tests the parsing of lists of coordinates.
+    """
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'test_numbers' method.
+    def test_numbers(self) -> None:
+        """
+        This method checks that numbers separated by any white space
+        (and in any notation) are parsed.
+        """
+        self.assertEqual(
+          list(geometry.parse_coordinates(' 1 -2.5\n3e2\t.5 ')),
+          [1, -2.5, 300, 0.5])
+        self.assertEqual(list(geometry.parse_coordinates('')), [])
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'test_malformed' method.
+    def test_malformed(self) -> None:
+        """
+        This method checks that text that is not a list of numbers
+        is rejected, wherever the error is.
+        """
+        for text in ('x 1', '1 2 x', '1,2 3,4', '1 2x'):
+            with self.assertRaises(ValueError):
+                geometry.parse_coordinates(text)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'test_tuples' method.
+    def test_tuples(self) -> None:
+        """
+        This method checks that tuples (as in 'gml:coordinates') are
+        parsed, along with their dimension.
+        """
+        coordinates, dimension = geometry.parse_tuples('1,2,3 4,5,6')
+        self.assertEqual((list(coordinates), dimension),
+                         ([1, 2, 3, 4, 5, 6], 3))
+        coordinates, dimension = geometry.parse_tuples(
+          '1;5 2;5', cs=';', decimal='.')
+        self.assertEqual((list(coordinates), dimension), ([1, 5, 2, 5], 2))
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'GeometryTest' class.
+class GeometryTest(unittest.TestCase):
+    """
+    This class tests the building of WKB geometries from GML ones.
+    """
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'test_point' method.
+    def test_point(self) -> None:
+        """
+        This method checks the WKB of points.
+        """
+        self.assertEqual(
+          _wkb('<gml:Point><gml:pos>1 2</gml:pos></gml:Point>'),
+          struct.pack('<BI2d', 1, geometry.WKB_POINT, 1, 2))
+        self.assertEqual(
+          _wkb('<gml:Point srsDimension="3"><gml:pos>1 2 3</gml:pos>'
+               '</gml:Point>'),
+          struct.pack('<BI3d', 1, 1000 + geometry.WKB_POINT, 1, 2, 3))
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'test_line_string' method.
+    def test_line_string(self) -> None:
+        """
+        This method checks the WKB of line strings, in two and three
+        dimensions, and given as 'gml:pos' elements or as tuples.
+        """
+        line = _points(geometry.WKB_LINE_STRING, 0, 0, 1, 1)
+        self.assertEqual(_wkb('<gml:LineString><gml:posList>0 0 1 1'
+                              '</gml:posList></gml:LineString>'), line)
+        self.assertEqual(_wkb('<gml:LineString><gml:pos>0 0</gml:pos>'
+                              '<gml:pos>1 1</gml:pos></gml:LineString>'),
+                         line)
+        self.assertEqual(_wkb('<gml:LineString><gml:coordinates>0,0 1,1'
+                              '</gml:coordinates></gml:LineString>'), line)
+        self.assertEqual(
+          _wkb('<gml:LineString srsDimension="3"><gml:posList>0 0 1 1 1 2'
+               '</gml:posList></gml:LineString>'),
+          _points(1000 + geometry.WKB_LINE_STRING, 0, 0, 1, 1, 1, 2))
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'test_polygon' method.
+    def test_polygon(self) -> None:
+        """
+        This method checks the WKB of a polygon with a hole.
+        """
+        rings = (struct.pack('<I8d', 4, 0, 0, 4, 0, 4, 4, 0, 0),
+                 struct.pack('<I8d', 4, 1, 1, 2, 1, 2, 2, 1, 1))
+        self.assertEqual(
+          _wkb('<gml:Polygon><gml:exterior><gml:LinearRing><gml:posList>'
+               '0 0 4 0 4 4 0 0</gml:posList></gml:LinearRing>'
+               '</gml:exterior><gml:interior><gml:LinearRing><gml:posList>'
+               '1 1 2 1 2 2 1 1</gml:posList></gml:LinearRing>'
+               '</gml:interior></gml:Polygon>'),
+          _collection(geometry.WKB_POLYGON, *rings))
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'test_collections' method.
+    def test_collections(self) -> None:
+        """
+        This method checks the WKB of multi-points, multi-curves
+        and multi-surfaces.
+        """
+        self.assertEqual(
+          _wkb('<gml:MultiPoint><gml:pointMember><gml:Point><gml:pos>1 2'
+               '</gml:pos></gml:Point></gml:pointMember><gml:pointMember>'
+               '<gml:Point><gml:pos>3 4</gml:pos></gml:Point>'
+               '</gml:pointMember></gml:MultiPoint>'),
+          _collection(geometry.WKB_MULTI_POINT,
+                      struct.pack('<BI2d', 1, geometry.WKB_POINT, 1, 2),
+                      struct.pack('<BI2d', 1, geometry.WKB_POINT, 3, 4)))
+        self.assertEqual(
+          _wkb('<gml:MultiCurve><gml:curveMember><gml:LineString>'
+               '<gml:posList>0 0 1 1</gml:posList></gml:LineString>'
+               '</gml:curveMember></gml:MultiCurve>'),
+          _collection(geometry.WKB_MULTI_LINE_STRING,
+                      _points(geometry.WKB_LINE_STRING, 0, 0, 1, 1)))
+        self.assertEqual(
+          _wkb('<gml:MultiSurface><gml:surfaceMember><gml:Polygon>'
+               '<gml:exterior><gml:LinearRing><gml:posList>0 0 1 0 1 1 0 0'
+               '</gml:posList></gml:LinearRing></gml:exterior>'
+               '</gml:Polygon></gml:surfaceMember></gml:MultiSurface>'),
+          _collection(geometry.WKB_MULTI_POLYGON, _collection(
+            geometry.WKB_POLYGON,
+            struct.pack('<I8d', 4, 0, 0, 1, 0, 1, 1, 0, 0))))
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'test_curves' method.
+    def test_curves(self) -> None:
+        """
+        This method checks the WKB of curves made of linear segments and
+        arcs, and of composite curves (whose members are joined).
+        """
+        self.assertEqual(
+          _wkb('<gml:Curve><gml:segments><gml:LineStringSegment>'
+               '<gml:posList>0 0 1 1</gml:posList></gml:LineStringSegment>'
+               '</gml:segments></gml:Curve>'),
+          _points(geometry.WKB_LINE_STRING, 0, 0, 1, 1))
+        self.assertEqual(
+          _wkb('<gml:Curve><gml:segments><gml:Arc><gml:posList>0 0 1 1 2 0'
+               '</gml:posList></gml:Arc></gml:segments></gml:Curve>'),
+          _collection(geometry.WKB_COMPOUND_CURVE,
+                      _points(geometry.WKB_CIRCULAR_STRING,
+                              0, 0, 1, 1, 2, 0)))
+        self.assertEqual(
+          _wkb('<gml:CompositeCurve><gml:curveMember><gml:LineString>'
+               '<gml:posList>0 0 1 1</gml:posList></gml:LineString>'
+               '</gml:curveMember><gml:curveMember><gml:LineString>'
+               '<gml:posList>1 1 2 0</gml:posList></gml:LineString>'
+               '</gml:curveMember></gml:CompositeCurve>'),
+          _points(geometry.WKB_LINE_STRING, 0, 0, 1, 1, 2, 0))
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'test_invalid' method.
+    def test_invalid(self) -> None:
+        """
+        This method checks that geometries with malformed or missing
+        coordinates, or of unknown types, are dropped and reported.
+        """
+        for location in (
+              '<gml:LineString><gml:posList>0 0 1</gml:posList>'
+              '</gml:LineString>',
+              '<gml:LineString><gml:posList>1 2 x 4</gml:posList>'
+              '</gml:LineString>',
+              '<gml:CompositeCurve><gml:curveMember/></gml:CompositeCurve>',
+              '<gml:Polyhedron/>'):
+            features, errors = _read(_document(location))
+            self.assertEqual(len(features), 1)
+            self.assertIsNone(features[0][2])
+            self.assertIn('Error: ', errors)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'test_envelope' method.
+    def test_envelope(self) -> None:
+        """
+        This method checks the envelopes of WKB geometries.
+        """
+        self.assertEqual(geometry.wkb_envelope(
+          struct.pack('<BI2d', 1, geometry.WKB_POINT, 1, 2)), (1, 2, 1, 2))
+        self.assertEqual(geometry.wkb_envelope(_collection(
+          geometry.WKB_MULTI_LINE_STRING,
+          _points(geometry.WKB_LINE_STRING, 0, 5, 1, -1),
+          _points(1000 + geometry.WKB_LINE_STRING,
+                  *range(300)))), (0, -1, 297, 298))
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'ReaderTest' class.
+class ReaderTest(unittest.TestCase):
+    """
+    This class tests the PipelineML reader.
+    """
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'test_features' method.
+    def test_features(self) -> None:
+        """
+        This method checks the features read from a document, and the
+        default CRS.
+        """
+        crs = []
+        features = []
+        reader = PipelineMLReader(
+          crs.append, lambda layout, values, geometry: features.append(
+            (layout.name, values)), ConsoleFeedback(quiet=True))
+        reader.parse(_SAMPLE)
+        self.assertEqual(crs, ['EPSG:4326'])
+        self.assertEqual(features, [('Pipe', ('12.5',)), ('Valve', ('3',)),
+                                    ('Pipe', (None, '4'))])
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'test_layers' method.
+    def test_layers(self) -> None:
+        """
+        This method checks that the features of excluded layers are
+        skipped.
+        """
+        features, errors = _read(_SAMPLE, exclude_layers=['Pipe'])
+        self.assertEqual([feature[0] for feature in features], ['Valve'])
+        features, errors = _read(_SAMPLE, layers=['Pipe'])
+        self.assertEqual([feature[0] for feature in features],
+                         ['Pipe', 'Pipe'])
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'test_limited_text' method.
+    def test_limited_text(self) -> None:
+        """
+        This method checks that coordinates parsed a few characters at a
+        time (as in low-memory mode), from a document fed to the parser
+        a few bytes at a time, give the same geometry.
+        """
+        data = _document(
+          '<gml:LineString><gml:posList>' +
+          ' '.join(str(number / 4) for number in range(1000)) +
+          '</gml:posList></gml:LineString>')
+        expected = _read(data)[0][0][2]
+        self.assertEqual(
+          expected, _points(geometry.WKB_LINE_STRING,
+                            *(number / 4 for number in range(1000))))
+        features = []
+        reader = PipelineMLReader(
+          lambda name: None, lambda layout, values, geometry:
+          features.append(geometry), ConsoleFeedback(quiet=True),
+          text_limit=16)
+        reader.parse_file(io.BytesIO(data), chunk_size=7)
+        self.assertEqual(features, [expected])
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'test_malformed' method.
+    def test_malformed(self) -> None:
+        """
+        This method checks that malformed XML is an error.
+        """
+        with self.assertRaises(expat.ExpatError):
+            _read(_SAMPLE.replace(b'</Valve>', b''))
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'SplitTest' class.
+class SplitTest(unittest.TestCase):
+    """
+    This class tests the splitting of files for parallel parsing.
+    """
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'setUp' method.
+    def setUp(self) -> None:
+        """
+        This method creates a temporary directory for the test files.
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_split' method.
+    def _split(self, data: bytes,
+          chunk_size: int) -> 'Tuple[Dict[str, Any], List, str]':
+        """
+        This method writes a file, and returns its header, its chunks
+        and its path.
+        """
+        pml_path = path.join(self.directory.name, 'test.pml')
+        with open(pml_path, 'wb') as pml_file:
+            pml_file.write(data)
+        with open(pml_path, 'rb') as pml_file:
+            header = parallel.scan_header(pml_file)
+            return header, parallel.split(pml_file, header, chunk_size), (
+              pml_path)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'test_header' method.
+    def test_header(self) -> None:
+        """
+        This method checks the header scanned from a document whose
+        elements have a namespace prefix.
+        """
+        data = _SAMPLE.replace(b'<component', b'<p:component').replace(
+          b'</component', b'</p:component').replace(
+          b'<pipelineML ', b'<pipelineML xmlns:p="urn:p" ')
+        header, chunks, pml_path = self._split(data, 1)
+        self.assertEqual(header['crs'], 'EPSG:4326')
+        self.assertEqual(header['component'], 'p:component')
+        self.assertEqual(header['start'], data.index(b'<p:component'))
+        self.assertEqual(header['epilog'], b'</pipelineML>')
+        self.assertEqual(len(chunks), 3)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'test_chunks' method.
+    def test_chunks(self) -> None:
+        """
+        This method checks that a document is split at component
+        start-tags (and not within comments or CDATA sections), and
+        that its chunks hold all of its features.
+        """
+        components = []
+        ids = []
+        for number in range(200):
+            ids.append(str(number))
+            components.append(
+              '<component><Valve><id>' + str(number) + '</id>'
+              '<location><gml:Point><gml:pos>' + str(number) + ' 0'
+              '</gml:pos></gml:Point></location></Valve></component>\n')
+            if number % 7 == 0:
+                components.append(
+                  '<!-- <component><Valve/></component> -->\n')
+            if number % 11 == 0:
+                ids.append('note')
+                components.append(
+                  '<component><Valve><id>note</id><description><![CDATA['
+                  '<component> <!-- ]]></description></Valve>'
+                  '</component>\n')
+        data = (_PROLOG + ''.join(components) + _EPILOG).encode('utf-8')
+        header, chunks, pml_path = self._split(data, 500)
+        self.assertGreater(len(chunks), 10)
+        self.assertEqual(chunks[0][0], header['start'])
+        self.assertEqual(chunks[-1][1], data.rindex(b'</pipelineML>'))
+        features = []
+        for (start, end), (next_start, next_end) in zip(
+              chunks, chunks[1:] + [(chunks[-1][1], None)]):
+            self.assertEqual(end, next_start)
+            self.assertTrue(data.startswith(b'<component>', start))
+            features.extend(parallel._read_chunk(
+              pml_path, start, end, header['prolog'], header['epilog']))
+        self.assertEqual([values[0] for layout, values, geometry
+                          in features], ids)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'test_unsplittable' method.
+    def test_unsplittable(self) -> None:
+        """
+        This method checks that documents without components, or in an
+        encoding that is not ASCII-compatible, are not split.
+        """
+        header, chunks, pml_path = self._split(
+          (_PROLOG + _EPILOG).encode('utf-8'), 1)
+        self.assertIsNone(header['start'])
+        self.assertEqual(chunks, [])
+        header, chunks, pml_path = self._split(
+          _SAMPLE.decode('utf-8').replace('UTF-8', 'UTF-16').encode(
+            'utf-16'), 1)
+        self.assertEqual(chunks, [])
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'CacheTest' class.
+class CacheTest(unittest.TestCase):
+    """
+    This class tests the keys and eviction of the conversion cache.
+    """
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'setUp' method.
+    def setUp(self) -> None:
+        """
+        This method creates a temporary directory for the cache
+        and the files cached.
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.cache = ConversionCache(path.join(self.directory, 'cache'),
+                                     megabytes=2.5 / 1024)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_write' method.
+    def _write(self, name: str, data: bytes) -> str:
+        """
+        This method writes a file, and returns its path.
+        """
+        file_path = path.join(self.directory, name)
+        with open(file_path, 'wb') as written_file:
+            written_file.write(data)
+        return file_path
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'test_key' method.
+    def test_key(self) -> None:
+        """
+        This method checks that keys depend on the content of the file
+        (not its path) and on the options.
+        """
+        key = self.cache.key(self._write('a.pml', _SAMPLE), {'jobs': 1})
+        self.assertEqual(
+          self.cache.key(self._write('b.pml', _SAMPLE), {'jobs': 1}), key)
+        self.assertNotEqual(
+          self.cache.key(path.join(self.directory, 'a.pml'), {'jobs': 2}),
+          key)
+        self.assertNotEqual(
+          self.cache.key(self._write('c.pml', _SAMPLE + b' '), {'jobs': 1}),
+          key)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'test_fetch' method.
+    def test_fetch(self) -> None:
+        """
+        This method checks that an entry stored can be fetched, and
+        that a missing one cannot.
+        """
+        gpkg_path = self._write('a.gpkg', b'a' * 1024)
+        copy_path = path.join(self.directory, 'copy.gpkg')
+        self.assertIsNone(self.cache.fetch('a', copy_path))
+        self.cache.store('a', gpkg_path, {'layers': ['Pipe']})
+        self.assertEqual(self.cache.fetch('a', copy_path),
+                         {'layers': ['Pipe']})
+        with open(copy_path, 'rb') as copy_file:
+            self.assertEqual(copy_file.read(), b'a' * 1024)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'test_eviction' method.
+    def test_eviction(self) -> None:
+        """
+        This method checks that the least recently used entries are
+        evicted to keep the cache within its size, and that files larger
+        than the cache are not stored.
+        """
+        copy_path = path.join(self.directory, 'copy.gpkg')
+        for age, name in enumerate('abc'):
+            self.cache.store(name, self._write(name + '.gpkg', b'x' * 1024),
+                             {})
+            entry_path = path.join(self.cache.directory, name + '.gpkg')
+            if path.exists(entry_path):
+                os.utime(entry_path, (age, age))
+            if name == 'b':
+                self.assertIsNotNone(self.cache.fetch('a', copy_path))
+        self.assertIsNotNone(self.cache.fetch('a', copy_path))
+        self.assertIsNone(self.cache.fetch('b', copy_path))
+        self.assertIsNotNone(self.cache.fetch('c', copy_path))
+        self.cache.store('d', self._write('d.gpkg', b'x' * 4096), {})
+        self.assertIsNone(self.cache.fetch('d', copy_path))
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'TypesTest' class.
+@unittest.skipIf(ogr is None, 'GDAL is not installed')
+class TypesTest(unittest.TestCase):
+    """
+    This class tests the registry of field types, and the reading of
+    types from XML schemas.
+    """
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'test_registry' method.
+    def test_registry(self) -> None:
+        """
+        This method checks that types are looked up by layer and field
+        name, then by field name, and that unknown types are rejected.
+        """
+        registry = fieldtypes.TypeRegistry(
+          {'length': 'Real', 'Valve.length': 'Integer'})
+        self.assertEqual(registry.field_type('Pipe', 'length'), ogr.OFTReal)
+        self.assertEqual(registry.field_type('Valve', 'length'),
+                         ogr.OFTInteger)
+        self.assertEqual(registry.field_type('Pipe', 'id'), ogr.OFTString)
+        extended = registry.extended({'length': 'String', 'Pipe.id': 'Date',
+                                      'Tee.length': 'String'})
+        self.assertEqual(extended.field_type('Pipe', 'id'), ogr.OFTDate)
+        self.assertEqual(extended.field_type('Tee', 'length'), ogr.OFTReal)
+        self.assertEqual(registry.field_type('Pipe', 'id'), ogr.OFTString)
+        with self.assertRaises(ValueError):
+            fieldtypes.TypeRegistry({'length': 'Double'})
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'test_xsd' method.
+    def test_xsd(self) -> None:
+        """
+        This method checks the types read from an XML schema that
+        includes another, with derived and conflicting types.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            with open(path.join(directory, 'types.xsd'), 'w',
+                      encoding='utf-8') as xsd_file:
+                xsd_file.write(
+                  '<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema">'
+                  '<xs:simpleType name="CountType"><xs:restriction'
+                  ' base="xs:nonNegativeInteger"/></xs:simpleType>'
+                  '<xs:complexType name="LengthType"><xs:simpleContent>'
+                  '<xs:extension base="xs:double"/></xs:simpleContent>'
+                  '</xs:complexType></xs:schema>')
+            xsd_path = path.join(directory, 'pml.xsd')
+            with open(xsd_path, 'w', encoding='utf-8') as xsd_file:
+                xsd_file.write(
+                  '<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema">'
+                  '<xs:include schemaLocation="types.xsd"/>'
+                  '<xs:element name="count" type="CountType"/>'
+                  '<xs:element name="length" type="LengthType"/>'
+                  '<xs:element name="installed" type="xs:date"/>'
+                  '<xs:element name="size" type="xs:int"/>'
+                  '<xs:element name="size" type="xs:decimal"/>'
+                  '<xs:element name="note" type="xs:string"/>'
+                  '<xs:element name="code" type="xs:int"/>'
+                  '<xs:element name="code" type="xs:date"/>'
+                  '</xs:schema>')
+            self.assertEqual(
+              fieldtypes.parse_xsd(xsd_path),
+              {'count': 'Integer64', 'length': 'Real', 'installed': 'Date',
+               'size': 'Real'})
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'ProfilesTest' class.
+@unittest.skipIf(profiles is None, 'GDAL is not installed')
+class ProfilesTest(unittest.TestCase):
+    """
+    This class tests the SQLite profiles and pragmas.
+    """
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'test_profiles' method.
+    def test_profiles(self) -> None:
+        """
+        This method checks that pragmas given individually replace
+        those of a profile.
+        """
+        self.assertEqual(profiles.profile_pragmas(), {})
+        pragmas = profiles.profile_pragmas(
+          'fast', profiles.parse_pragmas('journal_mode=WAL, '
+                                         'cache_size=-65536'))
+        self.assertEqual(pragmas['journal_mode'], 'WAL')
+        self.assertEqual(pragmas['cache_size'], '-65536')
+        self.assertEqual(pragmas['synchronous'], 'OFF')
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'test_invalid' method.
+    def test_invalid(self) -> None:
+        """
+        This method checks that unknown profiles and pragmas, invalid
+        values and turning the journal off are rejected.
+        """
+        with self.assertRaises(ValueError):
+            profiles.parse_pragmas('synchronous')
+        for profile, overrides in (
+              ('fastest', {}), ('default', {'foreign_keys': 'ON'}),
+              ('default', {'synchronous': 'OFF; DROP TABLE x'}),
+              ('fast', {'journal_mode': 'OFF'}),
+              ('default', {'journal_mode': 'off'})):
+            with self.assertRaises(ValueError):
+                profiles.profile_pragmas(profile, overrides)
+
+
+if __name__ == '__main__':
+    unittest.main()
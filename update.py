@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+This module defines the 'GeoPackageUpdater' class, which brings an
+existing GeoPackage up to date with a new revision of a PipelineML file,
+writing only the features that have changed.
+"""
+
+
+import hashlib
+from os import path
+from osgeo import gdal
+from osgeo import ogr
+from .profiles import sqlite_pragmas
+from .writer import _SETTERS, GeoPackageWriter
+
+
+# This is the name of the field that holds the content hash of each
+# feature (so that unchanged features can be recognized).
+HASH_FIELD = 'pml_hash'
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'content_hash' function.
+def content_hash(layout: 'Layout', values: 'Tuple',
+      geometry: bytes) -> str:
+    """
+    This function returns a hash of the field values and geometry of a
+    feature, which does not depend on the order of the fields.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for field, value in sorted(zip(layout.fields, values)):
+        if value is not None:
+            digest.update((field + '\x1f' + value + '\x1e').encode('utf-8'))
+    if geometry is not None:
+        digest.update(geometry)
+    return digest.hexdigest()
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'GeoPackageUpdater' class
+# (which extends the 'GeoPackageWriter' class).
+class GeoPackageUpdater(GeoPackageWriter):
+    """
+    This class updates an existing GeoPackage (or creates a new one) so
+    that it holds the features written to it, and no others.  Features
+    are matched with those already present by the value of a key field;
+    a matching feature is only rewritten if its content hash differs, and
+    features that are not matched are deleted by 'remove_missing'.  The
+    whole update is made in a single transaction, committed only once
+    'remove_missing' has been called, so that an update that is canceled
+    (or fails) leaves the GeoPackage as it was, rather than mixing the old
+    and new revisions.
+    """
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '__init__' method (i.e., the constructor), which
+    # is called when a new object of this class is instantiated.
+    def __init__(self, gpkg_path: str, feedback: 'QgsProcessingFeedback',
+          batch_size: int = 10000, batch_bytes: float = 0,
+          key_field: str = 'id', spatial_index: bool = True,
+          index_fields: 'Iterable[str]' = (),
+          pragmas: 'Dict[str, str]' = None,
+          types: 'TypeRegistry' = None) -> None:
+        """
+        This method opens (or creates) the GeoPackage at 'gpkg_path', and
+        reads the key and content hash of every feature in it.  Features
+        are matched by the value of 'key_field'.  (See 'GeoPackageWriter'
+        for the other arguments; existing layers keep whatever spatial
+        index they have, the GeoPackage is never built in memory, and
+        features are not committed in batches.)
+        """
+        self.key_field = key_field
+
+        # This dictionary counts the features
+        # inserted, updated, left unchanged and deleted.
+        self.changes = {'inserted': 0, 'updated': 0,
+                        'unchanged': 0, 'deleted': 0}
+
+        # These dictionaries hold the index of the hash field of each
+        # layer, and the features of each layer that have not yet been
+        # matched (as a dictionary mapping each key to the FID and hash
+        # of its feature).  This list holds the FIDs (with their layer
+        # names) of features that cannot be matched at all (e.g.,
+        # because they have no key).
+        self._hash_indexes = {}
+        self._unmatched = {}
+        self._unmatchable = []
+
+        # This flag is set once the update is complete
+        # (and its transaction may be committed).
+        self._complete = False
+
+        super().__init__(gpkg_path, feedback, batch_size, batch_bytes,
+                         spatial_index, index_fields, pragmas, types=types)
+        self._begin(0)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the '_open' method, which is called (once) by the constructor.
+    def _open(self, gpkg_path: str) -> 'gdal.Dataset':
+        """
+        This method opens the GeoPackage for update (or creates
+        it, if it does not exist yet), and returns the dataset.
+        """
+        if not path.exists(gpkg_path):
+            return super()._open(gpkg_path)
+        self.feedback.pushInfo('Updating ' + gpkg_path)
+        with sqlite_pragmas(self.pragmas):
+            dataset = gdal.OpenEx(gpkg_path,
+                                  gdal.OF_VECTOR | gdal.OF_UPDATE)
+        if dataset is None:
+            raise IOError('Cannot open ' + gpkg_path + ' for update')
+        for i in range(dataset.GetLayerCount()):
+            self._load_layer(dataset.GetLayer(i))
+        return dataset
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_load_layer' method, which is called
+    # for each layer already in the GeoPackage.
+    def _load_layer(self, layer: 'ogr.Layer') -> None:
+        """
+        This method caches the schema of an existing layer (as if the
+        writer had created it), and reads the key and hash of each of
+        its features.
+        """
+        name = layer.GetName()
+        feature_defn = layer.GetLayerDefn()
+        self.layers[name] = layer
+        self._feature_defns[name] = feature_defn
+        field_setters = self._field_setters[name] = {}
+        for index in range(feature_defn.GetFieldCount()):
+            field_defn = feature_defn.GetFieldDefn(index)
+            setter, cast = _SETTERS.get(
+              field_defn.GetType(), (ogr.Feature.SetField, str))
+            field_setters[field_defn.GetName()] = (index, setter, cast)
+        if HASH_FIELD not in field_setters:
+            layer.CreateField(ogr.FieldDefn(HASH_FIELD, ogr.OFTString))
+        self._hash_indexes[name] = feature_defn.GetFieldIndex(HASH_FIELD)
+        field_setters.pop(HASH_FIELD, None)
+        self._schema_versions[name] = 0
+
+        # Read the key and hash of each feature, ignoring the other fields
+        # and the geometry (if the layer has no key field, none of its
+        # features can match).
+        key_index = feature_defn.GetFieldIndex(self.key_field)
+        hash_index = self._hash_indexes[name]
+        layer.SetIgnoredFields(
+          [field for field in field_setters if field != self.key_field]
+          + ['OGR_GEOMETRY', 'OGR_STYLE'])
+        unmatched = self._unmatched[name] = {}
+        layer.ResetReading()
+        for feature in layer:
+            key = feature.GetField(key_index) if key_index >= 0 else None
+            if key is None:
+                self._unmatchable.append((name, feature.GetFID()))
+                continue
+            key = str(key)
+            if key in unmatched:
+                # Only one feature can match each key, so any others are
+                # deleted (and inserted again if the key is repeated).
+                self._unmatchable.append((name, unmatched[key][0]))
+            unmatched[key] = (feature.GetFID(), feature.GetField(hash_index))
+        layer.SetIgnoredFields([])
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the '_create_layer' method.
+    def _create_layer(self, name: str) -> 'ogr.Layer':
+        """
+        This method creates a layer, with a field for content hashes.
+        """
+        layer = super()._create_layer(name)
+        layer.CreateField(ogr.FieldDefn(HASH_FIELD, ogr.OFTString))
+        self._hash_indexes[name] = (
+          self._feature_defns[name].GetFieldIndex(HASH_FIELD))
+        self._unmatched[name] = {}
+        return layer
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_key' method.
+    def _key(self, layer_name: str, value: str) -> 'Optional[str]':
+        """
+        This method returns the key of a feature (given the text of its
+        key field) as the keys of the features already present are read,
+        i.e., converted to the type of the key field and back to text (so
+        that, e.g., '7.50' matches a key of 7.5).
+        """
+        if value is None:
+            return None
+        setter = self._field_setters[layer_name].get(self.key_field)
+        if setter is None:
+            return value
+        try:
+            return str(setter[2](value))
+        except (ValueError, OverflowError):
+            return value
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the 'add_feature' method.
+    def add_feature(self, layout: 'Layout', values: 'Tuple',
+          geometry: bytes, position: int = 0) -> None:
+        """
+        This method adds a feature to the layer of the given layout, or
+        updates the feature with the same key (if its content differs).
+        """
+        name = layout.name
+        digest = content_hash(layout, values, geometry)
+
+        # Look for a feature with the same key (which can then not be
+        # matched again).  If its content is the same, there is nothing
+        # to write.
+        match = None
+        slot = layout.slots.get(self.key_field)
+        if slot is not None and slot < len(values) and name in self.layers:
+            key = self._key(name, values[slot])
+            if key is not None:
+                match = self._unmatched[name].pop(key, None)
+        if match is not None and match[1] == digest:
+            self.changes['unchanged'] += 1
+            return
+
+        feature = self._fill(layout, values, geometry)
+        feature.SetFieldString(self._hash_indexes[name], digest)
+        self._begin(position)
+        if match is None:
+            self.layers[name].CreateFeature(feature)
+            self.changes['inserted'] += 1
+        else:
+            feature.SetFID(match[0])
+            self.layers[name].SetFeature(feature)
+            self.changes['updated'] += 1
+        self._count(position)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the '_count' method.
+    def _count(self, position: int) -> None:
+        """
+        This method does nothing, since the update is not
+        committed in batches.
+        """
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the '_begin' method.
+    def _begin(self, position: int) -> None:
+        """
+        This method starts the transaction of the update (unless it has
+        been started already), whatever the batch size.
+        """
+        if self._in_transaction:
+            return
+        if self._dataset.StartTransaction() != ogr.OGRERR_NONE:
+            raise IOError('Cannot start a transaction in ' + self.gpkg_path)
+        self._in_transaction = True
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the 'commit' method.
+    def commit(self) -> None:
+        """
+        This method commits the update once it is complete (i.e., once
+        'remove_missing' has been called); until then, the transaction
+        is kept open (through any changes to the schema, as well).
+        """
+        if self._complete:
+            super().commit()
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Override the 'rollback' method.
+    def rollback(self) -> None:
+        """
+        This method discards the whole update.
+        """
+        if not self._in_transaction:
+            return
+        super().rollback()
+        self.feedback.pushInfo('Update discarded (the GeoPackage '
+                               'is unchanged)')
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'remove_missing' method, which should be called once
+    # every feature has been written (and not if the update is canceled).
+    def remove_missing(self) -> None:
+        """
+        This method deletes the features that were not matched (i.e.,
+        that are no longer in the PipelineML), and logs a summary.
+        """
+        stale = self._unmatchable
+        for name, unmatched in self._unmatched.items():
+            stale.extend((name, fid) for fid, digest in unmatched.values())
+            unmatched.clear()
+        for name, fid in stale:
+            self._begin(0)
+            self.layers[name].DeleteFeature(fid)
+            self._count(0)
+        self.changes['deleted'] += len(stale)
+        self._unmatchable = []
+        self._complete = True
+        self.commit()
+        self.feedback.pushInfo(
+          'Updated GeoPackage: ' + ', '.join(
+            str(count) + ' ' + change
+            for change, count in self.changes.items()))
@@ -0,0 +1,578 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2020 PipelineML
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+This module defines the 'GeoPackageWriter' class.
+"""
+
+
+import datetime
+import os
+import re
+from os import path
+from uuid import uuid4
+from osgeo import gdal
+from osgeo import ogr
+from osgeo.osr import SpatialReference
+from .fieldtypes import load_types
+from .profiles import sqlite_pragmas
+
+
+# These are the options with which layers are created.  The spatial index
+# is not created along with each layer (since GDAL would then update it,
+# by triggers, with every feature added); it is built in one pass once
+# every feature has been written (see 'build_indexes').
+LAYER_OPTIONS = ['SPATIAL_INDEX=NO']
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_int32' function.
+def _int32(value: str) -> int:
+    """
+    This function converts text to an integer of (at most) 32 bits,
+    raising an 'OverflowError' if it is out of range.
+    """
+    number = int(value)
+    if not -2 ** 31 <= number < 2 ** 31:
+        raise OverflowError(value + ' does not fit in 32 bits')
+    return number
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_int64' function.
+def _int64(value: str) -> int:
+    """
+    This function converts text to an integer of (at most) 64 bits,
+    raising an 'OverflowError' if it is out of range.
+    """
+    number = int(value)
+    if not -2 ** 63 <= number < 2 ** 63:
+        raise OverflowError(value + ' does not fit in 64 bits')
+    return number
+
+
+# This pattern matches an ISO 8601 date, optionally followed by a time
+# (with optional fractional seconds and time zone), as in XML Schema.
+_DATE_TIME = re.compile(
+  r'(\d{4})-(\d\d)-(\d\d)'
+  r'(?:T(\d\d):(\d\d):(\d\d)(?:\.\d+)?(?:Z|[+-]\d\d:\d\d)?)?')
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_datetime' function.
+def _datetime(value: str) -> str:
+    """
+    This function checks that text is a date, optionally with a time
+    (e.g., '2020-06-30T12:00:00Z'), and returns it (without surrounding
+    white space), raising a 'ValueError' if it is not.  (GDAL would set
+    a field to null for text it cannot parse as a date, without error.)
+    """
+    text = value.strip()
+    match = _DATE_TIME.fullmatch(text)
+    if match is None:
+        raise ValueError(repr(value) + ' is not a date')
+    year, month, day, hour, minute, second = match.groups()
+    datetime.date(int(year), int(month), int(day))
+    if hour is not None and (int(hour) > 23 or int(minute) > 59 or
+                             int(second) > 60):
+        raise ValueError(repr(value) + ' is not a valid time')
+    return text
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_date' function.
+def _date(value: str) -> str:
+    """
+    This function checks that text is a date (without a time), and
+    returns it (without surrounding white space), raising a 'ValueError'
+    if it is not.
+    """
+    text = _datetime(value)
+    if 'T' in text:
+        raise ValueError(repr(value) + ' has a time')
+    return text
+
+
+# This dictionary maps each field type to the method used to set a value
+# of that type (by field index) and the function that converts the value
+# from text (raising a 'ValueError' or 'OverflowError' if the type cannot
+# hold it).  Any field type not appearing in this dictionary is set from
+# text by GDAL.
+_SETTERS = {
+  ogr.OFTString: (ogr.Feature.SetFieldString, str),
+  ogr.OFTInteger: (ogr.Feature.SetFieldInteger64, _int32),
+  ogr.OFTInteger64: (ogr.Feature.SetFieldInteger64, _int64),
+  ogr.OFTReal: (ogr.Feature.SetFieldDouble, float),
+  ogr.OFTDate: (ogr.Feature.SetField, _date),
+  ogr.OFTDateTime: (ogr.Feature.SetField, _datetime)}
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the '_quote' function.
+def _quote(name: str, quote: str = '"') -> str:
+    """
+    This function quotes a name for use in SQL (as an identifier, or as
+    a string literal if 'quote' is a single quote).
+    """
+    return quote + name.replace(quote, quote + quote) + quote
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'build_indexes' function.
+def build_indexes(dataset: 'gdal.Dataset', layer: 'ogr.Layer',
+      spatial: bool, fields: 'Iterable[str]') -> None:
+    """
+    This function creates indexes for a layer of a GeoPackage: its spatial
+    (R-tree) index if 'spatial' is set, and an index on each of the named
+    'fields'.  It must not be called during a transaction.
+    """
+    name = layer.GetName()
+    if spatial:
+        result = dataset.ExecuteSQL(
+          'SELECT CreateSpatialIndex(' + _quote(name, "'") + ', ' +
+          _quote(layer.GetGeometryColumn(), "'") + ')')
+        if result is not None:
+            dataset.ReleaseResultSet(result)
+    for field in fields:
+        dataset.ExecuteSQL(
+          'CREATE INDEX IF NOT EXISTS ' +
+          _quote('idx_' + name + '_' + field) +
+          ' ON ' + _quote(name) + ' (' + _quote(field) + ')')
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# Define the 'GeoPackageWriter' class.
+class GeoPackageWriter:
+    """
+    This class writes features to a new GeoPackage, creating layers
+    and fields as they are first needed, and committing features in
+    batches (transactions).  It also serves as the interface of the other
+    writers (see the 'sinks' module).
+    """
+
+    # These are the name of the output format, the extension of the
+    # output's name (or an empty string, if the output is a directory), and
+    # whether every field of a layer must be created before any of its
+    # features are added (in which case the converter determines the
+    # schema first).
+    format_name = 'GeoPackage'
+    extension = '.gpkg'
+    needs_schema = False
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '__init__' method (i.e., the constructor), which
+    # is called when a new object of this class is instantiated.
+    def __init__(self, gpkg_path: str, feedback: 'QgsProcessingFeedback',
+          batch_size: int = 10000, batch_bytes: float = 0,
+          spatial_index: bool = True, index_fields: 'Iterable[str]' = (),
+          pragmas: 'Dict[str, str]' = None, in_memory: bool = False,
+          types: 'TypeRegistry' = None) -> None:
+        """
+        This method creates the GeoPackage at 'gpkg_path'.  A batch is
+        committed once it holds 'batch_size' features or spans
+        'batch_bytes' of input (zero disables either limit; a 'batch_size'
+        of zero disables transactions altogether).  The indexes of each
+        layer (a spatial index if 'spatial_index' is set, and an index on
+        each of the 'index_fields' it has) are created by
+        'create_indexes'.  The GeoPackage is written with the given SQLite
+        'pragmas' (see the 'profiles' module); if 'in_memory' is set, it
+        is built in memory, and only written to 'gpkg_path' when closed.
+        Fields are created with the types given by the 'types' registry
+        (by default, that of the built-in types; see 'fieldtypes').
+        """
+        self.gpkg_path = gpkg_path
+        self.feedback = feedback
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.spatial_index = spatial_index
+        self.index_fields = list(index_fields)
+        self.pragmas = pragmas or {}
+        self.in_memory = in_memory
+        self.types = load_types() if types is None else types
+
+        # This is the path of the GeoPackage in GDAL's
+        # in-memory file system (if it is built there).
+        self._memory_path = None
+
+        # This dictionary keeps track of layers
+        # that have been created in the GeoPackage.
+        self.layers = {}
+
+        # These dictionaries cache the schema of each layer: its feature
+        # definition, and the index, setter method and conversion function
+        # of each of its fields (by name).  This saves looking up fields by
+        # name (and converting values by field type) in GDAL every time.
+        # The number of changes to the fields of each layer so far (i.e.,
+        # fields created, or changed to text) is also kept, to tell when
+        # what is cached in a layout (see '_prepare') is out of date.
+        self._feature_defns = {}
+        self._field_setters = {}
+        self._schema_versions = {}
+
+        # This list holds the names of the layers created
+        # (without a spatial index) since indexes were last created.
+        self._unindexed = []
+
+        # This object represents the default spatial
+        # reference system (SRS) of the GeoPackage.
+        self.srs = SpatialReference()
+
+        # These variables keep track of the open transaction (if any):
+        # the number of features added since it began, and the position
+        # in the input at which it began.
+        self._in_transaction = False
+        self._batch_count = 0
+        self._batch_start = 0
+
+        # This function (if any) is called after each batch of features
+        # is committed (but not when there was nothing to commit), e.g.,
+        # so that the layers can be shown while the rest is written.
+        self.on_commit = None
+
+        self._dataset = self._open(gpkg_path)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_open' method, which is called (once) by the constructor.
+    def _open(self, gpkg_path: str) -> 'gdal.Dataset':
+        """
+        This method creates and returns the dataset.
+        """
+
+        if self.in_memory:
+            self._memory_path = ('/vsimem/pml_geopackager/' +
+                                 uuid4().hex + '.gpkg')
+            gpkg_path = self._memory_path
+
+        # Fetch the GDAL driver for the GeoPackage file format, and use
+        # it to create a new dataset (i.e., a new GeoPackage).
+        driver = gdal.GetDriverByName('GPKG')
+        with sqlite_pragmas(self.pragmas):
+            return driver.Create(gpkg_path, 0, 0, 0, gdal.GDT_Unknown)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'layer_path' method (a class method).
+    @classmethod
+    def layer_path(cls, gpkg_path: str, name: str) -> str:
+        """
+        This method returns the path by which QGIS (or GDAL) can
+        open the named layer of the output at 'gpkg_path'.
+        """
+        return gpkg_path + '|layername=' + name
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'set_crs' method.
+    def set_crs(self, name: str) -> None:
+        """
+        This method sets the default coordinate reference system
+        (e.g., 'EPSG:4326') for layers created from now on.
+        """
+        self.srs.SetFromUserInput(name)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_create_layer' method.
+    def _create_layer(self, name: str) -> 'ogr.Layer':
+        """
+        This method creates a layer.
+        """
+
+        # Schema changes are committed separately from feature batches,
+        # so a rollback cannot leave 'layers' out of sync with the file.
+        self.commit()
+        self.feedback.pushInfo('Creating ' + name + ' layer')
+        layer = self._make_layer(name)
+        self._unindexed.append(name)
+        self.layers[name] = layer
+        self._feature_defns[name] = layer.GetLayerDefn()
+        self._field_setters[name] = {}
+        self._schema_versions[name] = 0
+        return layer
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_make_layer' method, which is called by '_create_layer'.
+    def _make_layer(self, name: str) -> 'ogr.Layer':
+        """
+        This method creates a layer in the dataset, and returns it.
+        """
+        return self._dataset.CreateLayer(name, self.srs, ogr.wkbUnknown,
+                                         LAYER_OPTIONS)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_create_field' method.
+    def _create_field(self, layer_name: str,
+          name: str) -> 'Tuple[int, Callable, Callable]':
+        """
+        This method creates a field in a layer, and returns the field's
+        index, setter method and conversion function.
+        """
+        self.commit()
+        self.feedback.pushInfo('Creating ' + name + ' field'
+                               ' in ' + layer_name + ' layer')
+        type = self.types.field_type(layer_name, name)
+        field_defn = ogr.FieldDefn(name, type)
+        self.layers[layer_name].CreateField(field_defn)
+
+        # Look up the new field's index (just this once).
+        index = self._feature_defns[layer_name].GetFieldIndex(name)
+        setter, cast = _SETTERS.get(type, (ogr.Feature.SetField, str))
+        self._field_setters[layer_name][name] = (index, setter, cast)
+        self._schema_versions[layer_name] += 1
+        return index, setter, cast
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_widen_field' method, which is called when
+    # a field has a value that its type cannot hold.
+    def _widen_field(self, layer_name: str, name: str, value: str) -> None:
+        """
+        This method changes the type of a field to text (keeping the
+        values it already has, as text).
+        """
+        self.commit()
+        self.feedback.pushInfo('Changing ' + name + ' field in ' +
+                               layer_name + ' layer to text (for the '
+                               'value ' + repr(value) + ')')
+        index = self._field_setters[layer_name][name][0]
+        field_defn = ogr.FieldDefn(name, ogr.OFTString)
+        if self.layers[layer_name].AlterFieldDefn(
+              index, field_defn, ogr.ALTER_TYPE_FLAG) != ogr.OGRERR_NONE:
+            raise ValueError('The value ' + repr(value) + ' of the ' + name +
+                             ' field in the ' + layer_name + ' layer does '
+                             'not fit its type (give it the String type)')
+        self._field_setters[layer_name][name] = (
+          index, ogr.Feature.SetFieldString, str)
+        self._schema_versions[layer_name] += 1
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'create_schema' method, which may be called before
+    # any features are added (see the 'schema' module).
+    def create_schema(self, schema: 'Dict[str, List[str]]') -> None:
+        """
+        This method creates the given layers and fields, so that each
+        table is created once with its final schema.  (Layers and fields
+        that are missing from the schema are still created as needed.)
+        """
+        for name, field_names in schema.items():
+            if name not in self.layers:
+                self._create_layer(name)
+            for field_name in field_names:
+                if field_name not in self._field_setters[name]:
+                    self._create_field(name, field_name)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_prepare' method, which is called when a layout is first
+    # used (and again whenever the fields of its layer have changed).
+    def _prepare(self, layout: 'Layout') -> 'Tuple[Any, ...]':
+        """
+        This method creates the layer and fields of a layout as necessary,
+        and caches (in the layout) what is needed to write its features:
+        a feature object (which is reused for every feature), the field
+        setters in the order of the layout's fields, and the number of
+        changes to the layer's fields at the time.  (The layer itself is
+        not cached there, since it must not outlive the dataset.)
+        """
+        name = layout.name
+        if name not in self.layers:
+            self._create_layer(name)
+        field_setters = self._field_setters[name]
+        for field in layout.fields:
+            if field not in field_setters:
+                self._create_field(name, field)
+        setters = [field_setters[field] for field in layout.fields]
+
+        # A feature object must not be used once the fields of its layer
+        # have changed, so a new one is made whenever the cache is.
+        feature = ogr.Feature(self._feature_defns[name])
+        layout.cache = (feature, setters, self._schema_versions[name])
+        return layout.cache
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'add_feature' method.
+    def add_feature(self, layout: 'Layout', values: 'Tuple',
+          geometry: bytes, position: int = 0) -> None:
+        """
+        This method adds a feature to the layer of the given layout.  The
+        'values' are those of the layout's fields, in order (fields beyond
+        the end of the tuple have no value); the 'geometry' is WKB (or
+        None); 'position' is the position in the input (for the purpose
+        of limiting the size of batches).
+        """
+        feature = self._fill(layout, values, geometry)
+
+        # Add the feature to the appropriate layer
+        # (as part of the current batch, if any).
+        self._begin(position)
+        self.layers[layout.name].CreateFeature(feature)
+        self._count(position)
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_fill' method.
+    def _fill(self, layout: 'Layout', values: 'Tuple',
+          geometry: bytes) -> 'ogr.Feature':
+        """
+        This method returns the (reused) feature object of a layout, with
+        the given field values and geometry (and no FID).
+        """
+
+        # Use the cached layer, feature object and field setters of this
+        # layout, unless the layout (or its layer) has changed since.
+        cache = layout.cache
+        if (cache is None or len(cache[1]) < len(values) or
+              cache[2] != self._schema_versions[layout.name]):
+            cache = self._prepare(layout)
+        feature, setters, count = cache
+
+        # Set the value of each field for the feature (by index, and using
+        # the setter for the field's type), clearing any value left from
+        # the previous feature.  If the field's type cannot hold a value
+        # (e.g., a type inferred from only the start of the file), the
+        # field is changed to text, and the feature is filled again.
+        size = len(values)
+        for slot, (index, setter, cast) in enumerate(setters):
+            value = values[slot] if slot < size else None
+            if value is None:
+                feature.UnsetField(index)
+                continue
+            try:
+                setter(feature, index, cast(value))
+            except (ValueError, OverflowError):
+                self._widen_field(layout.name, layout.fields[slot], value)
+                return self._fill(layout, values, geometry)
+        feature.SetGeometryDirectly(
+          None if geometry is None else ogr.CreateGeometryFromWkb(geometry))
+        feature.SetFID(ogr.NullFID)
+        return feature
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'in_transaction' property.
+    @property
+    def in_transaction(self) -> bool:
+        """
+        This property tells whether a batch of features is open
+        (i.e., whether 'commit' has anything to commit).
+        """
+        return self._in_transaction
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_count' method, which is called after
+    # each feature is written (as part of a batch).
+    def _count(self, position: int) -> None:
+        """
+        This method commits the batch once it reaches either size limit.
+        """
+        self._batch_count += 1
+        if (self._in_transaction and
+              (self._batch_count >= self.batch_size or
+               (self.batch_bytes > 0 and
+                position - self._batch_start >= self.batch_bytes))):
+            self.commit()
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the '_begin' method, which is called before
+    # adding a feature when no transaction is open.
+    def _begin(self, position: int) -> None:
+        """
+        This method starts a new batch of features.
+        """
+
+        # A batch size of zero means that features
+        # should be committed one at a time (autocommit).
+        if self.batch_size < 1 or self._in_transaction:
+            return
+
+        # (A transaction that cannot be started or committed, e.g.,
+        # because another connection holds the database locked, fails the
+        # conversion, rather than losing the batch.)
+        if self._dataset.StartTransaction() != ogr.OGRERR_NONE:
+            raise IOError('Cannot start a transaction in ' + self.gpkg_path)
+        self._in_transaction = True
+        self._batch_count = 0
+        self._batch_start = position
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'commit' method, which is called when a batch is
+    # full, before the schema changes, and when writing is complete.
+    def commit(self) -> None:
+        """
+        This method commits the current batch of features (if any).
+        """
+        if not self._in_transaction:
+            return
+
+        if self._dataset.CommitTransaction() != ogr.OGRERR_NONE:
+            raise IOError('Cannot commit a batch of features to ' +
+                          self.gpkg_path)
+        self._in_transaction = False
+        if self.on_commit is not None:
+            self.on_commit()
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'rollback' method, which is called when
+    # the conversion is canceled or an error occurs.
+    def rollback(self) -> None:
+        """
+        This method discards the current batch of features (if any).
+        """
+        if not self._in_transaction:
+            return
+
+        # Every previously committed batch is left intact, so the
+        # GeoPackage remains consistent (if incomplete).
+        self._dataset.RollbackTransaction()
+        self._in_transaction = False
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'create_indexes' method, which is
+    # called once every feature has been written.
+    def create_indexes(self) -> None:
+        """
+        This method creates the spatial indexes of the new layers and the
+        indexes on the chosen fields (building each index in one pass is
+        much faster than keeping it up to date while features are added).
+        """
+        self.commit()
+        for name, layer in self.layers.items():
+            spatial = self.spatial_index and name in self._unindexed
+            fields = [field for field in self.index_fields
+                      if field in self._field_setters[name]]
+            if spatial or fields:
+                self.feedback.pushInfo('Creating indexes of '
+                                       + name + ' layer')
+                build_indexes(self._dataset, layer, spatial, fields)
+        self._unindexed = []
+
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    # Define the 'close' method.
+    def close(self) -> None:
+        """
+        This method commits any outstanding features and closes the
+        dataset to ensure that all data is written and resources are
+        recovered (file handle closed, etc.).
+        """
+        self.commit()
+        self.layers.clear()
+
+        # A GeoPackage built in memory is written to its file in a single
+        # pass (which also leaves it compact).
+        if self._memory_path is not None:
+            if path.exists(self.gpkg_path):
+                os.remove(self.gpkg_path)
+            self._dataset.ExecuteSQL(
+              'VACUUM INTO ' + _quote(self.gpkg_path, "'"))
+            self._dataset = None
+            gdal.Unlink(self._memory_path)
+            self._memory_path = None
+            return
+        self._dataset = None